@@ -0,0 +1,169 @@
+"""
+Writes 'Absence' attendance records once a class period has ended, for
+every student on the period's register who was not marked present, so
+reports can count absences instead of diffing rosters against present rows.
+
+    python absences.py                  # catch up to now, e.g. from cron
+    python absences.py --dry-run        # list the period occurrences due
+
+Each occurrence (a period on a given date) is filled with one
+INSERT ... SELECT that skips students already holding a record for it, so
+re-running, or running in two processes at once, never duplicates a row.
+The end of the last occurrence done is kept in job_watermark and the job
+resumes from there, catching up on periods that ended while nothing ran.
+The web app runs it in a background thread (AbsenceScheduler), started
+with each server process's first request.
+"""
+import argparse
+import threading
+from datetime import datetime, timedelta
+from models import db, Attendance, Student, Class_Period, Class_Register, Job_Watermark
+
+JOB_NAME = 'absences'
+WATERMARK_FORMAT = '%Y-%m-%d %H:%M'
+
+def _get_watermark():
+    row = Job_Watermark.query.filter_by(job_name=JOB_NAME).first()
+    return datetime.strptime(row.value, WATERMARK_FORMAT) if row else None
+
+def _set_watermark(value):
+    row = Job_Watermark.query.filter_by(job_name=JOB_NAME).first()
+    if row is None:
+        row = Job_Watermark(job_name=JOB_NAME)
+        db.session.add(row)
+    row.value = value.strftime(WATERMARK_FORMAT)
+
+def due_occurrences(since, until, grace_minutes=0):
+    """
+    (end, period) pairs for every period occurrence that ended at or after
+    since and at least grace_minutes before until, oldest first. Those
+    ending exactly at since are included: the watermark may have been
+    committed for one of several periods ending together.
+    """
+    periods = {}
+    for period in Class_Period.query.all():
+        periods.setdefault(period.day_of_week, []).append(period)
+
+    grace = timedelta(minutes=grace_minutes)
+    occurrences = []
+    day = since.date()
+    while day <= until.date():
+        for period in periods.get(day.strftime('%A'), []):
+            try:
+                end = datetime.combine(day, datetime.strptime(period.period_end_time, '%H:%M').time())
+            except ValueError:
+                print(f"[WARN] Period {period.period_id} has an invalid end time: {period.period_end_time}")
+                continue
+            if since <= end and end + grace <= until:
+                occurrences.append((end, period))
+        day += timedelta(days=1)
+    occurrences.sort(key=lambda occurrence: (occurrence[0], occurrence[1].id))
+    return occurrences
+
+def record_absences(period, date, end_time):
+    """
+    Adds an 'Absence' record for each student on the period's register with
+    no record for the period on date, in one statement. Returns the number
+    of rows written; the caller commits.
+    """
+    enrolled = db.select(
+        Class_Register.student_number,
+        db.literal(period.id),
+        Student.student_name + ' ' + Student.student_surname,
+        db.literal(end_time + ':00'),
+        db.literal(date),
+        db.literal('Absence'),
+    ).join(
+        Student, Student.student_number == Class_Register.student_number
+    ).where(
+        Class_Register.register_id == period.class_register,
+        ~db.exists().where(
+            Attendance.class_period_id == period.id,
+            Attendance.date == date,
+            Attendance.user_id == Class_Register.student_number,
+        )
+    ).distinct()
+    insert = db.insert(Attendance).from_select(
+        ['user_id', 'class_period_id', 'name', 'time', 'date', 'status'], enrolled)
+    return db.session.execute(insert).rowcount
+
+def materialize_absences(now=None, grace_minutes=5, catchup_days=7):
+    """
+    Records absences for every period occurrence that ended since the
+    watermark (on first run, the last catchup_days days), committing after
+    each. Returns a list of (period_id, date, absences) per occurrence. Must
+    run inside an app context.
+    """
+    now = now or datetime.now()
+    since = _get_watermark() or (now - timedelta(days=catchup_days))
+    results = []
+    for end, period in due_occurrences(since, now, grace_minutes=grace_minutes):
+        date = end.strftime('%Y-%m-%d')
+        try:
+            count = record_absences(period, date, period.period_end_time)
+            _set_watermark(end)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        results.append((period.period_id, date, count))
+    return results
+
+class AbsenceScheduler:
+    """
+    Daemon thread running materialize_absences() every interval seconds,
+    off the request path.
+    """
+
+    def __init__(self, app, interval=60, grace_minutes=5, catchup_days=7):
+        self.app = app
+        self.interval = interval
+        self.grace_minutes = grace_minutes
+        self.catchup_days = catchup_days
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='absence-scheduler', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                with self.app.app_context():
+                    for period_id, date, count in materialize_absences(grace_minutes=self.grace_minutes,
+                                                                       catchup_days=self.catchup_days):
+                        print(f"[INFO] Recorded {count} absence(s) for period {period_id} on {date}")
+            except Exception as e:
+                print(f"[ERROR] Absence job failed: {e}")
+            self.stopped.wait(self.interval)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grace-minutes', type=int, default=5, help='Wait this long after a period ends')
+    parser.add_argument('--catchup-days', type=int, default=7, help='How far back the first run looks')
+    parser.add_argument('--dry-run', action='store_true', help='List the occurrences due without writing')
+    args = parser.parse_args()
+
+    from app import app, create_tables
+
+    with app.app_context():
+        create_tables()
+        if args.dry_run:
+            now = datetime.now()
+            since = _get_watermark() or (now - timedelta(days=args.catchup_days))
+            for end, period in due_occurrences(since, now, grace_minutes=args.grace_minutes):
+                print(f"{end.strftime(WATERMARK_FORMAT)}  {period.period_id}")
+            return
+        results = materialize_absences(grace_minutes=args.grace_minutes, catchup_days=args.catchup_days)
+        for period_id, date, count in results:
+            print(f"{date}  {period_id}: {count} absence(s)")
+        print(f"✅ {sum(count for _, _, count in results)} absence(s) recorded for {len(results)} period(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""
+Attendance analytics over per-module presence matrices.
+
+A session is one occurrence of a class period: the period on a date with at
+least one attendance record (absences.py records an 'Absence' for everyone
+not marked present once it ends). load_modules() reads every session with
+the students present at it in one grouped query, and turns each module into
+a boolean matrix of its registered students against its sessions in date
+order. Rates, absence streaks, weekly rates, week-over-week trends and the
+Good/Warning/Critical status are NumPy reductions over that matrix.
+
+Reading a whole faculty's semester is millions of rows; AnalyticsCache keeps
+every module's matrix for the current reporting snapshot so the
+cross-module reports only pay for it once per snapshot.
+"""
+import threading
+import time
+import warnings
+from functools import cached_property
+import numpy as np
+from models import db, Attendance, Student, Class_Period, Class_Register, Venue
+
+GOOD_RATE = 80 # Attendance rate (%) at or above which a student is 'Good'...
+WARNING_RATE = 60 # ...or 'Warning'; below it, 'Critical'
+DAY_ORDER = {'Monday': 1, 'Tuesday': 2, 'Wednesday': 3, 'Thursday': 4, 'Friday': 5, 'Saturday': 6, 'Sunday': 7}
+
+def classify(rates):
+    """
+    'Good', 'Warning' or 'Critical' for each attendance rate.
+    """
+    rates = np.asarray(rates)
+    return np.select([rates >= GOOD_RATE, rates >= WARNING_RATE], ['Good', 'Warning'], 'Critical')
+
+def _percent(numerator, denominator):
+    # Elementwise numerator / denominator * 100, 0 where the denominator is 0
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.broadcast_to(np.asarray(denominator, dtype=np.float64), numerator.shape)
+    return np.divide(numerator * 100, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+def _week_starts(dates):
+    # The Monday of each date's week (1970-01-01 was a Thursday)
+    days = dates.astype('datetime64[D]').astype(np.int64)
+    return (days - (days + 3) % 7).astype('datetime64[D]')
+
+class ModuleAttendance:
+    """
+    One module's attendance: presence[i, j] is True if students[i] was
+    present at session j. Sessions are in date and start time order;
+    records counts every 'Present' row for the module's periods, including
+    students no longer registered. The matrix is never modified, so the
+    per-student arrays (attended, rates, ...) are computed on first use.
+    """
+
+    def __init__(self, module_code, students, names, periods, session_periods, session_dates, presence, records=0):
+        self.module_code = module_code
+        self.students = students # Sorted student numbers
+        self.names = names # student_number -> "Name Surname", for students that exist (shared between modules)
+        self.periods = periods # class period id -> {'period_id', 'day', 'time', 'venue'}
+        self.session_periods = session_periods
+        self.session_dates = session_dates
+        self.presence = presence
+        self.records = records
+
+    @classmethod
+    def empty(cls, module_code):
+        return cls(module_code, np.array([], dtype=str), {}, {}, np.array([], dtype=np.int64),
+                   np.array([], dtype='datetime64[D]'), np.zeros((0, 0), dtype=bool))
+
+    @property
+    def total_students(self):
+        return len(self.students)
+
+    @property
+    def total_sessions(self):
+        return self.presence.shape[1]
+
+    @cached_property
+    def attended(self):
+        return self.presence.sum(axis=1)
+
+    @cached_property
+    def rates(self):
+        """
+        Each student's attendance rate (%) over the sessions held.
+        """
+        return _percent(self.attended, self.total_sessions)
+
+    def overall_rate(self):
+        return float(_percent(self.presence.sum(), self.presence.size))
+
+    def session_counts(self):
+        return self.presence.sum(axis=0)
+
+    def session_rates(self):
+        return _percent(self.session_counts(), self.total_students)
+
+    @cached_property
+    def absence_streaks(self):
+        """
+        Sessions each student has missed in a row, up to the latest one.
+        """
+        latest_first = self.presence[:, ::-1]
+        return np.where(latest_first.any(axis=1), latest_first.argmax(axis=1), self.total_sessions)
+
+    def weeks(self):
+        """
+        (week start dates, week index of each session).
+        """
+        return np.unique(_week_starts(self.session_dates), return_inverse=True)
+
+    def weekly_rates(self):
+        """
+        (week start dates, sessions per week, attendance rate per week).
+        """
+        weeks, week_of_session = self.weeks()
+        sessions = np.bincount(week_of_session, minlength=len(weeks))
+        present = np.bincount(week_of_session, weights=self.session_counts(), minlength=len(weeks))
+        return weeks, sessions, _percent(present, sessions * self.total_students)
+
+    @cached_property
+    def trends(self):
+        """
+        Change in each student's attendance rate from the previous week to
+        the latest, in percentage points; NaN with fewer than two weeks.
+        """
+        weeks, week_of_session = self.weeks()
+        if len(weeks) < 2:
+            return np.full(self.total_students, np.nan)
+        last_two = week_of_session >= len(weeks) - 2
+        in_last = week_of_session[last_two] == len(weeks) - 1
+        presence = self.presence[:, last_two]
+        latest = _percent(presence[:, in_last].sum(axis=1), in_last.sum())
+        previous = _percent(presence[:, ~in_last].sum(axis=1), (~in_last).sum())
+        return latest - previous
+
+    def at_risk(self, max_rate=WARNING_RATE, min_streak=3):
+        """
+        Students attending below max_rate (%) or who have missed the last
+        min_streak sessions in a row.
+        """
+        if not self.total_sessions:
+            return np.zeros(self.total_students, dtype=bool)
+        return (self.rates < max_rate) | (self.absence_streaks >= min_streak)
+
+    def student_breakdown(self):
+        """
+        Per-student attendance, lowest rate first.
+        """
+        rates = self.rates
+        attended = self.attended
+        streaks = self.absence_streaks
+        trends = self.trends
+        statuses = classify(rates)
+        breakdown = []
+        for i in np.argsort(rates, kind='stable'):
+            student_number = str(self.students[i])
+            if student_number not in self.names:
+                continue
+            breakdown.append({
+                'student_number': student_number,
+                'name': self.names[student_number],
+                'attended': int(attended[i]),
+                'total_periods': self.total_sessions,
+                'attendance_rate': round(float(rates[i]), 2),
+                'status': str(statuses[i]),
+                'absence_streak': int(streaks[i]),
+                'trend': None if np.isnan(trends[i]) else round(float(trends[i]), 2),
+            })
+        return breakdown
+
+    def recent_sessions(self, limit=5):
+        """
+        The latest sessions held, newest first.
+        """
+        counts = self.session_counts()
+        rates = self.session_rates()
+        recent = []
+        for j in range(self.total_sessions - 1, max(self.total_sessions - limit, 0) - 1, -1):
+            period = self.periods.get(int(self.session_periods[j]), {})
+            recent.append(dict(period, date=str(self.session_dates[j]), attendance_count=int(counts[j]),
+                               attendance_rate=round(float(rates[j]), 2)))
+        return recent
+
+    def period_rates(self):
+        """
+        (sessions held, mean attendance rate) of each period in self.periods.
+        """
+        position = {period_id: i for i, period_id in enumerate(self.periods)}
+        index = np.array([position[period_id] for period_id in self.session_periods.tolist()], dtype=np.int64)
+        sessions = np.bincount(index, minlength=len(position))
+        totals = np.bincount(index, weights=self.session_rates(), minlength=len(position))
+        return sessions, np.divide(totals, sessions, out=np.zeros(len(position)), where=sessions > 0)
+
+    def period_details(self):
+        """
+        Per class period: its mean attendance rate over the sessions held,
+        and who was present at the latest one.
+        """
+        _, rates = self.period_rates()
+        details = []
+        for (period_id, period), rate in zip(self.periods.items(), rates):
+            sessions = np.flatnonzero(self.session_periods == period_id)
+            present = self.presence[:, sessions[-1]] if len(sessions) else np.zeros(self.total_students, dtype=bool)
+            details.append(dict(
+                period,
+                total_students=self.total_students,
+                sessions=len(sessions),
+                date=str(self.session_dates[sessions[-1]]) if len(sessions) else None,
+                present_count=int(present.sum()),
+                absent_count=int((~present).sum()) if len(sessions) else 0,
+                attendance_rate=round(float(rate), 2),
+                present_students=self.students[present].tolist(),
+                absent_students=self.students[~present].tolist() if len(sessions) else [],
+            ))
+        details.sort(key=lambda detail: (DAY_ORDER.get(detail['day'], 8), detail['time']))
+        return details
+
+    def weekly_pattern(self):
+        """
+        Per weekday: how many class periods fall on it and their mean attendance rate.
+        """
+        if not self.periods:
+            return {}
+        _, rates = self.period_rates()
+        days, day_of_period = np.unique([period['day'] for period in self.periods.values()], return_inverse=True)
+        periods = np.bincount(day_of_period, minlength=len(days))
+        means = np.bincount(day_of_period, weights=rates, minlength=len(days)) / periods
+        order = sorted(range(len(days)), key=lambda i: DAY_ORDER.get(str(days[i]), 8))
+        return {str(days[i]): {'total_periods': int(periods[i]), 'avg_rate': round(float(means[i]), 2)} for i in order}
+
+    def weekly_trend(self):
+        weeks, sessions, rates = self.weekly_rates()
+        return [{'week': str(week), 'sessions': int(count), 'attendance_rate': round(float(rate), 2)}
+                for week, count, rate in zip(weeks, sessions, rates)]
+
+def _student_ids(rosters, joined, count):
+    # (student numbers, their sort keys, ids in joined as keys). attendance.user_id
+    # is an INTEGER column, so ids are usually integers, which parse far
+    # faster than strings; any that are not fall back to strings.
+    numbers = np.unique(np.array([number for roster in rosters.values() for number in roster], dtype=str))
+    if all(number.isdigit() for number in numbers.tolist()):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning) # Raised when a non-integer stops the parse
+            ids = np.fromstring(joined, dtype=np.int64, sep=',') if joined else np.array([], dtype=np.int64)
+        if len(ids) == count:
+            keys = numbers.astype(np.int64)
+            by_key = np.argsort(keys, kind='stable')
+            return numbers[by_key], keys[by_key], ids
+    return numbers, numbers, np.array(joined.split(',') if joined else [], dtype=str)
+
+def load_modules(module_codes=None, date_from=None, date_to=None):
+    """
+    ModuleAttendance for each of module_codes (every registered module if
+    None), from sessions between date_from and date_to inclusive. Must run
+    inside an app context.
+    """
+    registers = db.select(Class_Register.subject_code, Class_Register.register_id, Class_Register.student_number)
+    students = db.select(Student.student_number, Student.student_name, Student.student_surname)
+    if module_codes is not None:
+        registers = registers.where(Class_Register.subject_code.in_(module_codes))
+        students = students.where(Student.student_number.in_(
+            db.select(Class_Register.student_number).where(Class_Register.subject_code.in_(module_codes))))
+    rosters = {}
+    register_modules = {}
+    for module_code, register_id, student_number in db.session.execute(registers):
+        rosters.setdefault(module_code, []).append(str(student_number))
+        register_modules[register_id] = module_code
+    names = {str(number): f"{name} {surname}" for number, name, surname in db.session.execute(students)}
+
+    periods = db.session.execute(db.select(
+        Class_Period.id, Class_Period.class_register, Class_Period.period_id, Class_Period.day_of_week,
+        Class_Period.period_start_time, Class_Period.period_end_time, Venue.venue_name
+    ).outerjoin(Venue, Venue.id == Class_Period.period_venue_id).where(
+        Class_Period.class_register.in_(list(register_modules))
+    ).order_by(Class_Period.period_start_time, Class_Period.id)).all()
+    module_periods = {}
+    for id_, register_id, period_id, day, start, end, venue in periods:
+        module_periods.setdefault(register_modules[register_id], {})[id_] = {
+            'period_id': period_id,
+            'day': day,
+            'time': f"{start} - {end}",
+            'venue': venue or 'Unknown',
+        }
+
+    present = Attendance.status == 'Present'
+    sessions = db.select(
+        Attendance.class_period_id, Attendance.date, db.func.count(db.case((present, 1))),
+        db.func.group_concat(db.case((present, Attendance.user_id)))
+    ).where(
+        Attendance.class_period_id.in_([period[0] for period in periods])
+    ).group_by(Attendance.class_period_id, Attendance.date)
+    if date_from:
+        sessions = sessions.where(Attendance.date >= date_from)
+    if date_to:
+        sessions = sessions.where(Attendance.date <= date_to)
+    sessions = db.session.execute(sessions).all()
+
+    # Sessions sorted by module, date and the period's start time, then
+    # the students present at each, flattened in the same order
+    period_ids = np.array([period[0] for period in periods], dtype=np.int64)
+    period_rank = np.argsort(period_ids)
+    module_index = {code: i for i, code in enumerate(rosters)}
+    period_module = np.array([module_index[register_modules[period[1]]] for period in periods], dtype=np.int64)
+    session_periods = np.array([session[0] for session in sessions], dtype=np.int64)
+    session_dates = np.array([session[1] for session in sessions], dtype='datetime64[D]')
+    counts = np.array([session[2] for session in sessions], dtype=np.int64)
+    position = period_rank[np.searchsorted(period_ids, session_periods, sorter=period_rank)]
+    session_modules = period_module[position]
+    order = np.lexsort((position, session_dates, session_modules))
+    numbers, keys, ids = _student_ids(rosters, ','.join(sessions[j][3] for j in order if sessions[j][3]),
+                                      int(counts.sum()))
+    # Position of each present student in numbers, or -1 if not registered anywhere
+    student_ids = np.minimum(np.searchsorted(keys, ids), max(len(keys) - 1, 0))
+    student_ids = np.where(keys[student_ids] == ids, student_ids, -1) if len(keys) else np.full(len(ids), -1)
+    offsets = np.concatenate(([0], np.cumsum(counts[order])))
+    module_bounds = np.searchsorted(session_modules[order], np.arange(len(rosters) + 1))
+
+    modules = {}
+    for code, i in module_index.items():
+        roster = np.unique(np.searchsorted(keys, np.array(rosters[code]).astype(keys.dtype)))
+        first, last = module_bounds[i], module_bounds[i + 1]
+        module_sessions = order[first:last]
+        present_ids = student_ids[offsets[first]:offsets[last]]
+        columns = np.repeat(np.arange(last - first), counts[module_sessions])
+        rows = np.minimum(np.searchsorted(roster, present_ids), len(roster) - 1)
+        registered = roster[rows] == present_ids
+        presence = np.zeros((len(roster), last - first), dtype=bool)
+        presence[rows[registered], columns[registered]] = True
+        modules[code] = ModuleAttendance(code, numbers[roster], names, module_periods.get(code, {}),
+                                         session_periods[module_sessions], session_dates[module_sessions],
+                                         presence, records=int(counts[module_sessions].sum()))
+    for code in module_codes or ():
+        if code not in modules:
+            modules[code] = ModuleAttendance.empty(code)
+    return modules
+
+def at_risk_students(modules, max_rate=WARNING_RATE, min_streak=3):
+    """
+    Students at risk in any of the modules (see ModuleAttendance.at_risk),
+    with their attendance over all the modules, lowest first.
+    """
+    modules = [module for module in modules if module.total_students]
+    if not modules:
+        return []
+    # One row per (module, registered student) across every module
+    module_of_row = np.repeat(np.arange(len(modules)), [module.total_students for module in modules])
+    numbers = np.concatenate([module.students for module in modules])
+    attended = np.concatenate([module.attended for module in modules])
+    sessions = np.array([module.total_sessions for module in modules])[module_of_row]
+    rates = np.concatenate([module.rates for module in modules])
+    streaks = np.concatenate([module.absence_streaks for module in modules])
+    trends = np.concatenate([module.trends for module in modules])
+    flagged = np.flatnonzero((sessions > 0) & ((rates < max_rate) | (streaks >= min_streak)))
+    if not len(flagged):
+        return []
+
+    # Each student's attendance across every module they are registered for
+    students, student_of_row = np.unique(numbers, return_inverse=True)
+    overall = _percent(np.bincount(student_of_row, weights=attended), np.bincount(student_of_row, weights=sessions))
+    statuses = classify(rates[flagged])
+
+    report = {}
+    for row, status in zip(flagged.tolist(), statuses.tolist()):
+        student = student_of_row[row]
+        module = modules[module_of_row[row]]
+        entry = report.get(student)
+        if entry is None:
+            number = str(students[student])
+            entry = report[student] = {
+                'student_number': number,
+                'name': module.names.get(number),
+                'overall_attendance_rate': round(float(overall[student]), 2),
+                'modules': [],
+            }
+        entry['modules'].append({
+            'module_code': module.module_code,
+            'attended': int(attended[row]),
+            'total_periods': int(sessions[row]),
+            'attendance_rate': round(float(rates[row]), 2),
+            'status': status,
+            'absence_streak': int(streaks[row]),
+            'trend': None if np.isnan(trends[row]) else round(float(trends[row]), 2),
+        })
+    report = sorted(report.values(), key=lambda entry: (entry['overall_attendance_rate'], entry['student_number']))
+    for entry in report:
+        entry['modules'].sort(key=lambda module: module['attendance_rate'])
+    return report
+
+class AnalyticsCache:
+    """
+    Every module's ModuleAttendance for one version of the reporting data
+    (the snapshot's taken_at). build() replaces it; modules() serves it
+    when the version matches, and otherwise loads only what is asked for.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.modules_by_code = {}
+        self.built_in = None
+        self.lock = threading.Lock()
+
+    def build(self, version):
+        """
+        Loads every module. Must run inside an app context, reading the
+        data the version refers to.
+        """
+        started = time.perf_counter()
+        modules = load_modules()
+        with self.lock:
+            self.version = version
+            self.modules_by_code = modules
+            self.built_in = time.perf_counter() - started
+        return modules
+
+    def modules(self, version=None, module_codes=None, date_from=None, date_to=None):
+        """
+        ModuleAttendance per module code, as load_modules().
+        """
+        with self.lock:
+            cached = self.modules_by_code if version is not None and version == self.version else None
+        if cached is None or date_from or date_to:
+            return load_modules(module_codes, date_from, date_to)
+        if module_codes is None:
+            return dict(cached)
+        return {code: cached.get(code) or ModuleAttendance.empty(code) for code in module_codes}
+
+    def stats(self):
+        with self.lock:
+            return {
+                'version': self.version,
+                'modules': len(self.modules_by_code),
+                'built_in_seconds': round(self.built_in, 3) if self.built_in is not None else None,
+            }
@@ -1,70 +1,435 @@
-from flask import Flask, render_template, request, jsonify, flash, session, redirect, url_for
+from flask import (Flask, render_template, request, jsonify, flash, session, redirect, url_for, Response,
+                   stream_with_context)
 from functools import wraps
 import os
+import threading
+import time
 from datetime import datetime
 import base64
+import csv
+import json
+import zipfile
 import numpy as np
-import cv2
-from deepface import DeepFace
+from sqlalchemy.engine import make_url
 from models import *
+from database import DB_PATH, init_database, read_only
+from gallery import gallery_from_vectors, load_module_vectors, add_template, clear_templates, DEFAULT_MODEL
+from recognition import decode_image, face_crop_problem, limit_width, get_backend, get_batching_backend, preload_backend
+from recognition_service import RecognitionClient, RecognitionServiceError
+from query_stats import init_query_stats
+from frame_cache import FrameCache, frame_hash
+from gallery_cache import GalleryCache
+from load_shedding import LoadShedder
+from response_cache import ResponseCache
+from compression import compressed
+from bulk_enrollment import enroll_photos, summarize
+from student_import import read_csv, read_json, import_records
+from absences import AbsenceScheduler
+from attendance_queue import AttendanceWriter
+from warmup import PeriodWarmer
+from snapshot import ReportingSnapshot
+from analytics import AnalyticsCache, at_risk_students
+from attendance_export import export_chunks, validate_filters, FORMATS, PARQUET_AVAILABLE
+from profiles import (ensure_default_profiles, get_profile, resolve_profile, cheaper_profile, backend_options,
+                      enrolment_profiles, validate_profile_settings, profile_to_dict, DEFAULT_PROFILES, PROFILE_FIELDS)
+from metrics import (StageTimer, render as render_metrics, RECOGNITION_STAGE_SECONDS, ATTENDANCE_RESULTS,
+                     MATCH_SIMILARITY, GALLERY_STUDENTS, GALLERY_TEMPLATES, FACE_CROPS)
 
 app = Flask(__name__)
 
 # --- Database Configuration ---
-# Set the path for the SQLite database file
+# Set the path for the SQLite database file (DATABASE_URL overrides it, e.g. for benchmarks)
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'database.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///' + DB_PATH)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False # Optional: to suppress a warning
+# Connections for the request path, and read-only ones for reports and exports (see database.py)
+app.config['DB_POOL_SIZE'] = 5
+app.config['DB_REPORTING_POOL_SIZE'] = 4
 app.config['SECRET_KEY'] = 'your_super_secret_key' # Required for flashing messages
 
 faces_path = os.path.join(basedir, 'static', 'faces')
 os.makedirs(faces_path, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = faces_path
 
+# --- Face Gallery Configuration ---
+app.config['GALLERY_MAX_TEMPLATES'] = 5 # Templates kept per student
+app.config['GALLERY_SCORING'] = 'max' # 'max' (closest template) or 'centroid'
+app.config['GALLERY_AUTO_AUGMENT'] = True # Learn new templates from confident live matches
+# Live captures scoring in this range are added as templates: confident enough
+# to trust, but different enough from the existing ones to be worth keeping.
+app.config['GALLERY_AUGMENT_MIN_SCORE'] = 0.85
+app.config['GALLERY_AUGMENT_MAX_SCORE'] = 0.97
+
+# --- Gallery Cache Configuration ---
+# Module galleries kept in memory between frames, least recently used evicted beyond the budget
+app.config['GALLERY_CACHE_ENABLED'] = True
+app.config['GALLERY_CACHE_MAX_MB'] = 64 # Memory budget for cached galleries
+
+# --- Gallery Warm-up Configuration ---
+# Rosters and galleries of upcoming periods are loaded this many minutes before they start
+app.config['GALLERY_WARMUP_ENABLED'] = True
+app.config['GALLERY_WARMUP_LEAD_MINUTES'] = 10
+app.config['GALLERY_WARMUP_INTERVAL'] = 30 # Seconds between timetable checks
+
+# --- Recognition Profile Configuration ---
+# Detector, model, input size and threshold come from the recognition profile
+# of the capture station or venue (see profiles.py), else from this one.
+app.config['RECOGNITION_DEFAULT_PROFILE'] = os.environ.get('RECOGNITION_DEFAULT_PROFILE', 'balanced')
+app.config['RECOGNITION_THRESHOLD'] = 0.70 # Used only if the default profile does not exist
+
+# --- Recognition Backend Configuration ---
+# 'deepface' (reference) or 'opencv' (YuNet + SFace run directly through OpenCV DNN).
+# Captures run the backend of their recognition profile: this only sets the
+# default profile's when that profile is first created (and the backend used
+# if it does not exist). Change it afterwards through the profile.
+app.config['RECOGNITION_BACKEND'] = os.environ.get('RECOGNITION_BACKEND')
+app.config['RECOGNITION_BACKEND_OPTIONS'] = {} # e.g. {'weights_dir': '/srv/weights'} for 'opencv'
+# The ML stack is only imported when a recognition endpoint is first hit.
+# Capture instances can set this to load it at startup instead.
+app.config['RECOGNITION_PRELOAD'] = os.environ.get('RECOGNITION_PRELOAD') == '1'
+# When set (e.g. 'http://127.0.0.1:5100'), embeddings and matches are served by
+# recognition_service.py instead of a model loaded inside this process.
+app.config['RECOGNITION_SERVICE_URL'] = os.environ.get('RECOGNITION_SERVICE_URL')
+app.config['RECOGNITION_SERVICE_TIMEOUT'] = 5.0 # Seconds
+# Micro-batch face embeddings from concurrent requests into one forward pass.
+# 0 disables batching; most useful with the 'opencv' backend.
+app.config['RECOGNITION_BATCH_SIZE'] = int(os.environ.get('RECOGNITION_BATCH_SIZE', 0))
+app.config['RECOGNITION_BATCH_WAIT_MS'] = 10 # Longest a face waits for others to join its batch
+# Face crops sent by the capture page (face_data) are embedded without
+# detection only if they pass these checks; otherwise detection runs as usual.
+app.config['FACE_CROP_MIN_SIZE'] = 64 # Pixels, of the face in the original frame
+app.config['FACE_CROP_MIN_SHARPNESS'] = 30.0 # Variance of the Laplacian
+app.config['FACE_CROP_BRIGHTNESS'] = (40, 220) # Allowed mean gray level
+
+# --- Frame Cache Configuration ---
+# Near-identical frames from the same capture session reuse the previous
+# recognition result instead of running detection and embedding again.
+app.config['FRAME_CACHE_ENABLED'] = True
+app.config['FRAME_CACHE_TTL'] = 10.0 # Seconds; longer than the capture interval
+app.config['FRAME_CACHE_MAX_ENTRIES'] = 1024
+app.config['FRAME_CACHE_MAX_DISTANCE'] = 10 # Differing bits (of 64) still counted as the same frame
+
+# --- Response Cache Configuration ---
+# Reference-data lists are cached until a commit writes to their tables.
+# Server processes share table versions through files in VERSION_DIR; changes
+# made by other programs (camera.py, CLI tools) show up after MAX_AGE
+app.config['RESPONSE_CACHE_ENABLED'] = True
+app.config['RESPONSE_CACHE_MAX_AGE'] = 60.0 # Seconds
+app.config['RESPONSE_CACHE_MAX_ENTRIES'] = 256
+app.config['RESPONSE_CACHE_VERSION_DIR'] = (make_url(app.config['SQLALCHEMY_DATABASE_URI']).database or
+                                            DB_PATH) + '.response-cache'
+
+# --- Response Compression Configuration ---
+# Large JSON responses (e.g. the attendance view bootstrap) are gzip or
+# brotli compressed (brotli needs the optional 'brotli' package)
+app.config['RESPONSE_COMPRESSION_MIN_BYTES'] = 1024
+app.config['RESPONSE_COMPRESSION_LEVEL'] = 6
+
+# --- Attendance Export Configuration ---
+app.config['EXPORT_PAGE_SIZE'] = 5000 # Rows per read transaction; bounds the export's memory use
+
+# --- Bulk Enrollment Configuration ---
+app.config['BULK_ENROLLMENT_WORKERS'] = 4 # Photos decoded and embedded at once
+app.config['BULK_ENROLLMENT_BATCH_SIZE'] = 100 # Students written per transaction
+
+# --- Load Shedding Configuration ---
+# Frames beyond the in-flight limit get a 503 with Retry-After, and capture
+# pages are asked (X-Capture-Interval-Ms) to slow down while over budget.
+app.config['LOAD_MAX_IN_FLIGHT'] = int(os.environ.get('LOAD_MAX_IN_FLIGHT', 4)) # Frames recognised at once
+app.config['LOAD_LATENCY_BUDGET'] = 1.5 # Seconds of recognition per frame before the limit shrinks
+app.config['LOAD_BASE_INTERVAL_MS'] = 3000 # Matches CAPTURE_INTERVAL_MS in lectureside_capture.js
+app.config['LOAD_MAX_INTERVAL_MS'] = 15000
+# After LOAD_DEGRADE_AFTER seconds over budget, recognition uses the cheap
+# profile's detector and input width until LOAD_RECOVER_AFTER seconds of calm
+app.config['LOAD_DEGRADED_PROFILE'] = 'fast'
+app.config['LOAD_DEGRADE_AFTER'] = 15.0
+app.config['LOAD_RECOVER_AFTER'] = 30.0
+
+
+# --- Attendance Write Queue Configuration ---
+# Recognitions are acknowledged at once and written in batched transactions
+# by a background thread (see attendance_queue.py)
+app.config['ATTENDANCE_WRITE_BEHIND'] = True
+app.config['ATTENDANCE_FLUSH_INTERVAL'] = 0.5 # Longest a recognition waits, in seconds, before it is written
+app.config['ATTENDANCE_FLUSH_BATCH'] = 200 # Records per transaction
+app.config['ATTENDANCE_JOURNAL_FSYNC'] = True # Off trades crash safety of acknowledged records for speed
+# Acknowledged but unwritten records, kept next to the database they belong to.
+# Each server process locks its own: this path, then this path with .1, .2, ...
+app.config['ATTENDANCE_JOURNAL'] = (make_url(app.config['SQLALCHEMY_DATABASE_URI']).database or
+                                    DB_PATH) + '.attendance-journal'
+
+# --- Background Jobs Configuration ---
+# Background threads (see start_background_jobs()) start with each server
+# process's first request, under app.run() or any WSGI server. BACKGROUND_JOBS=0
+# keeps them off in processes that only borrow the app, such as benchmarks.
+app.config['BACKGROUND_JOBS_ENABLED'] = os.environ.get('BACKGROUND_JOBS', '1') == '1'
+
+# --- Absence Job Configuration ---
+# Once a period ends, unmarked students on its register get 'Absence' records
+app.config['ABSENCE_JOB_ENABLED'] = True
+app.config['ABSENCE_JOB_INTERVAL'] = 60 # Seconds between checks for ended periods
+app.config['ABSENCE_GRACE_MINUTES'] = 5 # Wait this long after a period ends before recording absences
+app.config['ABSENCE_CATCHUP_DAYS'] = 7 # How far back the first run looks
+
+# --- Reporting Snapshot Configuration ---
+# Statistics endpoints read from a copy of the database refreshed every
+# INTERVAL seconds (see snapshot.py), or from the live database while the
+# copy is older than MAX_AGE
+app.config['REPORTING_SNAPSHOT_ENABLED'] = True
+app.config['REPORTING_SNAPSHOT_INTERVAL'] = 300 # Seconds between copies
+app.config['REPORTING_SNAPSHOT_MAX_AGE'] = 900 # Seconds
+app.config['REPORTING_SNAPSHOT_PATH'] = (make_url(app.config['SQLALCHEMY_DATABASE_URI']).database or
+                                         DB_PATH) + '.reporting-snapshot'
+
+# --- Attendance Analytics Configuration ---
+# Every module's presence matrix is rebuilt after each reporting snapshot
+# refresh, so reports across all modules are served from memory (see analytics.py)
+app.config['ANALYTICS_CACHE_ENABLED'] = True
+# Students attending below this rate (%), or absent from this many sessions
+# in a row, are reported at risk
+app.config['AT_RISK_MAX_RATE'] = 60
+app.config['AT_RISK_MIN_STREAK'] = 3
+
+# --- Query Instrumentation Configuration ---
+# X-DB-Query-Count / X-DB-Time-ms / Server-Timing headers are always sent in debug mode
+app.config['QUERY_STATS_HEADERS'] = os.environ.get('QUERY_STATS_HEADERS') == '1'
+app.config['SLOW_REQUEST_MS'] = 500 # Requests slower than this are logged...
+app.config['SLOW_REQUEST_QUERIES'] = 100 # ...as are requests issuing more queries than this
+app.config['SLOW_REQUEST_LOG'] = os.path.join(basedir, 'logs', 'slow_requests.log')
 
 # Initialize the database with the app
-db.init_app(app)
+init_database(app, db, pool_size=app.config['DB_POOL_SIZE'],
+              reporting_pool_size=app.config['DB_REPORTING_POOL_SIZE'],
+              snapshot_path=app.config['REPORTING_SNAPSHOT_PATH'] if app.config['REPORTING_SNAPSHOT_ENABLED'] else None)
+init_query_stats(app)
+
+recognition_client = None
+if app.config['RECOGNITION_SERVICE_URL']:
+    recognition_client = RecognitionClient(app.config['RECOGNITION_SERVICE_URL'],
+                                           timeout=app.config['RECOGNITION_SERVICE_TIMEOUT'])
+
+frame_cache = None
+if app.config['FRAME_CACHE_ENABLED']:
+    frame_cache = FrameCache(ttl=app.config['FRAME_CACHE_TTL'],
+                             max_entries=app.config['FRAME_CACHE_MAX_ENTRIES'],
+                             max_distance=app.config['FRAME_CACHE_MAX_DISTANCE'])
+
+attendance_writer = None
+if app.config['ATTENDANCE_WRITE_BEHIND']:
+    attendance_writer = AttendanceWriter(app, app.config['ATTENDANCE_JOURNAL'],
+                                         flush_interval=app.config['ATTENDANCE_FLUSH_INTERVAL'],
+                                         batch_size=app.config['ATTENDANCE_FLUSH_BATCH'],
+                                         fsync=app.config['ATTENDANCE_JOURNAL_FSYNC'])
+
+reporting_snapshot = ReportingSnapshot(app, db, make_url(app.config['SQLALCHEMY_DATABASE_URI']).database or DB_PATH,
+                                       app.config['REPORTING_SNAPSHOT_PATH'],
+                                       interval=app.config['REPORTING_SNAPSHOT_INTERVAL'],
+                                       max_age=app.config['REPORTING_SNAPSHOT_MAX_AGE'],
+                                       enabled=app.config['REPORTING_SNAPSHOT_ENABLED'])
+
+analytics_cache = AnalyticsCache()
+
+def warm_analytics():
+    with reporting_snapshot.reading():
+        analytics_cache.build(reporting_snapshot.version())
+
+if app.config['ANALYTICS_CACHE_ENABLED']:
+    reporting_snapshot.on_refresh.append(warm_analytics)
+
+gallery_cache = None
+if app.config['GALLERY_CACHE_ENABLED']:
+    gallery_cache = GalleryCache(max_bytes=app.config['GALLERY_CACHE_MAX_MB'] * 1024 * 1024)
+
+response_cache = ResponseCache(max_age=app.config['RESPONSE_CACHE_MAX_AGE'],
+                               max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+                               enabled=app.config['RESPONSE_CACHE_ENABLED'],
+                               version_dir=app.config['RESPONSE_CACHE_VERSION_DIR'])
+
+load_shedder = LoadShedder(max_in_flight=app.config['LOAD_MAX_IN_FLIGHT'],
+                           latency_budget=app.config['LOAD_LATENCY_BUDGET'],
+                           base_interval_ms=app.config['LOAD_BASE_INTERVAL_MS'],
+                           max_interval_ms=app.config['LOAD_MAX_INTERVAL_MS'],
+                           degrade_after=app.config['LOAD_DEGRADE_AFTER'],
+                           recover_after=app.config['LOAD_RECOVER_AFTER'])
+
+# Galleries are built up front for the venue profile's model, unless the recognition service matches
+period_warmer = PeriodWarmer(app, lead_minutes=app.config['GALLERY_WARMUP_LEAD_MINUTES'],
+                             interval=app.config['GALLERY_WARMUP_INTERVAL'],
+                             model_for=None if recognition_client else lambda period: recognition_model(
+                                 resolve_profile(period.venue, None, app.config['RECOGNITION_DEFAULT_PROFILE'])))
 
 # --- Function to Create Database Tables ---
+schema_upgraded = False
+schema_lock = threading.Lock()
+
 @app.before_request
 def create_tables():
     # This function will run before the first request to the application.
     # It creates the database tables based on the models defined in models.py
     # The 'app_context' is needed for the database operations to know about the app's configuration.
-    with app.app_context():
-        db.create_all()
+    global schema_upgraded
+    if schema_upgraded:
+        return
+    with schema_lock, app.app_context():
+        if not schema_upgraded:
+            db.create_all(bind_key=None) # The read-only binds share its tables
+            # New columns on existing tables, and the built-in recognition profiles
+            add_missing_columns()
+            ensure_default_profiles(app.config['RECOGNITION_DEFAULT_PROFILE'], app.config['RECOGNITION_BACKEND'])
+            schema_upgraded = True
+            # Attendance acknowledged before a crash but never written
+            if attendance_writer:
+                try:
+                    attendance_writer.recover()
+                except Exception as e:
+                    print(f"[ERROR] Could not write recovered attendance: {e}")
+
+# --- Background Jobs ---
+background_jobs_pid = None # Process the jobs were started in; a forked worker starts its own
+background_jobs_lock = threading.Lock()
+
+@app.before_request
+def start_background_jobs():
+    """
+    Starts this process's background threads on its first request, once
+    per process.
+    """
+    global background_jobs_pid
+    if background_jobs_pid == os.getpid() or not app.config['BACKGROUND_JOBS_ENABLED']:
+        return
+    with background_jobs_lock:
+        if background_jobs_pid == os.getpid():
+            return
+        background_jobs_pid = os.getpid()
+        if app.config['ABSENCE_JOB_ENABLED']:
+            AbsenceScheduler(app, interval=app.config['ABSENCE_JOB_INTERVAL'],
+                             grace_minutes=app.config['ABSENCE_GRACE_MINUTES'],
+                             catchup_days=app.config['ABSENCE_CATCHUP_DAYS']).start()
+        if app.config['GALLERY_WARMUP_ENABLED']:
+            period_warmer.start()
+        if app.config['REPORTING_SNAPSHOT_ENABLED']:
+            reporting_snapshot.start()
 
 # --- Face Recognition Helper Function (from camera.py) ---
-def compute_embedding(image_bytes):
+stage_timer = StageTimer(RECOGNITION_STAGE_SECONDS)
+
+def compute_embedding(image_bytes, detect=True, profile=None):
     """
-    Decodes image bytes, converts to numpy array, and computes face embedding.
+    Decodes image bytes, converts to numpy array, and computes face embedding
+    with the profile's recognition backend (or the recognition service).
+    With detect=False the image is embedded as an already cropped face.
     """
     try:
+        if recognition_client:
+            with stage_timer.stage('service_embed'):
+                return recognition_client.embed(image_bytes, detect=detect, profile=service_profile(profile))
+
         # Decode image bytes into an OpenCV image
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        with stage_timer.stage('imdecode'):
+            img = decode_image(image_bytes)
         
         if img is None:
             raise ValueError("Could not decode image bytes.")
         
-        # Use DeepFace to generate the embedding
-        embedding_objs = DeepFace.represent(
-            img_path=img,
-            model_name="SFace",
-            detector_backend="ssd",
-            enforce_detection=False # Allow it to fail gracefully if no face
-        )
-        if not embedding_objs or not embedding_objs[0]["facial_area"]["w"] > 0:
-            return None
-        
-        # Extract the embedding vector
-        embedding = embedding_objs[0]["embedding"]
-        return np.array(embedding, dtype=np.float32)
+        if not detect:
+            return recognition_backend(profile).represent_crop(img, timer=stage_timer)
+        if profile is not None:
+            img = limit_width(img, profile.input_width)
+        return recognition_backend(profile).represent(img, timer=stage_timer)
 
     except Exception as e:
         print(f"Error in compute_embedding: {e}")
         return None
 
+def decode_data_url(data_url):
+    """
+    Returns the bytes of a Base64 data URL ('data:image/jpeg;base64,...').
+    """
+    header, encoded = data_url.split(',', 1)
+    return base64.b64decode(encoded)
+
+def parse_crop_box(value):
+    """
+    Validates the 'crop_box' sent with a face crop: [x, y, width, height] of
+    the crop in the original frame. Returns a tuple, or None if not sent.
+    """
+    if value is None:
+        return None
+    if (not isinstance(value, list) or len(value) != 4 or
+            not all(isinstance(v, (int, float)) for v in value) or min(value[2:]) <= 0):
+        raise ValueError("crop_box must be [x, y, width, height]")
+    return tuple(int(v) for v in value)
+
+def recognition_input(image_bytes, face_crop):
+    """
+    Decides what recognition runs on. A face crop that passes the quality
+    checks is embedded directly; otherwise detection runs on the full frame,
+    or on the crop itself when no frame was sent. Returns (image_bytes, detect).
+    """
+    if face_crop is None:
+        return image_bytes, True
+
+    crop_bytes, crop_box = face_crop
+    with stage_timer.stage('imdecode'):
+        crop = decode_image(crop_bytes)
+    problem = face_crop_problem(crop, crop_box,
+                                min_size=app.config['FACE_CROP_MIN_SIZE'],
+                                min_sharpness=app.config['FACE_CROP_MIN_SHARPNESS'],
+                                brightness=app.config['FACE_CROP_BRIGHTNESS'])
+    FACE_CROPS.labels(result=problem or 'accepted').inc()
+    if problem is None:
+        return crop_bytes, False
+    return (image_bytes if image_bytes is not None else crop_bytes), True
+
+def recognition_backend(profile=None):
+    """
+    Returns the in-process recognition backend for a profile (or the
+    configured one), wrapped for micro-batching when RECOGNITION_BATCH_SIZE
+    is set.
+    """
+    if profile is not None:
+        name, options = profile.backend, backend_options(profile)
+    else:
+        name, options = app.config['RECOGNITION_BACKEND'] or 'deepface', app.config['RECOGNITION_BACKEND_OPTIONS']
+    if app.config['RECOGNITION_BATCH_SIZE'] > 1:
+        return get_batching_backend(name, app.config['RECOGNITION_BATCH_SIZE'],
+                                    app.config['RECOGNITION_BATCH_WAIT_MS'], **options)
+    return get_backend(name, **options)
+
+def recognition_model(profile=None):
+    """
+    The recognition model behind a profile's embeddings; templates are only
+    compared with embeddings from the same model.
+    """
+    if profile is not None:
+        return profile.model_name
+    if recognition_client:
+        return app.config['RECOGNITION_BACKEND_OPTIONS'].get('model_name', DEFAULT_MODEL)
+    return recognition_backend().model_name
+
+def service_profile(profile):
+    """
+    The profile settings sent with recognition service requests.
+    """
+    if profile is None:
+        return None
+    return {field: getattr(profile, field) for field in ('backend', 'model_name', 'detector_backend', 'input_width')}
+
+def invalidate_galleries(module_code=None, student_number=None):
+    """
+    Drops cached and warm galleries and tells the recognition service to
+    reload its own after enrolments or registrations change.
+    """
+    if gallery_cache:
+        gallery_cache.invalidate(module_code=module_code, student_number=student_number)
+    period_warmer.invalidate(module_code=module_code, student_number=student_number)
+    if not recognition_client:
+        return
+    try:
+        recognition_client.invalidate(module_code=module_code, student_number=student_number)
+    except RecognitionServiceError as e:
+        print(f"[WARN] Could not invalidate recognition galleries: {e}")
+
 # --- Authentication Decorator ---
 def login_required(f):
     """
@@ -488,6 +853,7 @@ def get_lecturer_periods():
 
 @app.route('/api/lecturer/attendance_statistics', methods=['GET'])
 @login_required
+@reporting_snapshot.reads
 def get_lecturer_attendance_statistics():
     """
     API endpoint to get comprehensive attendance statistics for all modules 
@@ -500,103 +866,33 @@ def get_lecturer_attendance_statistics():
 
         # Get all modules taught by this lecturer
         lecturer_modules = Module.query.filter_by(lecturer_number=lecturer_number).all()
-        
+        attendance = analytics_cache.modules(reporting_snapshot.version(),
+                                             [module.module_code for module in lecturer_modules])
+
         statistics = []
-        
         for module in lecturer_modules:
-            # Get all students registered for this module
-            class_registers = Class_Register.query.filter_by(subject_code=module.module_code).all()
-            registered_students = set([reg.student_number for reg in class_registers])
-            total_students = len(registered_students)
-            
-            # Get all class periods for this module
-            module_periods = Class_Period.query.join(Class_Register).filter(
-                Class_Register.subject_code == module.module_code
-            ).all()
-            
-            total_periods = len(module_periods)
-            
-            # Calculate attendance statistics
-            total_possible_attendance = total_students * total_periods
-            
-            # Get all attendance records for this module's periods
-            period_ids = [p.id for p in module_periods]
-            attendance_records = Attendance.query.filter(
-                Attendance.class_period_id.in_(period_ids)
-            ).all()
-            
-            total_actual_attendance = len(attendance_records)
-            
-            # Calculate overall attendance rate
-            overall_rate = 0
-            if total_possible_attendance > 0:
-                overall_rate = (total_actual_attendance / total_possible_attendance) * 100
-            
-            # Get recent attendance trends (last 5 periods)
-            recent_periods = sorted(module_periods, 
-                                   key=lambda p: (p.day_of_week, p.period_start_time), 
-                                   reverse=True)[:5]
-            
-            recent_attendance = []
-            for period in recent_periods:
-                period_attendance_count = Attendance.query.filter_by(
-                    class_period_id=period.id
-                ).count()
-                
-                period_rate = 0
-                if total_students > 0:
-                    period_rate = (period_attendance_count / total_students) * 100
-                
-                recent_attendance.append({
-                    'period_id': period.period_id,
-                    'day': period.day_of_week,
-                    'time': f"{period.period_start_time} - {period.period_end_time}",
-                    'venue': period.venue.venue_name if period.venue else 'Unknown',
-                    'attendance_count': period_attendance_count,
-                    'attendance_rate': round(period_rate, 2)
-                })
-            
-            # Get student attendance breakdown
-            student_breakdown = []
-            for student_number in registered_students:
-                student = Student.query.filter_by(student_number=student_number).first()
-                if student:
-                    student_attendance = Attendance.query.filter(
-                        Attendance.user_id == student_number,
-                        Attendance.class_period_id.in_(period_ids)
-                    ).count()
-                    
-                    student_rate = 0
-                    if total_periods > 0:
-                        student_rate = (student_attendance / total_periods) * 100
-                    
-                    student_breakdown.append({
-                        'student_number': student_number,
-                        'name': f"{student.student_name} {student.student_surname}",
-                        'attended': student_attendance,
-                        'total_periods': total_periods,
-                        'attendance_rate': round(student_rate, 2),
-                        'status': 'Good' if student_rate >= 80 else 'Warning' if student_rate >= 60 else 'Critical'
-                    })
-            
-            # Sort students by attendance rate (lowest first for attention)
-            student_breakdown.sort(key=lambda x: x['attendance_rate'])
-            
+            module_attendance = attendance[module.module_code]
             statistics.append({
                 'module_code': module.module_code,
                 'module_name': module.module_name,
-                'total_students': total_students,
-                'total_periods': total_periods,
-                'overall_attendance_rate': round(overall_rate, 2),
-                'total_attendance_records': total_actual_attendance,
-                'recent_attendance': recent_attendance,
-                'student_breakdown': student_breakdown
+                'total_students': module_attendance.total_students,
+                'total_periods': len(module_attendance.periods),
+                'total_sessions': module_attendance.total_sessions,
+                'overall_attendance_rate': round(module_attendance.overall_rate(), 2),
+                'total_attendance_records': module_attendance.records,
+                'recent_attendance': module_attendance.recent_sessions(5),
+                # Lowest attendance rate first, for attention
+                'student_breakdown': module_attendance.student_breakdown(),
+                'weekly_trend': module_attendance.weekly_trend(),
+                'at_risk_count': int(module_attendance.at_risk(app.config['AT_RISK_MAX_RATE'],
+                                                               app.config['AT_RISK_MIN_STREAK']).sum())
             })
         
         return jsonify({
             'lecturer_name': f"{session.get('lecturer_name')} {session.get('lecturer_surname')}",
             'total_modules': len(lecturer_modules),
-            'statistics': statistics
+            'statistics': statistics,
+            'data_freshness': reporting_snapshot.freshness()
         })
         
     except Exception as e:
@@ -605,6 +901,7 @@ def get_lecturer_attendance_statistics():
 
 @app.route('/api/lecturer/module_statistics/<module_code>', methods=['GET'])
 @login_required
+@reporting_snapshot.reads
 def get_module_detailed_statistics(module_code):
     """
     API endpoint to get detailed statistics for a specific module.
@@ -623,68 +920,72 @@ def get_module_detailed_statistics(module_code):
         if not module:
             return jsonify({'error': 'Module not found or access denied'}), 404
         
-        # Get all students registered for this module
-        class_registers = Class_Register.query.filter_by(subject_code=module_code).all()
-        registered_students = [reg.student_number for reg in class_registers]
-        
-        # Get all periods for this module
-        module_periods = Class_Period.query.join(Class_Register).filter(
-            Class_Register.subject_code == module_code
-        ).all()
-        
-        # Detailed period-by-period breakdown
-        period_details = []
-        for period in module_periods:
-            attendance_records = Attendance.query.filter_by(
-                class_period_id=period.id
-            ).all()
-            
-            present_students = [a.user_id for a in attendance_records]
-            absent_students = [s for s in registered_students if s not in present_students]
-            
-            period_details.append({
-                'period_id': period.period_id,
-                'day': period.day_of_week,
-                'time': f"{period.period_start_time} - {period.period_end_time}",
-                'venue': period.venue.venue_name if period.venue else 'Unknown',
-                'total_students': len(registered_students),
-                'present_count': len(present_students),
-                'absent_count': len(absent_students),
-                'attendance_rate': round((len(present_students) / len(registered_students) * 100), 2) if registered_students else 0,
-                'present_students': present_students,
-                'absent_students': absent_students
-            })
-        
-        # Sort by day and time
-        day_order = {'Monday': 1, 'Tuesday': 2, 'Wednesday': 3, 'Thursday': 4, 'Friday': 5, 'Saturday': 6, 'Sunday': 7}
-        period_details.sort(key=lambda x: (day_order.get(x['day'], 8), x['time']))
-        
-        # Calculate weekly pattern
-        weekly_pattern = {}
-        for period in period_details:
-            day = period['day']
-            if day not in weekly_pattern:
-                weekly_pattern[day] = {'total_periods': 0, 'avg_rate': 0, 'rates': []}
-            weekly_pattern[day]['total_periods'] += 1
-            weekly_pattern[day]['rates'].append(period['attendance_rate'])
-        
-        for day, data in weekly_pattern.items():
-            data['avg_rate'] = round(sum(data['rates']) / len(data['rates']), 2) if data['rates'] else 0
-            del data['rates']
+        module_attendance = analytics_cache.modules(reporting_snapshot.version(), [module_code])[module_code]
         
         return jsonify({
             'module_code': module.module_code,
             'module_name': module.module_name,
-            'total_students': len(registered_students),
-            'total_periods': len(module_periods),
-            'period_details': period_details,
-            'weekly_pattern': weekly_pattern
+            'total_students': module_attendance.total_students,
+            'total_periods': len(module_attendance.periods),
+            'total_sessions': module_attendance.total_sessions,
+            # Period by period, sorted by day and time
+            'period_details': module_attendance.period_details(),
+            'weekly_pattern': module_attendance.weekly_pattern(),
+            'weekly_trend': module_attendance.weekly_trend(),
+            'at_risk_count': int(module_attendance.at_risk(app.config['AT_RISK_MAX_RATE'],
+                                                           app.config['AT_RISK_MIN_STREAK']).sum()),
+            'data_freshness': reporting_snapshot.freshness()
         })
         
     except Exception as e:
         print(f"Error fetching module statistics: {e}")
         return jsonify({'error': 'Error fetching module statistics'}), 500
 
+@app.route('/api/at_risk_students', methods=['GET'])
+@login_required
+@compressed(min_bytes=app.config['RESPONSE_COMPRESSION_MIN_BYTES'], level=app.config['RESPONSE_COMPRESSION_LEVEL'])
+@reporting_snapshot.reads
+def get_at_risk_students():
+    """
+    API endpoint to list students at risk in a lecturer's modules (the
+    logged-in lecturer's unless lecturer_number is given): attending below
+    max_rate (%) or absent from the last min_streak sessions in a row.
+    Filter with module_code, date_from and date_to.
+    """
+    try:
+        module_code = request.args.get('module_code')
+        lecturer_number = request.args.get('lecturer_number') or session.get('lecturer_number')
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+        error = validate_filters(date_from=date_from, date_to=date_to)
+        if error:
+            return jsonify({'error': error}), 400
+        try:
+            max_rate = float(request.args.get('max_rate', app.config['AT_RISK_MAX_RATE']))
+            min_streak = int(request.args.get('min_streak', app.config['AT_RISK_MIN_STREAK']))
+        except ValueError:
+            return jsonify({'error': 'max_rate must be a number and min_streak a whole number'}), 400
+
+        module_codes = [code for (code,) in db.session.query(Module.module_code).filter_by(
+            lecturer_number=lecturer_number)]
+        if module_code:
+            module_codes = [code for code in module_codes if code == module_code]
+
+        modules = analytics_cache.modules(reporting_snapshot.version(), module_codes, date_from, date_to)
+        students = at_risk_students(modules.values(), max_rate=max_rate, min_streak=min_streak)
+        return jsonify({
+            'max_rate': max_rate,
+            'min_streak': min_streak,
+            'total_modules': len(modules),
+            'total_students': len(students),
+            'students': students,
+            'data_freshness': reporting_snapshot.freshness()
+        })
+
+    except Exception as e:
+        print(f"Error fetching at-risk students: {e}")
+        return jsonify({'error': 'Error fetching at-risk students'}), 500
+
 
 # --- LECTURER API ENDPOINTS ---
 
@@ -738,6 +1039,7 @@ def get_lecturer_by_id(lecturer_number):
 # --- MODULE API ENDPOINTS ---
 
 @app.route('/api/modules')
+@response_cache.cached('module')
 def get_modules():
     """
     API endpoint to get all modules as JSON
@@ -829,6 +1131,7 @@ def delete_module(module_id):
 # --- VENUE API ENDPOINTS ---
 
 @app.route('/api/venues', methods=['GET'])
+@response_cache.cached('venue', 'recognition_profile')
 def get_venues():
     """
     API endpoint to get all venues as JSON
@@ -839,7 +1142,8 @@ def get_venues():
             'id': v.id,
             'name': v.venue_name,
             'block': v.venue_block,
-            'campus': v.venue_campus
+            'campus': v.venue_campus,
+            'recognition_profile': v.recognition_profile.name if v.recognition_profile else None
         } for v in venues])
     except Exception as e:
         print(f"Error fetching venues: {e}")
@@ -855,7 +1159,8 @@ def get_venue(venue_id):
                 'id': venue.id,
                 'name': venue.venue_name,
                 'block': venue.venue_block,
-                'campus': venue.venue_campus
+                'campus': venue.venue_campus,
+                'recognition_profile': venue.recognition_profile.name if venue.recognition_profile else None
             })
         return jsonify({'error': 'Venue not found'}), 404
     except Exception as e:
@@ -878,10 +1183,17 @@ def add_venue():
         if Venue.query.filter_by(venue_name=venue_name).first():
             return jsonify({'error': f'Venue with name {venue_name} already exists'}), 409
 
+        profile = None
+        if data.get('recognition_profile'):
+            profile = get_profile(data['recognition_profile'])
+            if not profile:
+                return jsonify({'error': f"Recognition profile {data['recognition_profile']} not found"}), 404
+
         new_venue = Venue(
             venue_name=venue_name,
             venue_block=venue_block,
-            venue_campus=venue_campus
+            venue_campus=venue_campus,
+            recognition_profile=profile
         )
         
         db.session.add(new_venue)
@@ -918,6 +1230,14 @@ def update_venue(venue_id):
             venue.venue_block = venue_block
         if venue_campus:
             venue.venue_campus = venue_campus
+        # An explicit null clears the venue's profile (the default applies)
+        if 'recognition_profile' in data:
+            profile = None
+            if data['recognition_profile']:
+                profile = get_profile(data['recognition_profile'])
+                if not profile:
+                    return jsonify({'error': f"Recognition profile {data['recognition_profile']} not found"}), 404
+            venue.recognition_profile = profile
 
         db.session.commit()
         return jsonify({'message': 'Venue updated successfully'}), 200
@@ -949,9 +1269,102 @@ def delete_venue(venue_id):
         print(f"Error deleting venue: {e}")
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
+# --- RECOGNITION PROFILE API ENDPOINTS ---
+
+@app.route('/api/recognition_profiles', methods=['GET'])
+def get_recognition_profiles():
+    """
+    API endpoint to get all recognition profiles as JSON
+    """
+    try:
+        profiles = Recognition_Profile.query.order_by(Recognition_Profile.id).all()
+        return jsonify([dict(profile_to_dict(p), default=p.name == app.config['RECOGNITION_DEFAULT_PROFILE'])
+                        for p in profiles])
+    except Exception as e:
+        print(f"Error fetching recognition profiles: {e}")
+        return jsonify({'error': 'Error fetching recognition profile data'}), 500
+
+@app.route('/api/recognition_profiles/<name>', methods=['PUT'])
+def save_recognition_profile(name):
+    """
+    API endpoint to create or update a recognition profile. Fields that are
+    not sent keep their current (or default) values.
+    """
+    try:
+        data = request.get_json() or {}
+        profile = get_profile(name)
+        settings = profile_to_dict(profile) if profile else dict(DEFAULT_PROFILES['balanced'])
+        settings.update({field: data[field] for field in PROFILE_FIELDS if field in data})
+
+        error = validate_profile_settings(settings)
+        if error:
+            return jsonify({'error': error}), 400
+
+        created = profile is None
+        if created:
+            profile = Recognition_Profile(name=name)
+            db.session.add(profile)
+        for field in PROFILE_FIELDS:
+            setattr(profile, field, settings[field])
+        db.session.commit()
+        return jsonify({'message': f"Recognition profile {name} {'added' if created else 'updated'} successfully"}), \
+            201 if created else 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error saving recognition profile: {e}")
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+@app.route('/api/capture_stations', methods=['GET'])
+def get_capture_stations():
+    """
+    API endpoint to get all capture stations with their recognition profiles.
+    """
+    try:
+        stations = Capture_Station.query.order_by(Capture_Station.station_id).all()
+        return jsonify([{
+            'station_id': s.station_id,
+            'name': s.name,
+            'recognition_profile': s.recognition_profile.name if s.recognition_profile else None
+        } for s in stations])
+    except Exception as e:
+        print(f"Error fetching capture stations: {e}")
+        return jsonify({'error': 'Error fetching capture station data'}), 500
+
+@app.route('/api/capture_stations/<station_id>', methods=['PUT'])
+def save_capture_station(station_id):
+    """
+    API endpoint to register a capture station or change its recognition
+    profile. The capture page shows its station ID; a null profile falls back
+    to the venue's.
+    """
+    try:
+        data = request.get_json() or {}
+        profile = None
+        if data.get('recognition_profile'):
+            profile = get_profile(data['recognition_profile'])
+            if not profile:
+                return jsonify({'error': f"Recognition profile {data['recognition_profile']} not found"}), 404
+
+        station = Capture_Station.query.filter_by(station_id=station_id).first()
+        if station is None:
+            station = Capture_Station(station_id=station_id)
+            db.session.add(station)
+        if 'name' in data:
+            station.name = data['name']
+        station.recognition_profile = profile
+        db.session.commit()
+        return jsonify({'message': 'Capture station saved successfully'}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error saving capture station: {e}")
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
 # --- CLASS PERIOD API ENDPOINTS ---
 
 @app.route('/api/periods', methods=['GET'])
+@response_cache.cached('class_period', 'class_register', 'venue')
 def get_periods():
     """
     API endpoint to get all class periods as JSON
@@ -1041,11 +1454,15 @@ def delete_period(period_id):
         if not period:
             return jsonify({'error': 'Period not found'}), 404
 
-        # Check if period has attendance records
-        attendance_count = Attendance.query.filter_by(class_period_id=period.id).count()
+        # Check if period has attendance records; the absence job's 'Absence'
+        # rows only exist because the period ran, so they go with it
+        attendance_count = Attendance.query.filter(Attendance.class_period_id == period.id,
+                                                   Attendance.status != 'Absence').count()
         if attendance_count > 0:
             return jsonify({'error': f'Cannot delete period. It has {attendance_count} attendance record(s)'}), 400
 
+        db.session.execute(db.delete(Attendance).where(Attendance.class_period_id == period.id,
+                                                       Attendance.status == 'Absence'))
         db.session.delete(period)
         db.session.commit()
         return jsonify({'message': 'Period deleted successfully'}), 200
@@ -1145,6 +1562,7 @@ def get_all_registers():
         return jsonify({'error': 'Error fetching register data'}), 500
 
 @app.route('/api/modules/<module_code>/register/summary', methods=['GET'])
+@reporting_snapshot.reads
 def get_module_register_summary(module_code):
     """
     API endpoint to get a summary of a module's register including stats
@@ -1179,7 +1597,7 @@ def get_module_register_summary(module_code):
         ).order_by(Class_Period.period_start_time.desc()).limit(5).all()
         
         for period in class_periods:
-            attendance_count = Attendance.query.filter_by(class_period_id=period.id).count()
+            attendance_count = Attendance.query.filter_by(class_period_id=period.id, status='Present').count()
             recent_attendance.append({
                 'period_id': period.period_id,
                 'date': period.period_start_time,
@@ -1197,7 +1615,8 @@ def get_module_register_summary(module_code):
                 'students_with_face_id': students_with_face_id,
                 'students_without_face_id': total_students - students_with_face_id
             },
-            'recent_attendance': recent_attendance
+            'recent_attendance': recent_attendance,
+            'data_freshness': reporting_snapshot.freshness()
         })
         
     except Exception as e:
@@ -1255,8 +1674,10 @@ def add_class_register():
         
         # Check if register already exists
         existing_register = Class_Register.query.filter_by(register_id=register_id).first()
+        changed_codes = set(module_codes)
         if existing_register:
             # Update existing register
+            changed_codes.update((existing_register.subject_code or '').split(','))
             existing_register.subject_code = ','.join(module_codes)
             message = 'Class register updated successfully'
         else:
@@ -1272,6 +1693,10 @@ def add_class_register():
             message = 'Class register created successfully'
         
         db.session.commit()
+        # Modules gaining or losing the student
+        for code in changed_codes:
+            if code:
+                invalidate_galleries(module_code=code)
         return jsonify({'message': message}), 201
         
     except Exception as e:
@@ -1294,8 +1719,12 @@ def delete_class_register(register_id):
         if class_periods > 0:
             return jsonify({'error': f'Cannot delete register. It is being used in {class_periods} class period(s)'}), 400
         
+        module_codes = (register.subject_code or '').split(',')
         db.session.delete(register)
         db.session.commit()
+        for code in module_codes:
+            if code:
+                invalidate_galleries(module_code=code)
         return jsonify({'message': 'Register deleted successfully'}), 200
         
     except Exception as e:
@@ -1306,6 +1735,7 @@ def delete_class_register(register_id):
 # --- ATTENDANCE API ENDPOINTS ---
 
 @app.route('/api/attendance', methods=['GET'])
+@read_only()
 def get_attendance():
     """
     API endpoint to get attendance records with filtering options
@@ -1413,6 +1843,7 @@ def update_attendance(attendance_id):
         attendance.name = data.get('name', attendance.name)
 
         db.session.commit()
+        period_warmer.invalidate(period_id=attendance.class_period_id)
         return jsonify({'message': 'Attendance record updated successfully'}), 200
         
     except Exception as e:
@@ -1430,6 +1861,7 @@ def delete_attendance(attendance_id):
 
         db.session.delete(attendance)
         db.session.commit()
+        period_warmer.invalidate(period_id=attendance.class_period_id)
         return jsonify({'message': 'Attendance record deleted successfully'}), 200
         
     except Exception as e:
@@ -1437,6 +1869,139 @@ def delete_attendance(attendance_id):
         print(f"Error deleting attendance: {e}")
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
+@app.route('/api/attendance/export', methods=['GET'])
+def export_attendance():
+    """
+    Streams attendance joined with student, module, period and venue
+    details. Query parameters: format (csv or parquet), module_code,
+    lecturer_number, date_from and date_to (YYYY-MM-DD, inclusive).
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(FORMATS)}"}), 400
+    if export_format == 'parquet' and not PARQUET_AVAILABLE:
+        return jsonify({'error': "Parquet export needs the 'pyarrow' package on the server"}), 400
+    filters = {name: request.args.get(name) or None
+               for name in ('module_code', 'lecturer_number', 'date_from', 'date_to')}
+    error = validate_filters(**filters)
+    if error:
+        return jsonify({'error': error}), 400
+
+    mimetype, extension = FORMATS[export_format]
+    chunks = export_chunks(export_format, page_size=app.config['EXPORT_PAGE_SIZE'], **filters)
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f"attachment; filename=attendance_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}")
+    return response
+
+# Fields each section of the attendance view bootstrap can return, in the
+# shapes of /api/students, /api/modules, /api/periods and /api/attendance
+BOOTSTRAP_FIELDS = {
+    'students': ['student_number', 'name', 'surname', 'modules'],
+    'modules': ['code', 'name', 'lecturer'],
+    'periods': ['id', 'period_id', 'class_register', 'period_start_time', 'period_end_time', 'day_of_week',
+                'venue_id', 'venue_name', 'module_codes'],
+    'attendance': ['id', 'user_id', 'class_period_id', 'name', 'time', 'date', 'status', 'venue_name'],
+}
+
+def bootstrap_students():
+    rows = db.session.query(
+        Student.student_number, Student.student_name, Student.student_surname, Class_Register.subject_code
+    ).outerjoin(Class_Register, Class_Register.student_number == Student.student_number).order_by(
+        Student.student_surname, Student.id, Class_Register.id
+    )
+    students = {}
+    for student_number, name, surname, subject_code in rows:
+        student = students.setdefault(student_number, {
+            'student_number': student_number, 'name': name, 'surname': surname, 'modules': []
+        })
+        if subject_code:
+            # Handle comma-separated module codes
+            student['modules'].extend(subject_code.split(','))
+    return list(students.values())
+
+def bootstrap_modules():
+    rows = db.session.query(Module.module_code, Module.module_name, Module.lecturer_number).order_by(Module.module_name)
+    return [{'code': code, 'name': name, 'lecturer': lecturer} for code, name, lecturer in rows]
+
+def bootstrap_periods():
+    # Periods reference a register_id shared by many rows; like /api/periods,
+    # take the module codes from the first of them
+    first_register = db.session.query(
+        Class_Register.register_id, db.func.min(Class_Register.id).label('id')
+    ).group_by(Class_Register.register_id).subquery()
+    rows = db.session.query(Class_Period, Venue.venue_name, Class_Register.subject_code).outerjoin(
+        Venue, Venue.id == Class_Period.period_venue_id
+    ).outerjoin(
+        first_register, first_register.c.register_id == Class_Period.class_register
+    ).outerjoin(
+        Class_Register, Class_Register.id == first_register.c.id
+    ).order_by(Class_Period.day_of_week, Class_Period.period_start_time)
+    return [{
+        'id': p.id,
+        'period_id': p.period_id,
+        'class_register': p.class_register,
+        'period_start_time': p.period_start_time,
+        'period_end_time': p.period_end_time,
+        'day_of_week': p.day_of_week,
+        'venue_id': p.period_venue_id,
+        'venue_name': venue_name or 'Unknown',
+        'module_codes': subject_code.split(',') if subject_code else []
+    } for p, venue_name, subject_code in rows]
+
+def bootstrap_attendance():
+    # Plain columns rather than Attendance objects: this is the largest table
+    columns = [Attendance.id, Attendance.user_id, Attendance.class_period_id, Attendance.name, Attendance.time,
+               Attendance.date, Attendance.status, Venue.venue_name]
+    rows = db.session.query(*columns).outerjoin(
+        Class_Period, Class_Period.id == Attendance.class_period_id
+    ).outerjoin(
+        Venue, Venue.id == Class_Period.period_venue_id
+    ).order_by(Attendance.date.desc(), Attendance.time.asc())
+    return [dict(zip(BOOTSTRAP_FIELDS['attendance'], row)) for row in rows]
+
+BOOTSTRAP_SECTIONS = {
+    'students': bootstrap_students,
+    'modules': bootstrap_modules,
+    'periods': bootstrap_periods,
+    'attendance': bootstrap_attendance,
+}
+
+@app.route('/api/attendance_view/bootstrap', methods=['GET'])
+@compressed(min_bytes=app.config['RESPONSE_COMPRESSION_MIN_BYTES'], level=app.config['RESPONSE_COMPRESSION_LEVEL'])
+@response_cache.cached('students', 'class_register', 'module', 'class_period', 'venue', 'attendance')
+@read_only()
+def attendance_view_bootstrap():
+    """
+    Everything the admin attendance view needs in one response, one query
+    per section. ?sections=students,modules picks the sections (default
+    all); ?<section>=field,field picks the fields of one section, e.g.
+    ?attendance=user_id,class_period_id,date.
+    """
+    sections = request.args.get('sections')
+    sections = sections.split(',') if sections else list(BOOTSTRAP_SECTIONS)
+    unknown = [name for name in sections if name not in BOOTSTRAP_SECTIONS]
+    if unknown:
+        return jsonify({'error': f"Unknown sections: {', '.join(unknown)}"}), 400
+
+    fields = {}
+    for name in sections:
+        requested = request.args.get(name)
+        fields[name] = requested.split(',') if requested else BOOTSTRAP_FIELDS[name]
+        unknown = [field for field in fields[name] if field not in BOOTSTRAP_FIELDS[name]]
+        if unknown:
+            return jsonify({'error': f"Unknown {name} fields: {', '.join(unknown)}. "
+                                     f"Choose from: {', '.join(BOOTSTRAP_FIELDS[name])}"}), 400
+
+    try:
+        data = {}
+        for name in sections:
+            data[name] = [{field: row[field] for field in fields[name]} for row in BOOTSTRAP_SECTIONS[name]()]
+        return jsonify(data)
+    except Exception as e:
+        print(f"Error fetching attendance view data: {e}")
+        return jsonify({'error': 'Error fetching attendance view data'}), 500
+
 # --- STUDENT API ENDPOINTS ---
 
 @app.route('/api/students/check/<student_number>', methods=['GET'])
@@ -1449,6 +2014,7 @@ def check_student_exists(student_number):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/students', methods=['GET'])
+@response_cache.cached('students', 'class_register')
 def get_students():
     """ API to get a list of all students and their registered modules. """
     try:
@@ -1565,6 +2131,9 @@ def add_student():
                 db.session.add(new_register)
 
         db.session.commit()
+        # Cached rosters of these modules do not include the new student
+        for code in module_codes:
+            invalidate_galleries(module_code=code)
         return jsonify({'message': 'Student added successfully'}), 201
         
     except Exception as e:
@@ -1572,6 +2141,43 @@ def add_student():
         print(f"Error adding student: {e}")
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
+@app.route('/api/students/import', methods=['POST'])
+def import_students():
+    """
+    Bulk adds students and their module registrations from a JSON list, a
+    CSV body (text/csv) or an uploaded CSV file ('file'), validating the
+    whole batch at once. Query parameters: enroll_existing=1 adds missing
+    registrations for existing students instead of rejecting their rows,
+    dry_run=1 only validates. Streams back newline-delimited JSON: one line
+    per rejected row, then a summary line.
+    """
+    flag = lambda name: request.args.get(name, '0').lower() in ('1', 'true', 'yes')
+    try:
+        if request.is_json:
+            records = read_json(request.get_json())
+        else:
+            upload = request.files.get('file')
+            raw = upload.read() if upload else request.get_data()
+            if not raw:
+                return jsonify({'error': 'A JSON list or CSV file of students is required'}), 400
+            records = read_csv(raw.decode('utf-8-sig'))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': f'Could not read the import: {e}'}), 400
+
+    try:
+        errors, summary = import_records(records, enroll_existing=flag('enroll_existing'), dry_run=flag('dry_run'))
+    except Exception as e:
+        print(f"Error importing students: {e}")
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    if summary['registrations_added'] and not summary['dry_run']:
+        invalidate_galleries()
+
+    def generate():
+        for error in errors:
+            yield json.dumps(error) + '\n'
+        yield json.dumps({'summary': summary}) + '\n'
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/api/students/<student_number>', methods=['PUT'])
 def update_student(student_number):
     """ API to update a student's details and module registrations. """
@@ -1606,6 +2212,9 @@ def update_student(student_number):
 
     try:
         db.session.commit()
+        invalidate_galleries(student_number=student_number)
+        for code in module_codes:
+            invalidate_galleries(module_code=code)
         return jsonify({'message': 'Student updated successfully'}), 200
     except Exception as e:
         db.session.rollback()
@@ -1619,10 +2228,12 @@ def delete_student(student_number):
     # Delete related records first to maintain data integrity
     Attendance.query.filter_by(user_id=student.student_number).delete()
     Class_Register.query.filter_by(student_number=student_number).delete()
+    Face_Template.query.filter_by(student_number=student_number).delete()
 
     db.session.delete(student)
     try:
         db.session.commit()
+        invalidate_galleries(student_number=student_number)
         # Optionally delete the student's face image file
         if student.image_path and os.path.exists(os.path.join(basedir, student.image_path)):
             os.remove(os.path.join(basedir, student.image_path))
@@ -1635,45 +2246,105 @@ def delete_student(student_number):
 def register_face():
     """
     API to handle face registration. Receives image data from the browser,
-    computes embedding, and saves it to the database.
+    computes embedding, and adds it to the student's templates.
+    Pass 'replace': true to discard the previously enrolled templates.
+    A face crop ('face_data' + 'crop_box') is accepted as in mark_attendance.
     """
     data = request.get_json()
     student_number = data.get('student_number')
     image_data_url = data.get('image_data') # This is a Base64 Data URL
+    replace = bool(data.get('replace', False))
 
-    if not all([student_number, image_data_url]):
+    if not student_number or not (image_data_url or data.get('face_data')):
         return jsonify({'error': 'Student number and image data are required'}), 400
 
+    try:
+        crop_box = parse_crop_box(data.get('crop_box'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     student = Student.query.filter_by(student_number=student_number).first_or_404()
 
     try:
         # Decode the Base64 image data
-        header, encoded = image_data_url.split(',', 1)
-        image_bytes = base64.b64decode(encoded)
-
-        # Compute the embedding
-        embedding = compute_embedding(image_bytes)
-        if embedding is None:
+        image_bytes = decode_data_url(image_data_url) if image_data_url else None
+        face_crop = (decode_data_url(data['face_data']), crop_box) if data.get('face_data') else None
+
+        # Compute an embedding with every recognition model in use, so the
+        # student can be recognised under any assigned profile
+        recognition_bytes, detect = recognition_input(image_bytes, face_crop)
+        profiles = enrolment_profiles(app.config['RECOGNITION_DEFAULT_PROFILE']) or [None]
+        embeddings = {}
+        for profile in profiles:
+            embedding = compute_embedding(recognition_bytes, detect=detect, profile=profile)
+            if embedding is not None:
+                embeddings[recognition_model(profile)] = embedding
+        if not embeddings:
             return jsonify({'error': 'No face detected or image is unclear. Please try again.'}), 400
 
         # Save the raw image file to the server
         image_filename = f"{student_number}.jpg"
         image_path = os.path.join(app.config['UPLOAD_FOLDER'], image_filename)
         with open(image_path, "wb") as f:
-            f.write(image_bytes)
-
-        # Update the student record in the database
-        student.embedding = embedding.tobytes()
+            f.write(image_bytes if image_bytes is not None else face_crop[0])
+
+        # Add the embedding to the student's templates
+        if replace:
+            clear_templates(student)
+        template_counts = {}
+        for model_name, embedding in embeddings.items():
+            templates = add_template(student, embedding, source='enrolment',
+                                     max_templates=app.config['GALLERY_MAX_TEMPLATES'], model_name=model_name)
+            template_counts[model_name] = len(templates)
         student.image_path = f"static/faces/{image_filename}" # Store the relative path
         db.session.commit()
+        invalidate_galleries(student_number=student_number)
 
-        return jsonify({'message': 'Face ID registered successfully'}), 200
+        return jsonify({
+            'message': 'Face ID registered successfully',
+            'template_count': next(iter(template_counts.values())),
+            'template_counts': template_counts
+        }), 200
 
     except Exception as e:
         db.session.rollback()
         print(f"Face registration error: {e}")
         return jsonify({'error': 'An internal error occurred during face registration.'}), 500
 
+@app.route('/api/students/bulk_face_enrollment', methods=['POST'])
+def bulk_face_enrollment():
+    """
+    Enrols the photos in an uploaded zip archive ('archive'), each named by
+    student number, e.g. 22012345.jpg. Returns a result for every file.
+    Pass replace=true to re-enrol students who already have a face enrolled.
+    Large cohorts are better run with bulk_enrollment.py on the server.
+    """
+    archive = request.files.get('archive')
+    if archive is None or not archive.filename:
+        return jsonify({'error': 'A zip archive of photos is required'}), 400
+    replace = request.form.get('replace', 'false').lower() in ('1', 'true', 'yes')
+
+    try:
+        profiles = enrolment_profiles(app.config['RECOGNITION_DEFAULT_PROFILE'])
+        results = list(enroll_photos(archive.stream, profiles, app.config['UPLOAD_FOLDER'],
+                                     workers=app.config['BULK_ENROLLMENT_WORKERS'],
+                                     batch_size=app.config['BULK_ENROLLMENT_BATCH_SIZE'], replace=replace,
+                                     max_templates=app.config['GALLERY_MAX_TEMPLATES']))
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'The uploaded file is not a zip archive'}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"Bulk face enrollment error: {e}")
+        return jsonify({'error': 'An internal error occurred during bulk face enrollment.'}), 500
+    invalidate_galleries()
+
+    summary = summarize(results)
+    return jsonify({
+        'message': f"Enrolled {summary.get('enrolled', 0)} of {len(results)} photos",
+        'summary': summary,
+        'results': results
+    }), 200
+
 # --- ATTENDANCE CAPTURE API ---
 
 def cosine_similarity(vec1, vec2):
@@ -1710,14 +2381,66 @@ def is_period_active_now():
     
     return active_period
 
+def identify_student(image_bytes, module_code, detect=True, profile=None, period=None):
+    """
+    Embeds the frame and matches it against the students registered for the
+    module, using the profile's model and the period's warm gallery when
+    there is one. Returns (student, similarity,
+    frame_embedding); frame_embedding is None when no face was found and
+    student is None when nobody matched.
+    """
+    scoring = app.config['GALLERY_SCORING']
+
+    if recognition_client:
+        with stage_timer.stage('service_match'):
+            result = recognition_client.match(image_bytes, module_code, scoring=scoring, detect=detect,
+                                              profile=service_profile(profile))
+        if result.embedding is None:
+            return None, 0.0, None
+        MATCH_SIMILARITY.observe(result.similarity)
+        if result.student_number is None:
+            return None, result.similarity, result.embedding
+        student = Student.query.filter_by(student_number=result.student_number).first()
+        return student, result.similarity, result.embedding
+
+    frame_embedding = compute_embedding(image_bytes, detect=detect, profile=profile)
+    if frame_embedding is None:
+        return None, 0.0, None
+    model_name = recognition_model(profile)
+
+    with stage_timer.stage('gallery_load'):
+        gallery = None
+        if period is not None:
+            gallery = period_warmer.gallery(period.id, datetime.now().strftime("%Y-%m-%d"), model_name,
+                                            frame_embedding.shape[0])
+        if gallery is None and gallery_cache:
+            gallery = gallery_cache.get(module_code, model_name, frame_embedding.shape[0])
+        if gallery is None:
+            # Read all students registered for this specific module
+            gallery = gallery_from_vectors(load_module_vectors(module_code), frame_embedding.shape[0], model_name)
+    GALLERY_STUDENTS.labels(module_code=module_code).set(len(gallery.centroids))
+    GALLERY_TEMPLATES.labels(module_code=module_code).set(len(gallery.owners))
+
+    # Score the frame embedding against every enrolled template at once
+    with stage_timer.stage('gallery_match'):
+        student, similarity = gallery.match(frame_embedding, scoring=scoring)
+    MATCH_SIMILARITY.observe(similarity)
+    if student is not None:
+        # Galleries hold student numbers, not Student objects
+        student = Student.query.filter_by(student_number=student).first()
+    return student, similarity, frame_embedding
+
 @app.route('/api/mark_attendance', methods=['POST'])
 def mark_attendance():
     """
     Receives a video frame, identifies a student, and marks attendance.
+    The capture page may send a face crop ('face_data' + 'crop_box') instead
+    of, or as well as, the full frame ('image_data').
     """
     # 1. Check if a class period is currently active
     active_period = is_period_active_now()
     if not active_period:
+        ATTENDANCE_RESULTS.labels(status='no_active_period').inc()
         return jsonify({
             'status': 'no_active_period',
             'message': 'No class is currently active.'
@@ -1725,83 +2448,204 @@ def mark_attendance():
 
     # 2. Get image data from the request
     data = request.get_json()
-    if not data or 'image_data' not in data:
+    if not data or not (data.get('image_data') or data.get('face_data')):
         return jsonify({'error': 'No image data provided'}), 400
+    try:
+        crop_box = parse_crop_box(data.get('crop_box'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
+    # 3. The active period's module decides which students can match
+    module_code = active_period.register.subject_code
+    # The station's or venue's recognition profile picks the model and threshold
+    profile = resolve_profile(active_period.venue, data.get('station_id'), app.config['RECOGNITION_DEFAULT_PROFILE'])
+    if load_shedder.degraded:
+        profile = cheaper_profile(profile, app.config['LOAD_DEGRADED_PROFILE'])
+    threshold = profile.threshold if profile else app.config['RECOGNITION_THRESHOLD']
+    # Frames are only compared with earlier frames from the same station, period and profile
+    capture_session = (data.get('capture_session') or session.get('lecturer_number'), active_period.id,
+                       profile.name if profile else None)
+
+    # Turn the frame away before decoding it if recognition is over budget
+    if not load_shedder.try_acquire():
+        ATTENDANCE_RESULTS.labels(status='busy').inc()
+        response = jsonify({
+            'status': 'busy',
+            'message': 'Recognition is busy. Retrying shortly.'
+        })
+        response.headers['Retry-After'] = str(load_shedder.retry_after())
+        return response, 503
+
+    latency = None
     try:
         # Decode the Base64 image
-        header, encoded = data['image_data'].split(',', 1)
-        image_bytes = base64.b64decode(encoded)
+        with stage_timer.stage('base64_decode'):
+            image_bytes = decode_data_url(data['image_data']) if data.get('image_data') else None
+            face_crop = (decode_data_url(data['face_data']), crop_box) if data.get('face_data') else None
     
-        # 3. Compute embedding for the face in the frame
-        frame_embedding = compute_embedding(image_bytes)
+        # 4. Reuse the result of a near-identical recent frame, otherwise compute
+        # the frame embedding and score it against the module's gallery
+        # Only whole frames are hashed: aligned face crops of different
+        # students look alike at hash size and would share a result
+        frame_key = None
+        if frame_cache and image_bytes is not None:
+            with stage_timer.stage('frame_hash'):
+                frame_key = frame_hash(image_bytes)
+        cached = frame_cache.get(capture_session, frame_key) if frame_key is not None else None
+
+        if cached:
+            student_number, similarity, face_found = cached
+            student = Student.query.filter_by(student_number=student_number).first() if student_number else None
+            frame_embedding = None # Nothing new to learn from a repeated frame
+        else:
+            started = time.perf_counter()
+            recognition_bytes, detect = recognition_input(image_bytes, face_crop)
+            student, similarity, frame_embedding = identify_student(recognition_bytes, module_code, detect=detect,
+                                                                    profile=profile, period=active_period)
+            latency = time.perf_counter() - started
+            face_found = frame_embedding is not None
+            if frame_key is not None:
+                frame_cache.put(capture_session, frame_key,
+                                (student.student_number if student else None, similarity, face_found))
 
         # Add a check to ensure an embedding was successfully created
-        if frame_embedding is None:
+        if not face_found:
+            ATTENDANCE_RESULTS.labels(status='unidentifiable').inc()
             return jsonify({'status': 'unidentifiable', 'message': 'Could not process the image or no face was detected.'})
 
 
     except Exception as e:
         print(f"[ERROR] Face detection/embedding failed: {e}")
+        ATTENDANCE_RESULTS.labels(status='unidentifiable').inc()
         return jsonify({'status': 'unidentifiable', 'message': 'Could not process the image.'})
-    
-    # 4. Find students registered for the active period's module
-    register_id = active_period.register.register_id
-    module_code = active_period.register.subject_code
+    finally:
+        load_shedder.release(latency)
+
+    if student is not None and similarity > threshold: # Confidence threshold
+
+        # 5. Check if already marked present today for this period; a warm
+        # period or the write queue knows without a query
+        today_date = datetime.now().strftime("%Y-%m-%d")
+        full_name = f"{student.student_name} {student.student_surname}"
+        already_present = (period_warmer.is_present(active_period.id, today_date, student.student_number) or
+                           (attendance_writer is not None and
+                            attendance_writer.is_pending(active_period.id, today_date, student.student_number)))
+        existing_record = None
+        if not already_present:
+            existing_record = Attendance.query.filter_by(
+                user_id=student.student_number,
+                class_period_id=active_period.id,
+                date=today_date
+            ).first()
+            already_present = existing_record is not None and existing_record.status == 'Present'
+
+        if already_present:
+            ATTENDANCE_RESULTS.labels(status='already_present').inc()
+            return jsonify({
+                'status': 'already_present',
+                'student_name': full_name,
+                'student_id': student.student_number
+            })
 
-    # Find all students registered for this specific module
-    registered_students = db.session.query(Student).join(Class_Register).filter(
-        Class_Register.subject_code == module_code
-    ).all()
-    
-    # 5. Compare frame embedding with registered students' embeddings
-    match_found = False
-    for student in registered_students:
-        if student.embedding:
-            db_embedding = np.frombuffer(student.embedding, dtype=np.float32)
-            similarity = cosine_similarity(frame_embedding, db_embedding)
-
-            if similarity > 0.70: # Confidence threshold
-                
-                # 6. Check if already marked present today for this period
-                today_date = datetime.now().strftime("%Y-%m-%d")
-                existing_record = Attendance.query.filter_by(
-                    user_id=student.student_number,
-                    class_period_id=active_period.id,
-                    date=today_date
-                ).first()
-                
-                full_name = f"{student.student_name} {student.student_surname}"
 
-                if existing_record:
-                    return jsonify({
-                        'status': 'already_present',
-                        'student_name': full_name,
-                        'student_id': student.student_number
-                    })
-                
+        # 6. Insert new attendance record, or turn an absence recorded for it
+        # into a presence; with the write queue, in a later batched transaction
+        now_time = datetime.now().strftime("%H:%M:%S")
+        record = {
+            'user_id': student.student_number,
+            'class_period_id': active_period.id,
+            'name': full_name,
+            'time': now_time,
+            'date': today_date,
+            'status': "Present"
+        }
+        if attendance_writer:
+            with stage_timer.stage('db_write'):
+                attendance_writer.submit(record)
+        elif existing_record:
+            existing_record.status = "Present"
+            existing_record.time = now_time
+        else:
+            db.session.add(Attendance(**record))
 
-                # 7. Insert new attendance record
-                now_time = datetime.now().strftime("%H:%M:%S")
-                new_attendance = Attendance(
-                    user_id=student.student_number,
-                    class_period_id=active_period.id,
-                    name=full_name,
-                    time=now_time,
-                    date=today_date,
-                    status="Present"
-                )
-                db.session.add(new_attendance)
+        # 7. Learn from confident captures that differ from the enrolled ones
+        augment = (app.config['GALLERY_AUTO_AUGMENT'] and frame_embedding is not None and
+                   app.config['GALLERY_AUGMENT_MIN_SCORE'] <= similarity < app.config['GALLERY_AUGMENT_MAX_SCORE'])
+        if augment:
+            add_template(student, frame_embedding, source='live', max_templates=app.config['GALLERY_MAX_TEMPLATES'],
+                         model_name=recognition_model(profile))
+
+        if augment or not attendance_writer:
+            with stage_timer.stage('db_write'):
                 db.session.commit()
-                
-                return jsonify({
-                    'status': 'present',
-                    'student_name': full_name,
-                    'student_id': student.student_number
-                })
+        period_warmer.mark_present(active_period.id, today_date, student.student_number)
+        if augment:
+            invalidate_galleries(student_number=student.student_number)
 
-    
+        ATTENDANCE_RESULTS.labels(status='present').inc()
+        return jsonify({
+            'status': 'present',
+            'student_name': full_name,
+            'student_id': student.student_number
+        })
+
+    ATTENDANCE_RESULTS.labels(status='unidentifiable').inc()
     return jsonify({'status': 'unidentifiable', 'message': 'Face does not match any registered student.'})
 
+@app.after_request
+def add_capture_interval(response):
+    """
+    Tells capture pages how often to send frames under the current load.
+    """
+    if request.endpoint == 'mark_attendance':
+        response.headers['X-Capture-Interval-Ms'] = str(load_shedder.interval_ms())
+    return response
+
+@app.route('/api/capture_pacing', methods=['GET'])
+def capture_pacing():
+    """
+    Current recognition load and the capture interval asked of capture pages.
+    """
+    return jsonify(load_shedder.stats())
+
+@app.route('/api/gallery_cache', methods=['GET'])
+def gallery_cache_stats():
+    """
+    Size and hit rate of the module gallery cache.
+    """
+    if not gallery_cache:
+        return jsonify({'enabled': False})
+    return jsonify(dict(gallery_cache.stats(), enabled=True))
+
+@app.route('/api/reporting_snapshot', methods=['GET'])
+def reporting_snapshot_status():
+    """
+    Age and refresh settings of the snapshot the statistics endpoints read
+    from, and the analytics built from it.
+    """
+    return jsonify(dict(reporting_snapshot.status(), analytics=analytics_cache.stats()))
+
+@app.route('/api/gallery_warmup', methods=['GET'])
+def gallery_warmup():
+    """
+    The class periods whose rosters and galleries are currently held in memory.
+    """
+    return jsonify(period_warmer.status())
+
+@app.route('/metrics')
+def metrics():
+    """
+    Recognition metrics in the Prometheus text exposition format.
+    """
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
+    if app.config['RECOGNITION_PRELOAD'] and not recognition_client:
+        with app.app_context():
+            create_tables()
+            profile = get_profile(app.config['RECOGNITION_DEFAULT_PROFILE'])
+        if profile is not None:
+            preload_backend(profile.backend, **backend_options(profile))
+        else:
+            preload_backend(app.config['RECOGNITION_BACKEND'] or 'deepface', **app.config['RECOGNITION_BACKEND_OPTIONS'])
     app.run(debug=True, port=5000) 
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+Streaming export of attendance history joined with student, module,
+period and venue details, as CSV or Parquet (with the optional pyarrow
+package).
+
+    python attendance_export.py --module ABC101 --from 2025-02-01 --to 2025-06-30 --output semester.csv
+
+Rows are read in pages of page_size by attendance id, each page in its own
+short read transaction, so memory stays flat however large the export and
+capture stations can keep committing attendance while it runs. Rows added
+after the export starts are left out. The same code backs
+GET /api/attendance/export.
+"""
+import argparse
+import csv
+import importlib.util
+import io
+import re
+import sys
+from database import read_only
+from models import db, Attendance, Student, Class_Period, Class_Register, Module, Venue
+
+# Optional dependency, needed for Parquet only; imported when first used
+# since it is slow to load
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# Read from the joined query; the module columns come from the period
+QUERY_COLUMNS = [
+    ('attendance_id', Attendance.id),
+    ('date', Attendance.date),
+    ('time', Attendance.time),
+    ('status', Attendance.status),
+    ('student_number', Student.student_number),
+    ('student_name', Student.student_name),
+    ('student_surname', Student.student_surname),
+    ('class_period_id', Attendance.class_period_id),
+    ('period_id', Class_Period.period_id),
+    ('day_of_week', Class_Period.day_of_week),
+    ('period_start_time', Class_Period.period_start_time),
+    ('period_end_time', Class_Period.period_end_time),
+    ('venue_name', Venue.venue_name),
+    ('venue_block', Venue.venue_block),
+    ('venue_campus', Venue.venue_campus),
+]
+MODULE_COLUMNS = ['module_code', 'module_name', 'lecturer_number']
+COLUMN_NAMES = ([name for name, _ in QUERY_COLUMNS[:7]] + MODULE_COLUMNS +
+                [name for name, _ in QUERY_COLUMNS[8:]])
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+def validate_filters(date_from=None, date_to=None, **filters):
+    """
+    Returns an error message for invalid export filters, or None.
+    """
+    for label, value in (('date_from', date_from), ('date_to', date_to)):
+        if value and not DATE_PATTERN.match(value):
+            return f"{label} must be a date in YYYY-MM-DD format"
+    return None
+
+def period_modules():
+    """
+    Maps each class period's id to its (module_code, module_name,
+    lecturer_number). Periods reference a register_id shared by many
+    rows; like /api/periods, the first of them gives the module. There are
+    only as many periods as timetable slots, so this is read once per export
+    rather than joined into every page.
+    """
+    first_register = db.session.query(
+        Class_Register.register_id, db.func.min(Class_Register.id).label('id')
+    ).group_by(Class_Register.register_id).subquery()
+    rows = db.session.query(
+        Class_Period.id, Class_Register.subject_code, Module.module_name, Module.lecturer_number
+    ).outerjoin(
+        first_register, first_register.c.register_id == Class_Period.class_register
+    ).outerjoin(
+        Class_Register, Class_Register.id == first_register.c.id
+    ).outerjoin(
+        Module, Module.module_code == Class_Register.subject_code
+    )
+    return {period_id: (code, name, lecturer) for period_id, code, name, lecturer in rows}
+
+def _export_query(periods, module_code=None, lecturer_number=None, date_from=None, date_to=None):
+    # attendance.user_id is stored as an integer; comparing it as text lets
+    # SQLite use the student_number index instead of scanning students per row
+    query = db.session.query(*[column for _, column in QUERY_COLUMNS]).outerjoin(
+        Student, Student.student_number == db.cast(Attendance.user_id, db.String)
+    ).outerjoin(
+        Class_Period, Class_Period.id == Attendance.class_period_id
+    ).outerjoin(
+        Venue, Venue.id == Class_Period.period_venue_id
+    )
+    if module_code or lecturer_number:
+        query = query.filter(Attendance.class_period_id.in_([
+            period_id for period_id, (code, _, lecturer) in periods.items()
+            if (not module_code or code == module_code) and (not lecturer_number or lecturer == lecturer_number)
+        ]))
+    if date_from:
+        query = query.filter(Attendance.date >= date_from)
+    if date_to:
+        query = query.filter(Attendance.date <= date_to)
+    return query
+
+def iter_pages(page_size=5000, **filters):
+    """
+    Yields lists of export rows (tuples in COLUMN_NAMES order), page_size at
+    a time, read from the read-only reporting connections. Must run inside
+    an app context.
+    """
+    with read_only():
+        last_id = db.session.query(db.func.max(Attendance.id)).scalar()
+        periods = period_modules()
+        db.session.rollback()
+    if last_id is None:
+        return
+    after_id = 0
+    query = _export_query(periods, **filters)
+    no_module = (None, None, None)
+    while after_id < last_id:
+        # Entered per page: the generator is suspended between pages
+        with read_only():
+            page = query.filter(Attendance.id > after_id, Attendance.id <= last_id).order_by(
+                Attendance.id
+            ).limit(page_size).all()
+            # End the read transaction so the WAL can be checkpointed between pages
+            db.session.rollback()
+        if not page:
+            break
+        after_id = page[-1][0]
+        yield [tuple(row[:7]) + periods.get(row[7], no_module) + tuple(row[8:]) for row in page]
+
+def csv_chunks(pages):
+    """
+    Encodes pages of rows as CSV, one chunk of text per page after the header.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMN_NAMES)
+    yield buffer.getvalue()
+    for page in pages:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(page)
+        yield buffer.getvalue()
+
+class _Drain(io.RawIOBase):
+    """
+    Write-only file that hands back whatever was written since the last
+    drain(), so a Parquet file can be streamed as it is written.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def parquet_chunks(pages):
+    """
+    Encodes pages of rows as a Parquet file, one row group per page.
+    Requires pyarrow.
+    """
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export needs the 'pyarrow' package")
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = pyarrow.schema([(name, pyarrow.int64() if name == 'attendance_id' else pyarrow.string())
+                             for name in COLUMN_NAMES])
+    sink = _Drain()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for page in pages:
+            columns = [[None if value is None else str(value) for value in values] for values in zip(*page)]
+            columns[0] = [row[0] for row in page]
+            writer.write_table(pyarrow.Table.from_arrays(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def export_chunks(export_format='csv', page_size=5000, **filters):
+    """
+    The export as a stream of chunks (str for CSV, bytes for Parquet).
+    """
+    pages = iter_pages(page_size=page_size, **filters)
+    if export_format == 'parquet':
+        return parquet_chunks(pages)
+    return csv_chunks(pages)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--module', help='Only this module code')
+    parser.add_argument('--lecturer', help="Only this lecturer's modules")
+    parser.add_argument('--from', dest='date_from', help='First date (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='date_to', help='Last date (YYYY-MM-DD)')
+    parser.add_argument('--page-size', type=int, default=5000, help='Rows read per query')
+    parser.add_argument('--output', help='Write to this file instead of stdout')
+    args = parser.parse_args()
+
+    filters = {'module_code': args.module, 'lecturer_number': args.lecturer,
+               'date_from': args.date_from, 'date_to': args.date_to}
+    error = validate_filters(**filters)
+    if error:
+        parser.error(error)
+    if args.format == 'parquet' and not PARQUET_AVAILABLE:
+        parser.error("Parquet export needs the 'pyarrow' package")
+    if args.format == 'parquet' and not args.output:
+        parser.error('Parquet export needs --output')
+
+    from app import app
+
+    with app.app_context():
+        chunks = export_chunks(args.format, page_size=args.page_size, **filters)
+        if args.output:
+            mode, newline = ('wb', None) if args.format == 'parquet' else ('w', '')
+            with open(args.output, mode, newline=newline) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            print(f"✅ Attendance exported to {args.output}", file=sys.stderr)
+        else:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Write-behind queue for attendance marked by mark_attendance().
+
+Committing every recognised student in its own transaction means a hall
+of 300 clearing the door is 300 fsync'd SQLite transactions, each waiting
+for the single writer lock alongside every other capture station.
+Recognitions are instead acknowledged at once and their inserts written
+by a background thread in one transaction per batch, at most
+flush_interval seconds later.
+
+Each record is appended to a journal file before it is acknowledged, and
+the journal is cut back to the unwritten records after every batch commits.
+Records left in it by a crash are written again on the next start;
+writing is idempotent (a student already present for the period is
+skipped, an 'Absence' is turned into a presence), so replaying a batch
+that did commit is harmless. Pending records are flushed at exit.
+
+Each process claims its own journal by locking it: the configured path
+for the first, then path.1, path.2 and so on. The lock goes with the
+process, so a journal left by a crash is claimed and recovered by the next
+process to start.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+from metrics import Gauge, Histogram
+from models import db, Attendance
+
+ATTENDANCE_QUEUE_DEPTH = Gauge(
+    'attendance_queue_depth', 'Acknowledged attendance records not yet written to the database.')
+ATTENDANCE_BATCH_SIZE = Histogram(
+    'attendance_batch_size', 'Attendance records written per transaction.',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500))
+ATTENDANCE_FLUSH_SECONDS = Histogram(
+    'attendance_flush_seconds', 'Time taken to write one batch of attendance records.')
+
+MAX_JOURNALS = 64 # Server processes writing attendance at once
+
+def _lock(f):
+    # Raises OSError if another process holds the lock
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+def journal_paths(base_path, slots=MAX_JOURNALS):
+    return [base_path] + [f"{base_path}.{slot}" for slot in range(1, slots)]
+
+def try_lock(path):
+    """
+    Locks the journal at path for this process. Returns the open lock file,
+    which holds the lock until closed, or None if another process holds it.
+    """
+    lock_file = open(path + '.lock', 'a+')
+    try:
+        _lock(lock_file)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def claim_journal(base_path, slots=MAX_JOURNALS):
+    """
+    Locks the first of base_path, base_path.1, ... that no other process
+    holds. Returns (journal path, open lock file).
+    """
+    for path in journal_paths(base_path, slots):
+        lock_file = try_lock(path)
+        if lock_file is not None:
+            return path, lock_file
+    raise RuntimeError(f"All {slots} attendance journals at {base_path} are in use by other processes")
+
+def read_journal(path):
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue # A line cut short by the crash was never acknowledged
+    return records
+
+def record_key(record):
+    return (record['class_period_id'], record['date'], str(record['user_id']))
+
+def write_records(records):
+    """
+    Writes attendance records in one transaction: students with no record
+    for the period and date are inserted, absences are switched to
+    presences, anything else is left as it is. Returns the number of rows
+    inserted or updated.
+    """
+    records = list({record_key(record): record for record in reversed(records)}.values())
+    groups = {}
+    for record in records:
+        groups.setdefault((record['class_period_id'], record['date']), []).append(str(record['user_id']))
+
+    existing = {}
+    for (class_period_id, date), user_ids in groups.items():
+        rows = db.session.query(Attendance.id, Attendance.user_id, Attendance.status).filter(
+            Attendance.class_period_id == class_period_id,
+            Attendance.date == date,
+            Attendance.user_id.in_(user_ids)
+        )
+        for attendance_id, user_id, status in rows:
+            existing[(class_period_id, date, str(user_id))] = (attendance_id, status)
+
+    inserts = []
+    updates = []
+    for record in records:
+        found = existing.get(record_key(record))
+        if found is None:
+            inserts.append(record)
+        elif found[1] == 'Absence' and record['status'] != 'Absence':
+            updates.append({'id': found[0], 'status': record['status'], 'time': record['time']})
+    try:
+        if inserts:
+            db.session.execute(db.insert(Attendance), inserts)
+        if updates:
+            db.session.execute(db.update(Attendance), updates)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(inserts) + len(updates)
+
+class AttendanceWriter:
+    """
+    Queues attendance records and writes them in batches from a daemon
+    thread, started on first use. Each batch holds up to batch_size
+    records. The journal is journal_path or a numbered sibling, whichever
+    claim_journal() gets first.
+    """
+
+    def __init__(self, app, journal_path, flush_interval=0.5, batch_size=200, fsync=True):
+        self.app = app
+        self.base_path = journal_path
+        self.journal_path = None # Claimed by recover()
+        self.lock_file = None
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.pending = [] # Acknowledged records, oldest first
+        self.keys = set() # record_key() of pending and in-flight records
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock() # One batch in flight at a time
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.journal = None
+        self.recovered = False
+        self.thread = None
+        ATTENDANCE_QUEUE_DEPTH.labels().set_function(lambda: len(self.keys))
+
+    def _append(self, lines):
+        if self.journal is None:
+            self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        self.journal.write(''.join(lines))
+        self.journal.flush()
+        if self.fsync:
+            os.fsync(self.journal.fileno())
+
+    def _rewrite_journal(self):
+        # Called with self.lock held: the journal becomes exactly the pending records
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        temp_path = self.journal_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(record) + '\n' for record in self.pending)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(temp_path, self.journal_path)
+
+    def submit(self, record):
+        """
+        Queues an attendance record (a dict of Attendance columns) once it
+        is in the journal. Returns False if the same student, period and
+        date is already queued. Must run inside an app context.
+        """
+        if not self.recovered:
+            self.recover()
+        key = record_key(record)
+        with self.lock:
+            if key in self.keys:
+                return False
+            self._append([json.dumps(record) + '\n'])
+            self.pending.append(record)
+            self.keys.add(key)
+            backlog = len(self.pending)
+        if self.thread is None:
+            self.start()
+        if backlog >= self.batch_size:
+            self.wake.set()
+        return True
+
+    def is_pending(self, class_period_id, date, user_id):
+        """
+        True if the student's record for the period and date is queued but not yet written.
+        """
+        return (class_period_id, date, str(user_id)) in self.keys
+
+    def flush(self):
+        """
+        Writes everything queued, batch_size records per transaction. Must
+        run inside an app context. Returns the number of records written.
+        """
+        written = 0
+        with self.flush_lock:
+            while True:
+                with self.lock:
+                    batch = self.pending[:self.batch_size]
+                if not batch:
+                    return written
+                started = time.perf_counter()
+                write_records(batch)
+                ATTENDANCE_FLUSH_SECONDS.observe(time.perf_counter() - started)
+                ATTENDANCE_BATCH_SIZE.observe(len(batch))
+                with self.lock:
+                    del self.pending[:len(batch)]
+                    self.keys.difference_update(record_key(record) for record in batch)
+                    self._rewrite_journal()
+                written += len(batch)
+
+    def recover(self):
+        """
+        Queues records left by a crash in this process's journal, and in
+        any other journal no running process holds, and writes them. Must
+        run inside an app context; submit() calls it first if need be.
+        """
+        if self.lock_file is None:
+            self.journal_path, self.lock_file = claim_journal(self.base_path)
+        self.recovered = True
+        orphans = [] # (path, lock file) of journals left by processes that did not restart
+        for path in journal_paths(self.base_path):
+            if path != self.journal_path and os.path.exists(path):
+                lock_file = try_lock(path)
+                if lock_file is not None:
+                    orphans.append((path, lock_file))
+        paths = [path for path in [self.journal_path] + [path for path, _ in orphans] if os.path.exists(path)]
+        if not paths:
+            return 0
+        records = [record for path in paths for record in read_journal(path)]
+        with self.lock:
+            for record in records:
+                if record_key(record) not in self.keys:
+                    self.pending.append(record)
+                    self.keys.add(record_key(record))
+            self._rewrite_journal()
+        # Their records are in this journal now
+        for path, lock_file in orphans:
+            os.remove(path)
+            lock_file.close()
+        written = self.flush()
+        if written:
+            print(f"[INFO] Wrote {written} attendance record(s) recovered from {self.journal_path}")
+        return written
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return self
+            self.thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+        return self
+
+    def close(self):
+        """
+        Stops the thread and writes whatever is still queued.
+        """
+        self.stopped.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"[ERROR] Could not write queued attendance; kept in {self.journal_path}: {e}")
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            if not self.pending:
+                continue
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                # Records stay queued and journalled; the next pass retries them
+                print(f"[ERROR] Attendance write failed: {e}")
@@ -0,0 +1,85 @@
+"""
+Compares per-frame latency of the recognition backends and checks that their
+embeddings agree.
+
+    python benchmarks/backends.py --images static/faces --repeat 20
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from recognition import create_backend, BACKENDS
+
+def load_images(images_dir):
+    """
+    Loads every .jpg/.png in the folder as a BGR frame.
+    """
+    paths = sorted(glob.glob(os.path.join(images_dir, '*.jpg')) + glob.glob(os.path.join(images_dir, '*.png')))
+    images = []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is not None:
+            images.append((os.path.basename(path), img))
+    return images
+
+def time_backend(backend, images, repeat):
+    """
+    Returns (latencies in ms, embeddings by file name) for one backend.
+    The first pass is a warm-up and is not timed.
+    """
+    embeddings = {name: backend.represent(img) for name, img in images}
+    latencies = []
+    for _ in range(repeat):
+        for _, img in images:
+            start = time.perf_counter()
+            backend.represent(img)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, embeddings
+
+def cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default=os.path.join('static', 'faces'), help='Folder of face images')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed passes over the images')
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), help='Backends to compare')
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"❌ No images found in {args.images}")
+        return
+
+    results = {}
+    for name in args.backends:
+        start = time.perf_counter()
+        try:
+            backend = create_backend(name)
+        except Exception as e:
+            print(f"⚠️ Skipping {name}: {e}")
+            continue
+        load_ms = (time.perf_counter() - start) * 1000
+        latencies, embeddings = time_backend(backend, images, args.repeat)
+        results[name] = embeddings
+        print(f"{name:>10}: load {load_ms:8.1f} ms | "
+              f"mean {np.mean(latencies):7.1f} ms | p50 {np.percentile(latencies, 50):7.1f} ms | "
+              f"p95 {np.percentile(latencies, 95):7.1f} ms | {len(latencies)} frames")
+
+    # Embeddings from different backends must be interchangeable with the enrolled ones
+    names = list(results)
+    for i, first in enumerate(names):
+        for second in names[i + 1:]:
+            scores = [cosine(results[first][f], results[second][f]) for f, _ in images
+                      if results[first][f] is not None and results[second][f] is not None]
+            if scores:
+                print(f"{first} vs {second}: mean cosine {np.mean(scores):.3f}, min {np.min(scores):.3f} "
+                      f"over {len(scores)} images")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Measures attendance write latency while reports read the same database,
+with the shared connection setup in database.py (WAL, busy_timeout,
+read-only report connections) and with plain sqlite3.connect() defaults.
+
+    python benchmarks/concurrency.py --db benchmark.db --readers 4 --writers 2 --seconds 10
+
+Each mode runs on its own copy of the database. Writer threads insert one
+attendance row per transaction, as mark_attendance() does; reader threads
+repeat a full export join and a statistics GROUP BY. Writes that fail with
+"database is locked" are counted, not retried.
+
+The shared setup must stay within the write budgets below (locked writes,
+p95 and worst-case write latency, writes per second); the script exits
+non-zero otherwise, so it can gate releases.
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from database import connect
+
+REPORT_QUERIES = [
+    """
+    SELECT a.id, a.date, a.time, a.status, s.student_number, s.student_name, s.student_surname,
+           p.period_id, p.day_of_week, v.venue_name
+    FROM attendance a
+    LEFT JOIN students s ON s.student_number = CAST(a.user_id AS VARCHAR)
+    LEFT JOIN class_period p ON p.id = a.class_period_id
+    LEFT JOIN venue v ON v.id = p.period_venue_id
+    """,
+    """
+    SELECT class_period_id, date, status, COUNT(*)
+    FROM attendance
+    GROUP BY class_period_id, date, status
+    """,
+]
+
+def plain_connect(db_path, read_only=False):
+    # sqlite3 defaults: rollback journal, 5 second timeout, read-write
+    return sqlite3.connect(db_path)
+
+def reader(db_path, connect_fn, stop, counts):
+    conn = connect_fn(db_path, read_only=True)
+    try:
+        while not stop.is_set():
+            for sql in REPORT_QUERIES:
+                try:
+                    conn.execute(sql).fetchall()
+                    counts['reads'] += 1
+                except sqlite3.OperationalError:
+                    counts['read_errors'] += 1
+    finally:
+        conn.close()
+
+def writer(db_path, connect_fn, stop, samples, counts, student_number, class_period_id):
+    conn = connect_fn(db_path)
+    try:
+        while not stop.is_set():
+            now = datetime.now()
+            start = time.perf_counter()
+            try:
+                conn.execute(
+                    "INSERT INTO attendance (user_id, class_period_id, name, time, date, status) VALUES (?, ?, ?, ?, ?, ?)",
+                    (student_number, class_period_id, 'Benchmark', now.strftime('%H:%M:%S'), '2099-01-01', 'Present'))
+                conn.commit()
+                samples.append((time.perf_counter() - start) * 1000)
+            except sqlite3.OperationalError:
+                conn.rollback()
+                counts['write_errors'] += 1
+    finally:
+        conn.close()
+
+def run(db_path, connect_fn, readers, writers, seconds):
+    conn = sqlite3.connect(db_path)
+    try:
+        student_number = conn.execute("SELECT student_number FROM students LIMIT 1").fetchone()[0]
+        class_period_id = conn.execute("SELECT id FROM class_period LIMIT 1").fetchone()[0]
+    finally:
+        conn.close()
+
+    stop = threading.Event()
+    samples = []
+    counts = {'reads': 0, 'read_errors': 0, 'write_errors': 0}
+    threads = [threading.Thread(target=reader, args=(db_path, connect_fn, stop, counts)) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(db_path, connect_fn, stop, samples, counts,
+                                                      student_number, class_period_id)) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'writes': len(samples),
+        'writes_per_second': round(len(samples) / seconds, 1),
+        'write_p50_ms': round(float(np.percentile(samples, 50)), 2) if samples else None,
+        'write_p95_ms': round(float(np.percentile(samples, 95)), 2) if samples else None,
+        'write_max_ms': round(float(np.max(samples)), 2) if samples else None,
+        'locked_writes': counts['write_errors'],
+        'reports': counts['reads'],
+        'locked_reports': counts['read_errors'],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.db', help='Seeded database file (copied, never modified)')
+    parser.add_argument('--readers', type=int, default=4, help='Report threads')
+    parser.add_argument('--writers', type=int, default=2, help='Attendance writer threads')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each mode')
+    parser.add_argument('--output', help='Write JSON results to this file instead of stdout')
+    parser.add_argument('--max-p95-ms', type=float, default=50, help='Budget for p95 write latency (shared setup)')
+    parser.add_argument('--max-write-ms', type=float, default=1000, help='Budget for the slowest write (shared setup)')
+    parser.add_argument('--min-writes-per-second', type=float, default=200,
+                        help='Budget for write throughput (shared setup)')
+    parser.add_argument('--max-locked-writes', type=int, default=0,
+                        help='Writes allowed to fail with "database is locked" (shared setup)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ {args.db} not found. Create it with benchmarks/seed.py first.", file=sys.stderr)
+        sys.exit(1)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, connect_fn in (('default', plain_connect), ('shared', connect)):
+            db_path = os.path.join(tmp, f"{mode}.db")
+            shutil.copyfile(args.db, db_path)
+            conn = sqlite3.connect(db_path)
+            conn.execute("PRAGMA journal_mode = DELETE") # The seeded copy may already be in WAL mode
+            conn.close()
+            print(f"[INFO] {mode}: {args.readers} reader(s), {args.writers} writer(s) for {args.seconds}s", file=sys.stderr)
+            results[mode] = run(db_path, connect_fn, args.readers, args.writers, args.seconds)
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'database': os.path.abspath(args.db),
+        'readers': args.readers,
+        'writers': args.writers,
+        'seconds': args.seconds,
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    shared = results['shared']
+    failures = []
+    if shared['locked_writes'] > args.max_locked_writes:
+        failures.append(f"{shared['locked_writes']} write(s) failed with 'database is locked' "
+                        f"(budget {args.max_locked_writes})")
+    if shared['write_p95_ms'] is None or shared['write_p95_ms'] > args.max_p95_ms:
+        failures.append(f"p95 write latency {shared['write_p95_ms']} ms (budget {args.max_p95_ms:g} ms)")
+    if shared['write_max_ms'] is None or shared['write_max_ms'] > args.max_write_ms:
+        failures.append(f"slowest write {shared['write_max_ms']} ms (budget {args.max_write_ms:g} ms)")
+    if shared['writes_per_second'] < args.min_writes_per_second:
+        failures.append(f"{shared['writes_per_second']} writes/s (budget {args.min_writes_per_second:g})")
+    for failure in failures:
+        print(f"❌ Shared setup over budget: {failure}", file=sys.stderr)
+    if not failures:
+        print("✅ Shared setup within write budgets.", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Times every GET endpoint in app.py against a seeded database (see seed.py)
+and records how many SQL queries each one issues.
+
+    python benchmarks/endpoints.py --db benchmark.db --repeat 3 --output endpoints.json
+
+URL parameters are filled with real values from the database. Requests run
+through Flask's test client with a lecturer logged in, so login_required
+pages are included.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+# Unfiltered /api/attendance returns every row ever recorded; sample a single day
+DEFAULT_QUERIES = {
+    '/api/attendance': 'date={date}',
+}
+
+def sample_values(db_path):
+    """
+    Picks one existing value for each kind of URL parameter.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        one = lambda sql: (conn.execute(sql).fetchone() or [None])[0]
+        module_code = one("SELECT subject_code FROM class_register GROUP BY subject_code ORDER BY COUNT(*) DESC LIMIT 1")
+        lecturer_number = one(f"SELECT lecturer_number FROM module WHERE module_code = '{module_code}'")
+        values = {
+            'module_code': module_code,
+            'module_id': module_code,
+            'lecturer_number': lecturer_number,
+            'student_number': one("SELECT student_number FROM students LIMIT 1"),
+            'venue_id': one("SELECT id FROM venue LIMIT 1"),
+            'register_id': one("SELECT register_id FROM class_register LIMIT 1"),
+            'period_id': one("SELECT period_id FROM class_period LIMIT 1"),
+            'attendance_id': one("SELECT id FROM attendance LIMIT 1"),
+            'date': one("SELECT date FROM attendance ORDER BY date DESC LIMIT 1"),
+        }
+    finally:
+        conn.close()
+    return values
+
+def get_routes(app, values, include, exclude):
+    """
+    Returns (rule, url) for every GET route, with parameters filled in.
+    """
+    routes = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' not in rule.methods or rule.endpoint == 'static':
+            continue
+        if include and not any(fnmatch.fnmatch(rule.rule, p) for p in include):
+            continue
+        if any(fnmatch.fnmatch(rule.rule, p) for p in exclude):
+            continue
+        if any(values.get(arg) is None for arg in rule.arguments):
+            print(f"⚠️ Skipping {rule.rule}: no sample value for {sorted(rule.arguments)}", file=sys.stderr)
+            continue
+        url = rule.rule
+        for arg in rule.arguments:
+            url = url.replace(f"<{arg}>", str(values[arg]))
+        if rule.rule in DEFAULT_QUERIES:
+            url += '?' + DEFAULT_QUERIES[rule.rule].format(**values)
+        routes.append((rule.rule, url))
+    return routes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.db', help='Seeded database file')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed requests per endpoint')
+    parser.add_argument('--include', nargs='*', default=[], help='Only these rules (glob), e.g. "/api/*"')
+    parser.add_argument('--exclude', nargs='*', default=[], help='Skip these rules (glob)')
+    parser.add_argument('--output', help='Write JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ {args.db} not found. Create it with benchmarks/seed.py first.", file=sys.stderr)
+        sys.exit(1)
+
+    # app.py reads DATABASE_URL at import time
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(args.db)
+    # No absence job or snapshot copies writing to the seeded database mid-run
+    os.environ['BACKGROUND_JOBS'] = '0'
+    from app import app, response_cache
+    # Query counts come from the X-DB-* headers added by query_stats.py
+    app.config['QUERY_STATS_HEADERS'] = True
+    app.config['SLOW_REQUEST_LOG'] = None
+    # Time the endpoints themselves, not replays from the response cache
+    response_cache.enabled = False
+
+    values = sample_values(args.db)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_type'] = 'lecturer'
+        session['lecturer_number'] = values['lecturer_number']
+        session['lecturer_name'] = 'Benchmark'
+        session['lecturer_surname'] = 'Lecturer'
+
+    results = []
+    for rule, url in get_routes(app, values, args.include, args.exclude):
+        print(f"[INFO] GET {url}", file=sys.stderr)
+        client.get(url) # Warm-up, also runs create_tables()
+        timings = []
+        queries = []
+        db_times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            queries.append(int(response.headers['X-DB-Query-Count']))
+            db_times.append(float(response.headers['X-DB-Time-ms']))
+        results.append({
+            'rule': rule,
+            'url': url,
+            'status': response.status_code,
+            'response_bytes': len(response.data),
+            'mean_ms': round(float(np.mean(timings)), 2),
+            'max_ms': round(float(np.max(timings)), 2),
+            'queries': int(np.median(queries)),
+            'db_mean_ms': round(float(np.mean(db_times)), 2),
+        })
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'database': os.path.abspath(args.db),
+        'repeat': args.repeat,
+        'results': sorted(results, key=lambda r: r['mean_ms'], reverse=True),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures how long a fresh interpreter takes to import app.py and checks that
+the ML stack (OpenCV, DeepFace, TensorFlow) is not loaded by the import.
+Exits non-zero when the budget is exceeded so it can gate releases.
+
+    python benchmarks/import_time.py --budget 1.0
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['cv2', 'deepface', 'tensorflow', 'keras', 'tf_keras']
+
+PROBE = """
+import json, sys, time, resource
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    'seconds': elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': [m for m in %r if m in sys.modules],
+}))
+""" % HEAVY_MODULES
+
+def measure():
+    """
+    Imports app.py in a fresh interpreter and returns its measurements.
+    """
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=1.0, help='Maximum import time in seconds')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to average over')
+    args = parser.parse_args()
+
+    results = [measure() for _ in range(args.runs)]
+    best = min(r['seconds'] for r in results)
+    rss = max(r['max_rss_mb'] for r in results)
+    loaded = sorted(set(m for r in results for m in r['loaded']))
+
+    print(f"import app: best {best * 1000:.0f} ms over {args.runs} runs, peak RSS {rss:.0f} MB")
+
+    failed = False
+    if loaded:
+        print(f"❌ ML stack imported at load time: {', '.join(loaded)}")
+        failed = True
+    if best > args.budget:
+        print(f"❌ Import took longer than the {args.budget:.2f} s budget")
+        failed = True
+    if not failed:
+        print("✅ Within budget.")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
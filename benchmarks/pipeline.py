@@ -0,0 +1,256 @@
+"""
+Benchmarks the attendance recognition pipeline stage by stage, the way
+compute_embedding() + mark_attendance() run it, and writes machine-readable
+JSON so results can be compared between releases.
+
+Stages: base64_decode, imdecode, detection, alignment, embedding,
+gallery_match, db_write. Each combination of backend, model and detector is
+loaded once, timed single-threaded over the corpus, then driven at each
+concurrency level to measure throughput.
+
+    python benchmarks/pipeline.py --corpus static/faces --output bench.json \\
+        --combos deepface:SFace:ssd deepface:Facenet512:retinaface opencv
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gallery import Gallery
+from recognition import create_backend, decode_image, largest_face
+
+STAGES = ['base64_decode', 'imdecode', 'detection', 'alignment', 'embedding', 'gallery_match', 'db_write']
+
+# -----------------------------
+# Measurement Helpers
+# -----------------------------
+
+class StageTimer:
+    """
+    Collects wall-clock durations per pipeline stage. Safe to share between
+    threads: list.append is atomic.
+    """
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        yield
+        self.samples[name].append((time.perf_counter() - start) * 1000)
+
+    def summary(self):
+        result = {}
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            result[stage] = {
+                'count': len(values),
+                'mean_ms': round(float(np.mean(values)), 3),
+                'p50_ms': round(float(np.percentile(values, 50)), 3),
+                'p95_ms': round(float(np.percentile(values, 95)), 3),
+                'max_ms': round(float(np.max(values)), 3),
+            }
+        return result
+
+def load_corpus(corpus_dir):
+    """
+    Loads the corpus images as the Base64 data URLs the capture page sends.
+    """
+    paths = sorted(glob.glob(os.path.join(corpus_dir, '*.jpg')) + glob.glob(os.path.join(corpus_dir, '*.png')))
+    corpus = []
+    for path in paths:
+        mime = 'image/png' if path.endswith('.png') else 'image/jpeg'
+        with open(path, 'rb') as f:
+            corpus.append(f"data:{mime};base64," + base64.b64encode(f.read()).decode())
+    return corpus
+
+def synthetic_gallery(size, dim, templates_per_student=3, seed=0):
+    """
+    A gallery of random unit vectors the size of a large lecture.
+    """
+    rng = np.random.default_rng(seed)
+    return Gallery(
+        ((f"{22000000 + i}", list(rng.normal(size=(templates_per_student, dim)).astype(np.float32)))
+         for i in range(size)),
+        dim=dim
+    )
+
+class AttendanceWriter:
+    """
+    Inserts attendance rows into a throwaway SQLite database with the app's
+    schema, one committed transaction per recognised face like
+    mark_attendance().
+    """
+
+    def __init__(self):
+        from flask import Flask
+        from models import db, Attendance
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(self.directory.name, 'bench.db')
+        self.db = db
+        self.Attendance = Attendance
+        db.init_app(self.app)
+        with self.app.app_context():
+            db.create_all()
+        self.lock = threading.Lock()
+
+    def write(self, student_number):
+        # SQLite has one writer; serialise like the single-writer lock would
+        with self.lock, self.app.app_context():
+            now = datetime.now()
+            self.db.session.add(self.Attendance(
+                user_id=student_number, class_period_id=1, name='Benchmark Student',
+                time=now.strftime("%H:%M:%S"), date=now.strftime("%Y-%m-%d"), status='Present'
+            ))
+            self.db.session.commit()
+
+# -----------------------------
+# Pipeline
+# -----------------------------
+
+def run_pipeline(backend, gallery, writer, data_url, timer):
+    """
+    One frame through the same steps as mark_attendance().
+    """
+    with timer.stage('base64_decode'):
+        header, encoded = data_url.split(',', 1)
+        image_bytes = base64.b64decode(encoded)
+    with timer.stage('imdecode'):
+        img = decode_image(image_bytes)
+    with timer.stage('detection'):
+        detections = backend.locate(img)
+    with timer.stage('alignment'):
+        faces = backend.align(img, detections)
+    if not faces:
+        return False
+    with timer.stage('embedding'):
+        embedding = backend.embed([largest_face(faces)])[0]
+    with timer.stage('gallery_match'):
+        student_number, similarity = gallery.match(embedding)
+    with timer.stage('db_write'):
+        writer.write(student_number)
+    return True
+
+def parse_combo(spec):
+    """
+    'deepface:Facenet512:retinaface' -> ('deepface', {'model_name': ..., 'detector_backend': ...})
+    """
+    parts = spec.split(':')
+    options = {}
+    if parts[0] == 'deepface':
+        if len(parts) > 1:
+            options['model_name'] = parts[1]
+        if len(parts) > 2:
+            options['detector_backend'] = parts[2]
+    return parts[0], options
+
+def benchmark_combo(spec, corpus, args):
+    name, options = parse_combo(spec)
+    result = {'combo': spec, 'backend': name, 'options': options}
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    backend = create_backend(name, **options)
+    result['load_seconds'] = round(time.perf_counter() - start, 3)
+
+    # Warm-up pass, also finds the embedding size for the gallery
+    dim = None
+    for data_url in corpus:
+        img = decode_image(base64.b64decode(data_url.split(',', 1)[1]))
+        embedding = backend.represent(img)
+        if embedding is not None:
+            dim = embedding.shape[0]
+            break
+    if dim is None:
+        tracemalloc.stop()
+        result['error'] = 'No face detected in any corpus image'
+        return result
+
+    gallery = synthetic_gallery(args.gallery_size, dim)
+    writer = AttendanceWriter()
+
+    timer = StageTimer()
+    recognised = 0
+    for _ in range(args.repeat):
+        for data_url in corpus:
+            recognised += run_pipeline(backend, gallery, writer, data_url, timer)
+    result['frames'] = args.repeat * len(corpus)
+    result['frames_with_face'] = recognised
+    result['stages'] = timer.summary()
+
+    result['throughput_fps'] = {}
+    for concurrency in args.concurrency:
+        frames = corpus * max(1, args.repeat)
+        throughput_timer = StageTimer()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda url: run_pipeline(backend, gallery, writer, url, throughput_timer), frames))
+        elapsed = time.perf_counter() - start
+        result['throughput_fps'][str(concurrency)] = round(len(frames) / elapsed, 2)
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result['peak_python_mb'] = round(peak / (1024 * 1024), 2)
+    # ru_maxrss is in KB on Linux; it includes native model memory but only grows
+    result['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=os.path.join('static', 'faces'), help='Folder of face images/frames')
+    parser.add_argument('--combos', nargs='+', default=['deepface:SFace:ssd', 'deepface:Facenet512:retinaface'],
+                        help='backend[:model[:detector]] combinations to compare')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed passes over the corpus')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8], help='Worker threads for throughput')
+    parser.add_argument('--gallery-size', type=int, default=300, help='Students in the synthetic gallery')
+    parser.add_argument('--output', help='Write JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print(f"❌ No images found in {args.corpus}", file=sys.stderr)
+        sys.exit(1)
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'corpus': {'path': args.corpus, 'images': len(corpus)},
+        'gallery_size': args.gallery_size,
+        'results': []
+    }
+    for spec in args.combos:
+        print(f"[INFO] Benchmarking {spec}...", file=sys.stderr)
+        try:
+            report['results'].append(benchmark_combo(spec, corpus, args))
+        except Exception as e:
+            print(f"⚠️ Skipping {spec}: {e}", file=sys.stderr)
+            report['results'].append({'combo': spec, 'error': str(e)})
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Seeds a database with synthetic campus-scale data for load and query
+benchmarks: lecturers, venues, modules, students with random embeddings,
+module registrations, weekly class periods and a semester of attendance.
+
+    python benchmarks/seed.py --db benchmark.db --students 20000 --modules 1000 --weeks 14
+
+The schema comes from models.py; rows are written with executemany in large
+transactions so millions of attendance rows take minutes, not hours.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+SLOTS = [('08:00', '08:45'), ('09:00', '09:45'), ('10:00', '10:45'), ('11:00', '11:45'), ('12:00', '12:45'),
+         ('13:00', '13:45'), ('14:00', '14:45'), ('15:00', '15:45'), ('16:00', '16:45')]
+FIRST_NAMES = ['Thabo', 'Ayanda', 'Lerato', 'Sipho', 'Nomvula', 'Kabelo', 'Zanele', 'Themba', 'Naledi', 'Bongani',
+               'Precious', 'Mandla', 'Lindiwe', 'Sibusiso', 'Palesa', 'Andile', 'Refilwe', 'Lwazi', 'Busisiwe', 'Kagiso']
+SURNAMES = ['Nkosi', 'Dlamini', 'Mokoena', 'Naidoo', 'Khumalo', 'Ndlovu', 'Pillay', 'Mthembu', 'Zulu', 'Botha',
+            'Mahlangu', 'Van der Merwe', 'Molefe', 'Sithole', 'Govender', 'Cele', 'Ngcobo', 'Radebe', 'Baloyi', 'Shabalala']
+BATCH_SIZE = 50000
+
+def create_schema(db_path):
+    """
+    Creates the tables exactly as app.py would, via the models.
+    """
+    from flask import Flask
+    from models import db
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.abspath(db_path)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+
+def insert_many(conn, sql, rows):
+    """
+    Inserts rows in chunks so memory stays flat for millions of rows.
+    """
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(sql, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+        count += len(batch)
+    conn.commit()
+    return count
+
+def semester_dates(start, weeks):
+    """
+    Yields (date, day name) for every weekday of the semester.
+    """
+    for offset in range(weeks * 7):
+        day = start + timedelta(days=offset)
+        if day.weekday() < 5:
+            yield day, DAYS[day.weekday()]
+
+def seed(args):
+    rng = np.random.default_rng(args.seed)
+    year = str(args.start.year)
+    conn = sqlite3.connect(args.db)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF") # Throwaway benchmark data
+
+    def timed(label, sql, rows):
+        start = time.perf_counter()
+        count = insert_many(conn, sql, rows)
+        print(f"✅ {count:>10,} {label} in {time.perf_counter() - start:.1f}s")
+
+    lecturer_numbers = [str(1000 + i) for i in range(args.lecturers)]
+    timed('lecturers', "INSERT INTO lecturers (lecturer_number, name, surname, email) VALUES (?, ?, ?, ?)",
+          ((number, FIRST_NAMES[i % 20], SURNAMES[(i // 20) % 20], f"{number}@dut.ac.za")
+           for i, number in enumerate(lecturer_numbers)))
+
+    timed('venues', "INSERT INTO venue (venue_name, venue_block, venue_campus) VALUES (?, ?, ?)",
+          ((f"Room {i:04d}", f"Block {chr(65 + i % 26)}", ['Steve Biko', 'Ritson', 'ML Sultan'][i % 3])
+           for i in range(args.venues)))
+
+    module_codes = [f"MOD{i:04d}" for i in range(args.modules)]
+    timed('modules', "INSERT INTO module (module_code, module_name, lecturer_number) VALUES (?, ?, ?)",
+          ((code, f"Module {code}", lecturer_numbers[i % args.lecturers]) for i, code in enumerate(module_codes)))
+
+    student_numbers = [f"{22000000 + i}" for i in range(args.students)]
+
+    def students():
+        for i, number in enumerate(student_numbers):
+            embedding = rng.normal(size=args.embedding_dim).astype(np.float32)
+            embedding /= np.linalg.norm(embedding)
+            yield (number, FIRST_NAMES[int(rng.integers(20))], SURNAMES[int(rng.integers(20))],
+                   f"{number}@dut4life.ac.za", f"01/02/{year}, 08:00:00", f"static/faces/{number}.jpg",
+                   embedding.tobytes())
+    timed('students', """INSERT INTO students (student_number, student_name, student_surname, student_email,
+                         registered_at, image_path, embedding) VALUES (?, ?, ?, ?, ?, ?, ?)""", students())
+
+    # Registrations follow add_student(): one row per student and module,
+    # sharing the module's register_id
+    enrolments = {code: [] for code in module_codes}
+    for number in student_numbers:
+        for index in rng.choice(args.modules, size=min(args.modules_per_student, args.modules), replace=False):
+            enrolments[module_codes[index]].append(number)
+    timed('class registers', """INSERT INTO class_register (student_number, register_id, subject_code, semester, year)
+                                VALUES (?, ?, ?, ?, ?)""",
+          ((number, f"{code}-2-{year}", code, '2', year) for code, numbers in enrolments.items() for number in numbers))
+
+    periods = []
+    for code in module_codes:
+        for slot in rng.choice(len(DAYS) * len(SLOTS), size=args.periods_per_module, replace=False):
+            day, (start, end) = DAYS[slot // len(SLOTS)], SLOTS[slot % len(SLOTS)]
+            periods.append((f"{code}-{day[:3].upper()}{start.replace(':', '')}", f"{code}-2-{year}",
+                            day, start, end, int(rng.integers(args.venues)) + 1))
+    timed('class periods', """INSERT INTO class_period (period_id, class_register, day_of_week, period_start_time,
+                              period_end_time, period_venue_id) VALUES (?, ?, ?, ?, ?, ?)""", periods)
+
+    period_ids = dict(conn.execute("SELECT period_id, id FROM class_period").fetchall())
+    names = dict((n, f"{a} {b}") for n, a, b in conn.execute(
+        "SELECT student_number, student_name, student_surname FROM students"))
+    periods_by_day = {}
+    for period in periods:
+        periods_by_day.setdefault(period[2], []).append(period)
+
+    def attendance():
+        # Each student gets a personal attendance rate so reports show a spread
+        # of Good, Warning and Critical students
+        rates = dict(zip(student_numbers, np.clip(rng.normal(args.attendance_rate, 0.15, len(student_numbers)), 0, 1)))
+        for day, day_name in semester_dates(args.start, args.weeks):
+            day_str = day.strftime("%Y-%m-%d")
+            for period_id, register_id, _, start, _, _ in periods_by_day.get(day_name, []):
+                roster = enrolments[register_id.split('-')[0]]
+                present = rng.random(len(roster))
+                for number, draw in zip(roster, present):
+                    if draw < rates[number]:
+                        yield (number, period_ids[period_id], names[number], f"{start}:{int(draw * 600) // 60:02d}",
+                               day_str, 'Present')
+    timed('attendance rows', """INSERT INTO attendance (user_id, class_period_id, name, time, date, status)
+                                VALUES (?, ?, ?, ?, ?, ?)""", attendance())
+
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.db', help='Database file to create')
+    parser.add_argument('--force', action='store_true', help='Overwrite the database file if it exists')
+    parser.add_argument('--lecturers', type=int, default=300)
+    parser.add_argument('--venues', type=int, default=150)
+    parser.add_argument('--modules', type=int, default=1000)
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--modules-per-student', type=int, default=6)
+    parser.add_argument('--periods-per-module', type=int, default=3)
+    parser.add_argument('--weeks', type=int, default=14, help='Semester length')
+    parser.add_argument('--start', type=date.fromisoformat, default=date(date.today().year, 7, 22),
+                        help='First day of the semester (YYYY-MM-DD)')
+    parser.add_argument('--attendance-rate', type=float, default=0.8, help='Mean attendance rate')
+    parser.add_argument('--embedding-dim', type=int, default=128, help='128 for SFace, 512 for Facenet512')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible datasets')
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            print(f"❌ {args.db} already exists. Use --force to overwrite it.")
+            sys.exit(1)
+        os.remove(args.db)
+
+    create_schema(args.db)
+    seed(args)
+    print(f"🎉 Seeded {args.db}")
+
+if __name__ == "__main__":
+    main()
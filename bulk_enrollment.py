@@ -0,0 +1,251 @@
+"""
+Bulk face enrolment from a zip archive or directory of photos named by
+student number (e.g. 22012345.jpg), such as a first-year cohort's ID-card
+photos.
+
+    python bulk_enrollment.py photos.zip --workers 4 --report enrolment_report.csv
+
+Names are checked against the students table in a few set-based queries
+up front, photos are decoded and embedded by a pool of worker threads, and
+templates and image paths are written batch_size students per transaction.
+Every file gets a result: 'enrolled', 'skipped' (already enrolled; pass
+--replace to re-enrol) or one of FAILURES. The same code backs
+POST /api/students/bulk_face_enrollment.
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from models import db, Student
+from gallery import add_template, clear_templates
+from profiles import backend_options
+from recognition import decode_image, get_backend, limit_width
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+FAILURES = ('invalid_name', 'duplicate_file', 'unknown_student', 'unreadable_image', 'no_face',
+            'multiple_faces', 'error')
+STUDENT_NUMBER_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+# Faces smaller than this fraction of the largest one (e.g. the ghost image
+# printed on some ID cards) do not count as a second face
+MIN_FACE_AREA_RATIO = 0.25
+QUERY_CHUNK = 500 # Student numbers per IN (...) query, within SQLite's variable limit
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+@contextmanager
+def open_photos(source):
+    """
+    Yields (name, read) for every file in a zip archive (a path or file
+    object) or directory, where read() returns the file's bytes.
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        photos = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(root, filename)
+                photos.append((os.path.relpath(path, source), lambda path=path: _read_file(path)))
+        yield photos
+        return
+
+    with zipfile.ZipFile(source) as archive:
+        yield [(info.filename, lambda info=info: archive.read(info)) for info in archive.infolist()
+               if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+               and not os.path.basename(info.filename).startswith('.')]
+
+def _result(name, student_number, status, detail=''):
+    return {'file': name, 'student_number': student_number, 'status': status, 'detail': detail}
+
+def embed_photo(image_bytes, targets):
+    """
+    Decodes a photo and embeds its face with every target (model_name,
+    backend, input_width). Returns (status, embeddings by model, detail).
+    Runs on the worker threads.
+    """
+    img = decode_image(image_bytes)
+    if img is None:
+        return 'unreadable_image', None, ''
+    embeddings = {}
+    for model_name, backend, input_width in targets:
+        faces = backend.represent_faces(limit_width(img, input_width))
+        if not faces:
+            return 'no_face', None, model_name
+        areas = sorted((box[2] * box[3] for box, _ in faces), reverse=True)
+        prominent = [area for area in areas if area >= areas[0] * MIN_FACE_AREA_RATIO]
+        if len(prominent) > 1:
+            return 'multiple_faces', None, f"{len(prominent)} faces found"
+        embeddings[model_name] = max(faces, key=lambda face: face[0][2] * face[0][3])[1]
+    return 'enrolled', embeddings, ''
+
+def _to_jpeg(image_bytes):
+    import cv2
+    return cv2.imencode('.jpg', decode_image(image_bytes))[1].tobytes()
+
+def _enrolled_students(student_numbers):
+    """
+    Maps each existing student number to whether the student already has a face enrolled.
+    """
+    student_numbers = list(student_numbers)
+    existing = {}
+    for start in range(0, len(student_numbers), QUERY_CHUNK):
+        rows = db.session.query(Student.student_number, Student.embedding.isnot(None)).filter(
+            Student.student_number.in_(student_numbers[start:start + QUERY_CHUNK])
+        )
+        existing.update((student_number, bool(enrolled)) for student_number, enrolled in rows)
+    return existing
+
+def _save_batch(batch, upload_folder, replace, max_templates):
+    """
+    Writes one batch of embedded photos: the image files, then every
+    student's templates and image path in a single transaction.
+    """
+    students = {s.student_number: s for s in Student.query.filter(
+        Student.student_number.in_([student_number for _, student_number, _, _ in batch])
+    ).options(db.selectinload(Student.face_templates))}
+    try:
+        for name, student_number, embeddings, image_bytes in batch:
+            student = students[student_number]
+            image_filename = f"{student_number}.jpg"
+            with open(os.path.join(upload_folder, image_filename), 'wb') as f:
+                f.write(image_bytes)
+            if replace:
+                clear_templates(student)
+            for model_name, embedding in embeddings.items():
+                add_template(student, embedding, source='enrolment', max_templates=max_templates,
+                             model_name=model_name)
+            student.image_path = f"static/faces/{image_filename}"
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Bulk enrolment batch failed: {e}")
+        return [_result(name, student_number, 'error', str(e)) for name, student_number, _, _ in batch]
+    return [_result(name, student_number, 'enrolled', ', '.join(embeddings))
+            for name, student_number, embeddings, _ in batch]
+
+def enroll_photos(source, profiles, upload_folder, workers=4, batch_size=100, replace=False, max_templates=5):
+    """
+    Enrols every photo in source (see open_photos) with the models of the
+    given recognition profiles. Yields one result dict per file as it is
+    decided. Must run inside an app context and be consumed to the end.
+    """
+    if not profiles:
+        raise ValueError('At least one recognition profile is required')
+    # One backend per model, loaded before the workers start
+    targets = {}
+    for profile in profiles:
+        if profile.model_name not in targets:
+            backend = get_backend(profile.backend, **backend_options(profile))
+            targets[profile.model_name] = (profile.model_name, backend, profile.input_width)
+    targets = list(targets.values())
+
+    with open_photos(source) as photos:
+        # 1. File names: one photo per student number
+        candidates = {}
+        for name, read in photos:
+            stem, extension = os.path.splitext(os.path.basename(name))
+            if extension.lower() not in IMAGE_EXTENSIONS or not STUDENT_NUMBER_PATTERN.match(stem):
+                yield _result(name, None, 'invalid_name', 'Expected <student number>.jpg')
+            elif stem in candidates:
+                yield _result(name, stem, 'duplicate_file', f"Also in {candidates[stem][0]}")
+            else:
+                candidates[stem] = (name, read)
+
+        # 2. Students: every number checked in a few queries rather than one per file
+        enrolled = _enrolled_students(candidates)
+        for student_number in list(candidates):
+            name = candidates[student_number][0]
+            if student_number not in enrolled:
+                yield _result(name, student_number, 'unknown_student')
+            elif enrolled[student_number] and not replace:
+                yield _result(name, student_number, 'skipped', 'Already enrolled')
+            else:
+                continue
+            del candidates[student_number]
+
+        # 3. Decode and embed on the pool, keeping only a few photos in memory
+        # at a time, and write the results in batches
+        batch = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight = {}
+            queued = iter(candidates.items())
+            while True:
+                for student_number, (name, read) in queued:
+                    image_bytes = read()
+                    in_flight[pool.submit(embed_photo, image_bytes, targets)] = (name, student_number, image_bytes)
+                    if len(in_flight) >= workers * 2:
+                        break
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, student_number, image_bytes = in_flight.pop(future)
+                    try:
+                        status, embeddings, detail = future.result()
+                    except Exception as e:
+                        status, embeddings, detail = 'error', None, str(e)
+                    if status != 'enrolled':
+                        yield _result(name, student_number, status, detail)
+                        continue
+                    if not name.lower().endswith(('.jpg', '.jpeg')):
+                        image_bytes = _to_jpeg(image_bytes)
+                    batch.append((name, student_number, embeddings, image_bytes))
+                    if len(batch) >= batch_size:
+                        yield from _save_batch(batch, upload_folder, replace, max_templates)
+                        batch = []
+        if batch:
+            yield from _save_batch(batch, upload_folder, replace, max_templates)
+
+def summarize(results):
+    """
+    Counts results by status.
+    """
+    return dict(Counter(result['status'] for result in results))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='Zip archive or directory of photos named <student number>.jpg')
+    parser.add_argument('--workers', type=int, default=4, help='Photos decoded and embedded at once')
+    parser.add_argument('--batch-size', type=int, default=100, help='Students written per transaction')
+    parser.add_argument('--replace', action='store_true', help='Re-enrol students who already have a face enrolled')
+    parser.add_argument('--report', help='Write the per-file results to this CSV file')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ {args.source} not found.", file=sys.stderr)
+        sys.exit(1)
+
+    from app import app, create_tables, invalidate_galleries
+    from profiles import enrolment_profiles
+
+    create_tables()
+    results = []
+    with app.app_context():
+        profiles = enrolment_profiles(app.config['RECOGNITION_DEFAULT_PROFILE'])
+        print(f"Enrolling {args.source} with {', '.join(sorted({p.model_name for p in profiles}))}...")
+        for result in enroll_photos(args.source, profiles, app.config['UPLOAD_FOLDER'], workers=args.workers,
+                                    batch_size=args.batch_size, replace=args.replace,
+                                    max_templates=app.config['GALLERY_MAX_TEMPLATES']):
+            results.append(result)
+            if result['status'] in FAILURES:
+                print(f"❌ {result['file']}: {result['status']} {result['detail']}".rstrip())
+        invalidate_galleries()
+
+    if args.report:
+        with open(args.report, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['file', 'student_number', 'status', 'detail'])
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"✅ Report written to {args.report}")
+    print(f"🎉 Bulk enrolment complete: {summarize(results)}")
+
+if __name__ == "__main__":
+    main()
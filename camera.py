@@ -3,12 +3,19 @@ import os
 import sqlite3
 import numpy as np
 from datetime import datetime
-from deepface import DeepFace
+from database import DB_PATH, connect
+from gallery import pack_template, unpack_template, DEFAULT_MODEL
+from profiles import load_profile, settings_options
+from recognition import get_backend, limit_width
+from recognition_service import RecognitionClient
 
 # --- Configuration ---
-DB_PATH = os.path.join(os.path.dirname(__file__), 'database.db')
 FACES_DIR = "faces"
 TEMP_FRAME_PATH =  os.path.join(FACES_DIR, "temp_frame.jpg")
+RECOGNITION_PROFILE = os.environ.get('RECOGNITION_PROFILE', 'balanced') # A recognition_profile row, see profiles.py
+RECOGNITION_SERVICE_URL = os.environ.get('RECOGNITION_SERVICE_URL') # Use recognition_service.py if set
+
+recognition_client = RecognitionClient(RECOGNITION_SERVICE_URL) if RECOGNITION_SERVICE_URL else None
 
 # -----------------------------
 # Utility Functions
@@ -28,17 +35,20 @@ def initialize_system():
         return False
     return True
 
-def compute_embedding(image_path):
+def compute_embedding(image_path, profile):
     """
-    Compute face embedding for the given image using DeepFace.
+    Compute face embedding for the given image with the profile's detector
+    and model. Returns None if no face is found.
     """
-    embedding = DeepFace.represent(
-        img_path=image_path,
-        model_name="SFace",         # Switched to a lightweight model
-        detector_backend="ssd",     # Switched to the fastest detector     
-        enforce_detection=False
-    )
-    return np.array(embedding[0]["embedding"], dtype=np.float32)
+    if RECOGNITION_SERVICE_URL:
+        with open(image_path, 'rb') as f:
+            return recognition_client.embed(f.read(), profile=profile)
+
+    img = cv2.imread(image_path)
+    if img is None:
+        return None
+    backend = get_backend(profile['backend'], **settings_options(profile))
+    return backend.represent(limit_width(img, profile['input_width']))
 
 def cosine_similarity(vec1, vec2):
     """
@@ -60,7 +70,7 @@ def is_period_active_now(db_path):
 
     conn = None
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect(db_path, read_only=True)
         cursor = conn.cursor()
 
         # Query to check if the current day_name matches AND the current time string 
@@ -103,7 +113,7 @@ def is_period_active_now(db_path):
 # User Registration
 # -----------------------------
 
-def register_user():
+def register_user(profile):
     """
     Captures a new user's face, saves details to DB with embedding.
     """
@@ -117,7 +127,7 @@ def register_user():
         print("❌ Error: All fields are required. Registration cancelled.")
         return
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)
     cursor = conn.cursor()
 
     # Ensure embedding column exists
@@ -161,7 +171,7 @@ def register_user():
             print(f"✅ Face saved successfully as {image_path}")
 
             try:    
-                embedding = compute_embedding(image_path).tobytes()
+                embedding = compute_embedding(image_path, profile)
 
                 cursor.execute("""
                     INSERT INTO students (student_number, student_name, student_surname, student_email, registered_at, image_path, embedding)
@@ -173,8 +183,13 @@ def register_user():
                         f"{student_number}@dut4life.ac.za",
                         datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                         image_path,
-                        embedding
+                        embedding.tobytes()
                     ))
+                cursor.execute("""
+                    INSERT INTO face_template (student_number, embedding, model_name, source, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (student_number, pack_template(embedding), profile['model_name'], 'enrolment',
+                      datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
                 conn.commit()
                 print(f"✅ User '{student_name} {student_surname}' registered in the database.")
             except Exception as e:
@@ -193,7 +208,7 @@ def register_user():
 # Attendance System
 # -----------------------------
 
-def run_attendance_system():
+def run_attendance_system(profile):
     """
     Runs the live face recognition attendance system.
     """
@@ -205,7 +220,7 @@ def run_attendance_system():
         # Optional: You could add a loop here to check again after a delay, 
         # but for simplicity, we exit immediately.
         return
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)
     cursor = conn.cursor()
 
     cap = cv2.VideoCapture(0)
@@ -271,7 +286,12 @@ def run_attendance_system():
             continue
 
         cv2.imwrite(TEMP_FRAME_PATH, frame)
-        frame_embedding = compute_embedding(TEMP_FRAME_PATH)
+        frame_embedding = compute_embedding(TEMP_FRAME_PATH, profile)
+        if frame_embedding is None:
+            cv2.imshow("Attendance System", frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+            continue
     
         for expected in expected_register:
             print(expected)
@@ -297,10 +317,19 @@ def run_attendance_system():
             if full_name in recognized_today or not embedding_blob:
                 continue
 
-            db_embedding = np.frombuffer(embedding_blob, dtype=np.float32)
-            similarity = cosine_similarity(frame_embedding, db_embedding)
+            # Compare with the student's templates from the profile's model,
+            # else the single legacy (default-model) embedding
+            cursor.execute("SELECT embedding FROM face_template WHERE student_number = ? AND model_name = ?",
+                           (student_number, profile['model_name']))
+            db_embeddings = [unpack_template(blob) for (blob,) in cursor.fetchall()]
+            if not db_embeddings and profile['model_name'] == DEFAULT_MODEL:
+                db_embeddings = [np.frombuffer(embedding_blob, dtype=np.float32)]
+            db_embeddings = [e for e in db_embeddings if e.shape == frame_embedding.shape]
+            if not db_embeddings:
+                continue
+            similarity = max(cosine_similarity(frame_embedding, e) for e in db_embeddings)
 
-            if similarity > 0.75:  # threshold
+            if similarity > profile['threshold']:  # threshold
                 now_time = datetime.now().strftime("%H:%M:%S")
                 print(f"✅ {full_name} recognized at {now_time}")
 
@@ -334,6 +363,9 @@ def run_attendance_system():
 def main():
     if not initialize_system():
         return
+    profile = load_profile(DB_PATH, RECOGNITION_PROFILE)
+    print(f"[INFO] Recognition profile '{RECOGNITION_PROFILE}': {profile['model_name']} / "
+          f"{profile['detector_backend']}, threshold {profile['threshold']}")
 
     while True:
         print("\n--- Attendance System Menu ---")
@@ -343,9 +375,9 @@ def main():
         choice = input("Enter your choice (1, 2, or 3): ").strip()
 
         if choice == '1':
-            register_user()
+            register_user(profile)
         elif choice == '2':
-            run_attendance_system()
+            run_attendance_system(profile)
         elif choice == '3':
             print("Goodbye!")
             break
@@ -0,0 +1,60 @@
+"""
+Response compression for large JSON payloads. gzip is always available;
+brotli is used when the optional 'brotli' package is installed and the
+browser accepts it.
+"""
+import gzip
+from functools import wraps
+from flask import request, make_response
+
+try:
+    import brotli
+except ImportError: # Optional dependency
+    brotli = None
+
+def _encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def compress_response(response, min_bytes=1024, level=6):
+    """
+    Compresses a response body in place if the client accepts it and the
+    body is at least min_bytes long.
+    """
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    encoding = _encoding()
+    if encoding is None or len(data) < min_bytes:
+        return response
+
+    if encoding == 'br':
+        # Brotli quality runs 0-11; map gzip-style levels onto its fast range
+        compressed = brotli.compress(data, quality=min(level, 11))
+    else:
+        compressed = gzip.compress(data, compresslevel=level)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # The encoded body differs byte for byte, so the validator becomes weak;
+    # If-None-Match still matches it (weak comparison)
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
+def compressed(min_bytes=1024, level=6):
+    """
+    Decorator compressing a view's response; see compress_response().
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return compress_response(make_response(view(*args, **kwargs)), min_bytes=min_bytes, level=level)
+        return wrapper
+    return decorator
@@ -0,0 +1,126 @@
+"""
+SQLite connection setup shared by the web app, camera.py, the recognition
+service and the command line tools, which all use database.db at once.
+
+Every connection runs with:
+- journal_mode=WAL, so readers never block the writer and the writer
+  never blocks readers (the mode is stored in the database file);
+- busy_timeout, so a writer waits its turn for the write lock instead of
+  failing with "database is locked";
+- synchronous=NORMAL, which in WAL mode cannot corrupt the database and
+  skips an fsync per commit.
+
+The web app also gets a separate pool of read-only connections for
+reports and exports. Queries inside read_only() (a context manager and
+view decorator) use it, so long reads never hold up writes. Analytics can
+read from a periodically refreshed copy instead (see snapshot.py).
+"""
+import contextvars
+import os
+import sqlite3
+from contextlib import contextmanager
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.db')
+BUSY_TIMEOUT = 10.0 # Seconds a connection waits for a lock before giving up
+REPORTING_BIND = 'reporting'
+SNAPSHOT_BIND = 'snapshot'
+READ_ONLY_BINDS = (REPORTING_BIND, SNAPSHOT_BIND)
+
+_read_bind = contextvars.ContextVar('read_bind', default=None)
+
+def configure_connection(conn, read_only=False):
+    """
+    Applies the shared PRAGMAs to a new sqlite3 connection.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}")
+        if not read_only:
+            cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+    finally:
+        cursor.close()
+
+def connect(db_path=DB_PATH, read_only=False):
+    """
+    Opens a configured sqlite3 connection; read_only ones cannot write.
+    """
+    if read_only:
+        conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, timeout=BUSY_TIMEOUT)
+    else:
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+    configure_connection(conn, read_only=read_only)
+    return conn
+
+@contextmanager
+def reading_from(bind_key):
+    """
+    Sends the session's reads to the engine of the given bind while active.
+    """
+    token = _read_bind.set(bind_key)
+    try:
+        yield
+    finally:
+        _read_bind.reset(token)
+
+def read_only():
+    """
+    Sends the session's queries to the read-only reporting pool while
+    active. Also usable as a decorator on views that only read.
+    """
+    return reading_from(REPORTING_BIND)
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session that reads from the reporting engine inside
+    read_only() (or another bind inside reading_from()). Flushes always go
+    to the primary engine.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        bind_key = _read_bind.get()
+        if bind is None and bind_key is not None and not self._flushing:
+            engine = self._db.engines.get(bind_key)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def read_only_url(path):
+    return make_url('sqlite://').set(database=f"file:{os.path.abspath(path)}",
+                                     query={'mode': 'ro', 'uri': 'true'}).render_as_string(hide_password=False)
+
+def init_database(app, db, pool_size=5, reporting_pool_size=4, snapshot_path=None):
+    """
+    Configures the app's SQLite engines and initialises db with it: the
+    primary engine for the request path, plus a read-only reporting engine
+    over the same file and, given snapshot_path, one over the reporting
+    snapshot. Replaces db.init_app(app).
+    """
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    is_file = url.drivername.startswith('sqlite') and url.database not in (None, '', ':memory:')
+    if is_file:
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        options.setdefault('pool_size', pool_size)
+        options.setdefault('connect_args', {}).setdefault('timeout', BUSY_TIMEOUT)
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        binds[REPORTING_BIND] = {
+            'url': read_only_url(url.database),
+            'pool_size': reporting_pool_size,
+            'connect_args': {'timeout': BUSY_TIMEOUT},
+        }
+        if snapshot_path:
+            binds[SNAPSHOT_BIND] = {
+                'url': read_only_url(snapshot_path),
+                'pool_size': reporting_pool_size,
+                'connect_args': {'timeout': BUSY_TIMEOUT},
+            }
+    db.init_app(app)
+
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect',
+                             lambda conn, record, read_only=key in READ_ONLY_BINDS: configure_connection(conn, read_only))
@@ -0,0 +1,121 @@
+"""
+Short-lived cache of recognition results for near-duplicate frames.
+
+Capture stations send a frame every few seconds, and most of them show the
+same scene as the one before: a student standing still, or an empty
+doorway. Frames are keyed by a 64-bit difference hash (dHash) of a tiny
+grayscale copy, so two frames whose hashes differ in only a few bits reuse
+the earlier result instead of running detection and embedding again.
+Face crops sent on their own are not cached: aligned crops of different
+students differ too little at this size.
+"""
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from metrics import Counter, Gauge
+
+FRAME_CACHE_LOOKUPS = Counter(
+    'frame_cache_lookups_total', 'Frame cache lookups by result.', ['result'])
+for result in ('hit', 'miss'):
+    FRAME_CACHE_LOOKUPS.labels(result=result)
+FRAME_CACHE_ENTRIES = Gauge(
+    'frame_cache_entries', 'Frames currently held in the frame cache.')
+
+def frame_hash(image_bytes, hash_size=8):
+    """
+    dHash of an encoded frame: compares each pixel of a (hash_size + 1) x
+    hash_size grayscale thumbnail with its right-hand neighbour. Returns an
+    int, or None if the image cannot be decoded.
+    """
+    import cv2
+
+    buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+    # JPEG frames decode straight to 1/8 scale, far cheaper than a full decode
+    img = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None:
+        return None
+    thumbnail = cv2.resize(img, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+class FrameCache:
+    """
+    Recognition results per (capture session, frame hash). A lookup matches
+    any frame of the same session within max_distance bits. Entries expire
+    ttl seconds after the frame they came from was recognised, so even a
+    static scene is re-checked regularly; the least recently used entries are
+    evicted beyond max_entries.
+    """
+
+    def __init__(self, ttl=10.0, max_entries=1024, max_distance=10):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.entries = OrderedDict() # (session_key, hash) -> (stored_at, result), oldest first
+        self.sessions = {} # session_key -> set of hashes, for the near-match scan
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        FRAME_CACHE_ENTRIES.labels().set_function(lambda: len(self.entries))
+
+    def _remove(self, key):
+        del self.entries[key]
+        session_key, frame_hash = key
+        hashes = self.sessions[session_key]
+        hashes.discard(frame_hash)
+        if not hashes:
+            del self.sessions[session_key]
+
+    def get(self, session_key, frame_hash):
+        """
+        Returns the cached result for a near-duplicate frame, or None.
+        """
+        now = time.monotonic()
+        best_key, best_distance = None, self.max_distance + 1
+        with self.lock:
+            for cached_hash in list(self.sessions.get(session_key, ())):
+                key = (session_key, cached_hash)
+                if now - self.entries[key][0] > self.ttl:
+                    self._remove(key)
+                    continue
+                distance = hamming(cached_hash, frame_hash)
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+
+            if best_key is None:
+                self.misses += 1
+                result = None
+            else:
+                self.entries.move_to_end(best_key)
+                self.hits += 1
+                result = self.entries[best_key][1]
+        FRAME_CACHE_LOOKUPS.labels(result='miss' if best_key is None else 'hit').inc()
+        return result
+
+    def put(self, session_key, frame_hash, result):
+        key = (session_key, frame_hash)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic(), result)
+            self.sessions.setdefault(session_key, set()).add(frame_hash)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sessions.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
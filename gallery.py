@@ -0,0 +1,202 @@
+import numpy as np
+from models import db, Student, Face_Template, Class_Register
+
+# Templates are stored L2-normalised as float16 to halve their size on disk;
+# cosine scores are unaffected at the precision we threshold on.
+TEMPLATE_DTYPE = np.float16
+
+# The model behind Student.embedding and every template stored before
+# recognition profiles existed
+DEFAULT_MODEL = 'SFace'
+
+# -----------------------------
+# Embedding Helpers
+# -----------------------------
+
+def normalize(vec):
+    """
+    Returns the L2-normalised float32 copy of an embedding.
+    """
+    vec = np.asarray(vec, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+def pack_template(embedding):
+    """
+    Serialises an embedding into the compact template format.
+    """
+    return normalize(embedding).astype(TEMPLATE_DTYPE).tobytes()
+
+def unpack_template(blob):
+    """
+    Deserialises a stored template into a float32 vector.
+    """
+    return np.frombuffer(blob, dtype=TEMPLATE_DTYPE).astype(np.float32)
+
+def centroid(vectors):
+    """
+    Returns the normalised mean of a list of embeddings.
+    """
+    return normalize(np.mean([normalize(v) for v in vectors], axis=0))
+
+def student_vectors(student, model_name=DEFAULT_MODEL):
+    """
+    Returns every embedding enrolled for a student with the given model.
+    Students enrolled before templates existed only have the single
+    default-model vector in Student.embedding.
+    """
+    templates = [t for t in student.face_templates if t.model_name == model_name]
+    if templates:
+        return [unpack_template(t.embedding) for t in templates]
+    if model_name == DEFAULT_MODEL and student.embedding:
+        return [np.frombuffer(student.embedding, dtype=np.float32)]
+    return []
+
+# -----------------------------
+# Vectorised Gallery
+# -----------------------------
+
+class Gallery:
+    """
+    Stacks the templates of a group of students into one matrix so a frame
+    embedding is scored against all of them with a single matrix product.
+    Built from (owner, vectors) pairs; the owner is whatever the caller wants
+    back from match(), e.g. a Student or a student number.
+    """
+
+    def __init__(self, entries, dim=None):
+        self.students = []
+        rows = []
+        owners = []
+        centroids = []
+        for owner, vectors in entries:
+            vectors = [v for v in vectors if dim is None or v.shape[0] == dim]
+            if not vectors:
+                continue
+            index = len(self.students)
+            self.students.append(owner)
+            rows.extend(normalize(v) for v in vectors)
+            owners.extend([index] * len(vectors))
+            centroids.append(centroid(vectors))
+
+        self.dim = dim if dim is not None else (rows[0].shape[0] if rows else 0)
+        self.matrix = np.vstack(rows) if rows else np.empty((0, self.dim), dtype=np.float32)
+        self.owners = np.asarray(owners, dtype=np.int32)
+        self.centroids = np.vstack(centroids) if centroids else np.empty((0, self.dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.students)
+
+    def match(self, embedding, scoring='max'):
+        """
+        Returns (student, similarity) for the best-scoring student, or
+        (None, 0.0) if the gallery is empty.
+        'max' scores each student by their closest template,
+        'centroid' by the mean of their templates.
+        """
+        if not self.students or embedding.shape[0] != self.dim:
+            return None, 0.0
+
+        query = normalize(embedding)
+        if scoring == 'centroid':
+            scores = self.centroids @ query
+            best = int(np.argmax(scores))
+            return self.students[best], float(scores[best])
+
+        scores = self.matrix @ query
+        best = int(np.argmax(scores))
+        return self.students[self.owners[best]], float(scores[best])
+
+def build_gallery(students, dim=None, model_name=DEFAULT_MODEL):
+    """
+    Builds a gallery of Student objects from their templates for one model.
+    """
+    return Gallery(((student, student_vectors(student, model_name)) for student in students), dim=dim)
+
+def gallery_from_vectors(vectors, dim, model_name=DEFAULT_MODEL):
+    """
+    Builds a gallery of student numbers from cached vectors, a dict of
+    {student_number: {model_name: [vectors]}} holding each student's legacy
+    Student.embedding under None. Students without templates from the model
+    fall back to the legacy vector, which only ever holds default-model
+    embeddings.
+    """
+    legacy = model_name == DEFAULT_MODEL
+    return Gallery(((student_number, models.get(model_name) or (models.get(None, []) if legacy else []))
+                    for student_number, models in vectors.items()), dim=dim)
+
+def load_module_vectors(module_code):
+    """
+    Reads every student registered for the module with their templates, as
+    {student_number: {model_name: [vectors]}} with each student's legacy
+    Student.embedding under None. Students without a face enrolled map to {}.
+    """
+    registered = db.select(Class_Register.student_number).where(Class_Register.subject_code == module_code)
+    rows = db.session.query(
+        Student.student_number, Student.embedding, Face_Template.embedding, Face_Template.model_name
+    ).outerjoin(
+        Face_Template, Face_Template.student_number == Student.student_number
+    ).filter(
+        Student.student_number.in_(registered)
+    ).order_by(Student.student_number, Face_Template.id)
+
+    vectors = {}
+    for student_number, legacy_blob, template_blob, model_name in rows:
+        models = vectors.get(student_number)
+        if models is None:
+            models = vectors[student_number] = {}
+            if legacy_blob:
+                models[None] = [np.frombuffer(legacy_blob, dtype=np.float32)]
+        if template_blob is not None:
+            models.setdefault(model_name, []).append(unpack_template(template_blob))
+    return vectors
+
+# -----------------------------
+# Enrolment
+# -----------------------------
+
+def add_template(student, embedding, source='enrolment', max_templates=5, model_name=DEFAULT_MODEL):
+    """
+    Adds a template from the given model for the student, evicting that
+    model's oldest ones beyond max_templates (live captures are evicted
+    before enrolment captures), and refreshes Student.embedding with the
+    centroid. The caller commits.
+    """
+    templates = [t for t in student.face_templates if t.model_name == model_name]
+    embedding = np.asarray(embedding, dtype=np.float32)
+
+    # Drop the oldest templates to make room for the new one
+    while templates and len(templates) >= max_templates:
+        live = [t for t in templates if t.source == 'live']
+        oldest = live[0] if live else templates[0]
+        templates.remove(oldest)
+        db.session.delete(oldest)
+
+    # Keep the single legacy embedding as the student's first template
+    new_templates = []
+    if not templates and model_name == DEFAULT_MODEL and student.embedding and max_templates > 1:
+        legacy = np.frombuffer(student.embedding, dtype=np.float32)
+        if legacy.shape[0] == embedding.shape[0]:
+            new_templates.append(Face_Template(student=student, embedding=pack_template(legacy),
+                                               model_name=model_name, source='enrolment'))
+
+    new_templates.append(Face_Template(student=student, embedding=pack_template(embedding),
+                                       model_name=model_name, source=source))
+    db.session.add_all(new_templates)
+    templates.extend(new_templates)
+
+    # Centroid kept in Student.embedding for has_face_id checks and, for the
+    # default model, for camera.py's legacy fallback
+    if model_name == DEFAULT_MODEL or student.embedding is None:
+        student.embedding = centroid([unpack_template(t.embedding) for t in templates]).tobytes()
+    return templates
+
+def clear_templates(student):
+    """
+    Removes every template for the student. The caller commits.
+    """
+    for template in list(student.face_templates):
+        db.session.delete(template)
+    db.session.flush()
+    db.session.expire(student, ['face_templates'])
+    student.embedding = None
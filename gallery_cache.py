@@ -0,0 +1,130 @@
+"""
+Memory-bounded cache of module galleries for in-process recognition.
+
+Building a module's gallery reads every registered student's templates
+from SQLite, which is far slower than matching a frame against it. Galleries
+are kept per (module code, model, embedding size) until the cache holds
+more than max_bytes of embeddings, then the least recently used ones are
+evicted. Entries have no expiry: enrolment changes drop the galleries whose
+roster includes the student, and register changes (app.py's
+invalidate_galleries()) drop the galleries of every module the student
+joined or left.
+"""
+import threading
+from collections import OrderedDict
+from gallery import gallery_from_vectors, load_module_vectors
+from metrics import Counter, Gauge
+
+GALLERY_CACHE_LOOKUPS = Counter(
+    'gallery_cache_lookups_total', 'Module gallery cache lookups by result.', ['result'])
+for result in ('hit', 'miss'):
+    GALLERY_CACHE_LOOKUPS.labels(result=result)
+GALLERY_CACHE_EVICTIONS = Counter(
+    'gallery_cache_evictions_total', 'Module galleries dropped from the cache by reason.', ['reason'])
+for reason in ('memory', 'invalidated'):
+    GALLERY_CACHE_EVICTIONS.labels(reason=reason)
+GALLERY_CACHE_BYTES = Gauge(
+    'gallery_cache_bytes', 'Estimated memory held by cached module galleries.')
+GALLERY_CACHE_ENTRIES = Gauge(
+    'gallery_cache_entries', 'Module galleries currently cached.')
+
+# Rough per-student cost of the owner list, roster set and their strings
+STUDENT_OVERHEAD_BYTES = 200
+
+def gallery_bytes(gallery, roster):
+    """
+    Estimated memory held by a cached gallery and its roster.
+    """
+    return (gallery.matrix.nbytes + gallery.centroids.nbytes + gallery.owners.nbytes
+            + STUDENT_OVERHEAD_BYTES * len(roster))
+
+class GalleryCache:
+    """
+    Galleries of student numbers per (module_code, model_name, dim), least
+    recently used first out once they hold more than max_bytes. Must be used
+    inside an app context.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # (module_code, model_name, dim) -> (gallery, roster, nbytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0 # Bumped by every invalidation, so a load racing one is not stored
+        self.lock = threading.Lock()
+        GALLERY_CACHE_BYTES.labels().set_function(lambda: self.bytes)
+        GALLERY_CACHE_ENTRIES.labels().set_function(lambda: len(self.entries))
+
+    def get(self, module_code, model_name, dim):
+        """
+        Returns the module's gallery for embeddings of the given model and
+        size, loading it on a miss.
+        """
+        key = (module_code, model_name, dim)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            generation = self.generation
+        if entry is not None:
+            GALLERY_CACHE_LOOKUPS.labels(result='hit').inc()
+            return entry[0]
+
+        GALLERY_CACHE_LOOKUPS.labels(result='miss').inc()
+        vectors = load_module_vectors(module_code)
+        gallery = gallery_from_vectors(vectors, dim, model_name)
+        roster = frozenset(vectors)
+        self._store(key, (gallery, roster, gallery_bytes(gallery, roster)), generation)
+        return gallery
+
+    def _store(self, key, entry, generation):
+        nbytes = entry[2]
+        with self.lock:
+            if generation != self.generation or nbytes > self.max_bytes:
+                return
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            self.entries[key] = entry
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+                GALLERY_CACHE_EVICTIONS.labels(reason='memory').inc()
+
+    def invalidate(self, module_code=None, student_number=None):
+        """
+        Drops the module's galleries, or those whose roster includes the
+        student. With no arguments, drops every gallery.
+        """
+        with self.lock:
+            self.generation += 1
+            for key, (_, roster, nbytes) in list(self.entries.items()):
+                if ((module_code is None and student_number is None) or key[0] == module_code
+                        or (student_number is not None and student_number in roster)):
+                    del self.entries[key]
+                    self.bytes -= nbytes
+                    GALLERY_CACHE_EVICTIONS.labels(reason='invalidated').inc()
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'modules': sorted({key[0] for key in self.entries}),
+            }
@@ -0,0 +1,148 @@
+"""
+Admission control for live recognition.
+
+When many capture stations start at once (the 8 o'clock rush), inference
+latency climbs and fixed-interval clients keep adding frames to the
+backlog. The LoadShedder tracks frames in flight and a moving average of
+recognition latency, turns frames away early once over budget, asks the
+capture pages to slow down, and after sustained overload switches
+recognition to a cheaper detector until latency recovers.
+"""
+import math
+import threading
+import time
+from metrics import Counter, Gauge, RECOGNITION_IN_FLIGHT
+
+FRAMES_SHED = Counter(
+    'recognition_frames_shed_total', 'Frames turned away before recognition because the server was over budget.')
+RECOGNITION_LATENCY_EWMA = Gauge(
+    'recognition_latency_ewma_seconds', 'Moving average of per-frame recognition latency.')
+RECOGNITION_DEGRADED = Gauge(
+    'recognition_degraded', '1 while recognition runs the cheaper profile because of sustained load.')
+CAPTURE_INTERVAL = Gauge(
+    'capture_interval_milliseconds', 'Capture interval currently asked of capture pages.')
+
+class LoadShedder:
+    """
+    Bounds the frames recognised at once. Up to max_in_flight frames are
+    admitted while the latency average is within latency_budget seconds;
+    above it the limit shrinks in proportion, but one frame is always
+    admitted so the average keeps updating. Overload lasting degrade_after
+    seconds sets degraded, which clears after recover_after seconds below
+    half the budget.
+    """
+
+    def __init__(self, max_in_flight=4, latency_budget=1.5, base_interval_ms=3000, max_interval_ms=15000,
+                 degrade_after=15.0, recover_after=30.0, alpha=0.2):
+        self.max_in_flight = max_in_flight
+        self.latency_budget = latency_budget
+        self.base_interval_ms = base_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.degrade_after = degrade_after
+        self.recover_after = recover_after
+        self.alpha = alpha
+        self.in_flight = 0
+        self.latency = 0.0 # Seconds, exponentially weighted
+        self.last_sample = None # When latency was last updated
+        self.degraded = False
+        self.overloaded_since = None
+        self.calm_since = None
+        self.shed = 0
+        self.lock = threading.Lock()
+        RECOGNITION_IN_FLIGHT.labels().set_function(lambda: self.in_flight)
+        RECOGNITION_LATENCY_EWMA.labels().set_function(lambda: self.latency)
+        RECOGNITION_DEGRADED.labels().set_function(lambda: int(self.degraded))
+        CAPTURE_INTERVAL.labels().set_function(self.interval_ms)
+
+    def _latency_ratio(self, now):
+        # An idle server has nothing queued, however slow its last frame was
+        if self.last_sample is None or now - self.last_sample > self.recover_after:
+            return 0.0
+        return self.latency / self.latency_budget
+
+    def _pressure(self, now):
+        return max(self.in_flight / self.max_in_flight, self._latency_ratio(now))
+
+    def _update_state(self, now):
+        if self._pressure(now) >= 1:
+            self.calm_since = None
+            if self.overloaded_since is None:
+                self.overloaded_since = now
+            if not self.degraded and now - self.overloaded_since >= self.degrade_after:
+                self.degraded = True
+                print(f"[WARN] Recognition overloaded for {self.degrade_after:.0f}s; switching to the cheaper profile")
+            return
+
+        self.overloaded_since = None
+        if not self.degraded:
+            return
+        if self._pressure(now) >= 0.5:
+            self.calm_since = None
+        elif self.calm_since is None:
+            self.calm_since = now
+        elif now - self.calm_since >= self.recover_after:
+            self.degraded = False
+            self.calm_since = None
+            print("[INFO] Recognition load recovered; restoring the configured profiles")
+
+    def try_acquire(self):
+        """
+        Admits a frame, returning False if it should be turned away. Every
+        admitted frame must be followed by release().
+        """
+        now = time.monotonic()
+        with self.lock:
+            limit = self.max_in_flight
+            ratio = self._latency_ratio(now)
+            if ratio > 1:
+                limit = max(1, int(self.max_in_flight / ratio))
+            admitted = self.in_flight < limit
+            if admitted:
+                self.in_flight += 1
+            else:
+                self.shed += 1
+            self._update_state(now)
+        if not admitted:
+            FRAMES_SHED.inc()
+        return admitted
+
+    def release(self, latency=None):
+        """
+        Ends an admitted frame. latency is the recognition time in seconds;
+        leave it out for frames that skipped recognition (cache hits, errors).
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.in_flight -= 1
+            if latency is not None:
+                if self.last_sample is None:
+                    self.latency = latency
+                else:
+                    self.latency += self.alpha * (latency - self.latency)
+                self.last_sample = now
+            self._update_state(now)
+
+    def interval_ms(self):
+        """
+        The capture interval to ask of capture pages: the base interval,
+        stretched in proportion to the load once over budget.
+        """
+        pressure = self._pressure(time.monotonic())
+        return int(min(self.max_interval_ms, self.base_interval_ms * max(1.0, pressure)))
+
+    def retry_after(self):
+        """
+        Whole seconds a turned-away client should wait, for the Retry-After header.
+        """
+        return math.ceil(self.interval_ms() / 1000)
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'latency_ms': round(self.latency * 1000, 1),
+            'latency_budget_ms': round(self.latency_budget * 1000, 1),
+            'degraded': self.degraded,
+            'interval_ms': self.interval_ms(),
+            'shed': self.shed
+        }
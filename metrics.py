@@ -0,0 +1,239 @@
+"""
+Minimal in-process metrics in the Prometheus text exposition format.
+
+Updates take one small lock per labelled series and histograms find their
+bucket with a binary search, so recording is cheap enough for the capture
+hot path. render() produces the /metrics response.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Registry:
+    """
+    Holds every metric and renders them for a scrape.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+class Metric:
+    """
+    Base for labelled metrics. Calling the value methods directly on an
+    unlabelled metric updates its single series.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.labels() # Unlabelled metrics report 0 before their first update
+        registry.register(self)
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self.new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def series(self):
+        with self.lock:
+            return [(tuple(zip(self.labelnames, key)), child) for key, child in self.children.items()]
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class Counter(Metric):
+    type = 'counter'
+    new_child = _CounterChild
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def samples(self):
+        return [f"{self.name}{_format_labels(labels)} {_format_value(child.value)}"
+                for labels, child in self.series()]
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """
+        Reads the value from function() at scrape time instead.
+        """
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function else self.value
+
+class Gauge(Metric):
+    type = 'gauge'
+    new_child = _GaugeChild
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def samples(self):
+        return [f"{self.name}{_format_labels(labels)} {_format_value(child.get())}"
+                for labels, child in self.series()]
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+class Histogram(Metric):
+    type = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def samples(self):
+        lines = []
+        for labels, child in self.series():
+            with child.lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+class StageTimer:
+    """
+    Times pipeline stages into a histogram labelled by stage. Same interface
+    as the benchmark's timer, so the backends accept either.
+    """
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    @contextmanager
+    def stage(self, name):
+        with self.histogram.labels(stage=name).time():
+            yield
+
+def render():
+    return REGISTRY.render()
+
+# -----------------------------
+# Recognition Metrics
+# -----------------------------
+
+RECOGNITION_STAGE_SECONDS = Histogram(
+    'recognition_stage_seconds', 'Time spent in each recognition pipeline stage.', ['stage'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+ATTENDANCE_RESULTS = Counter(
+    'attendance_results_total', 'mark_attendance responses by result status.', ['status'])
+for status in ('present', 'already_present', 'unidentifiable', 'no_active_period', 'busy'):
+    ATTENDANCE_RESULTS.labels(status=status)
+FACE_CROPS = Counter(
+    'recognition_face_crops_total', 'Client-supplied face crops, accepted or rejected by reason.', ['result'])
+MATCH_SIMILARITY = Histogram(
+    'recognition_match_similarity', 'Cosine similarity of the best gallery match per frame.',
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0))
+GALLERY_STUDENTS = Gauge(
+    'recognition_gallery_students', 'Enrolled students in the most recently built gallery.', ['module_code'])
+GALLERY_TEMPLATES = Gauge(
+    'recognition_gallery_templates', 'Templates in the most recently built gallery.', ['module_code'])
+MODEL_LOAD_SECONDS = Gauge(
+    'recognition_model_load_seconds', 'Time taken to load each recognition backend.', ['backend'])
+RECOGNITION_IN_FLIGHT = Gauge(
+    'recognition_in_flight', 'Frames currently being recognised.')
+BATCH_QUEUE_DEPTH = Gauge(
+    'recognition_batch_queue_depth', 'Faces waiting for an embedding micro-batch.')
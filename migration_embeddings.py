@@ -1,28 +1,35 @@
+import argparse
 import sqlite3
 import os
-import numpy as np
-from deepface import DeepFace
+from datetime import datetime
+from database import DB_PATH, connect
+import cv2
+from gallery import pack_template
+from profiles import load_profile, settings_options
+from recognition import get_backend, limit_width
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "database.db")
 
-def compute_embedding(image_path):
+def compute_embedding(image_path, profile):
     """
-    Compute embedding vector from image.
+    Compute embedding vector from image with the profile's detector and model.
     """
     try:
-        embedding = DeepFace.represent(
-            img_path=image_path,
-            model_name="Facenet512",
-            detector_backend="retinaface",
-            enforce_detection=False
-        )
-        return np.array(embedding[0]["embedding"], dtype=np.float32)
+        img = cv2.imread(image_path)
+        if img is None:
+            raise ValueError("Could not read image")
+        backend = get_backend(profile['backend'], **settings_options(profile))
+        return backend.represent(limit_width(img, profile['input_width']))
     except Exception as e:
         print(f"⚠️ Skipping {image_path}: {e}")
         return None
 
-def migrate():
-    conn = sqlite3.connect(DB_PATH)
+def migrate(profile_name):
+    """
+    Adds a template from the profile's model for every student with a stored
+    face image and no template from that model yet, so the profile can be
+    assigned to venues without students re-enrolling.
+    """
+    conn = connect(DB_PATH)
     cursor = conn.cursor()
 
     # Ensure column exists
@@ -33,24 +40,42 @@ def migrate():
     except sqlite3.OperationalError:
         print("ℹ️ 'embedding' column already exists.")
 
-    cursor.execute("SELECT id, student_name, student_surname, image_path FROM students WHERE image_path IS NOT NULL")
+    profile = load_profile(DB_PATH, profile_name)
+    model_name = profile['model_name']
+    print(f"Backfilling {model_name} templates for profile '{profile_name}'...")
+
+    cursor.execute("""
+        SELECT student_number, student_name, student_surname, image_path FROM students
+        WHERE image_path IS NOT NULL AND student_number NOT IN (
+            SELECT student_number FROM face_template WHERE model_name = ?
+        )
+    """, (model_name,))
     users = cursor.fetchall()
 
-    for user_id, name, surname, image_path in users:
+    for student_number, name, surname, image_path in users:
         print(f"Processing {name} {surname}...")
 
         if not os.path.exists(image_path):
             print(f"❌ Image not found: {image_path}")
             continue
 
-        embedding = compute_embedding(image_path)
+        embedding = compute_embedding(image_path, profile)
         if embedding is not None:
-            cursor.execute("UPDATE students SET embedding=? WHERE id=?", (embedding.tobytes(), user_id))
+            cursor.execute("""
+                INSERT INTO face_template (student_number, embedding, model_name, source, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (student_number, pack_template(embedding), model_name, 'enrolment',
+                  datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            # Students enrolled before templates existed only had the legacy column
+            cursor.execute("UPDATE students SET embedding = ? WHERE student_number = ? AND embedding IS NULL",
+                           (embedding.tobytes(), student_number))
             conn.commit()
-            print(f"✅ Stored embedding for {name} {surname}")
+            print(f"✅ Stored {model_name} template for {name} {surname}")
 
     conn.close()
     print("🎉 Migration complete.")
 
 if __name__ == "__main__":
-    migrate()
+    parser = argparse.ArgumentParser(description="Backfill face templates for a recognition profile's model.")
+    parser.add_argument('--profile', default='accurate', help="Recognition profile whose model to backfill")
+    migrate(parser.parse_args().profile)
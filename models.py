@@ -1,8 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from database import RoutingSession
 
-# Initialize the SQLAlchemy extension
-db = SQLAlchemy()
+# Initialize the SQLAlchemy extension; reads inside database.read_only() use the reporting engine
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Lecturer(db.Model):
     """
@@ -32,13 +33,17 @@ class Attendance(db.Model):
     Represents an attendance record for a user.
     """
     __tablename__ = 'attendance'
+    __table_args__ = (
+        # Per-period present/absent counts, and the absence job's "already marked?" check
+        db.Index('ix_attendance_period_date_status', 'class_period_id', 'date', 'status'),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('students.student_number'), nullable=False)
     class_period_id = db.Column(db.Integer, db.ForeignKey('class_period.id'))
     name = db.Column(db.String(100), nullable=False)
     time = db.Column(db.String(8), nullable=False) # Time of day (HH:MM:SS)
     date = db.Column(db.String(10), nullable=False) # Date (YYYY-MM-DD) <-- ADDED
-    status = db.Column(db.String(50), nullable=False, default='Absence')
+    status = db.Column(db.String(50), nullable=False, default='Absence') # 'Present', or 'Absence' once the period ended
 
     # Relationships
     student = db.relationship('Student', backref=db.backref('attendance_records', lazy=True))
@@ -75,6 +80,41 @@ class Student(db.Model):
             errors.append('Email already exists.')
         return errors
 
+    @staticmethod
+    def find_existing(student_numbers, student_emails, chunk_size=500):
+        """
+        Set-based validate_unique() for a batch: returns the given student
+        numbers and emails that are already taken, in a few IN (...) queries.
+        """
+        taken_numbers, taken_emails = set(), set()
+        for column, values, taken in ((Student.student_number, list(student_numbers), taken_numbers),
+                                      (Student.student_email, list(student_emails), taken_emails)):
+            for start in range(0, len(values), chunk_size):
+                rows = db.session.query(column).filter(column.in_(values[start:start + chunk_size]))
+                taken.update(value for (value,) in rows)
+        return taken_numbers, taken_emails
+
+class Face_Template(db.Model):
+    """
+    Represents one enrolled face embedding (template) for a student.
+    A student can hold several templates captured over time.
+    """
+    __tablename__ = 'face_template'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    student_number = db.Column(db.String(8), db.ForeignKey('students.student_number'), nullable=False, index=True)
+    embedding = db.Column(db.LargeBinary, nullable=False) # L2-normalised float16 vector
+    # Recognition model that produced the embedding; templates from before
+    # recognition profiles existed were all SFace
+    model_name = db.Column(db.String(50), nullable=False, default='SFace', server_default='SFace', index=True)
+    source = db.Column(db.String(20), nullable=False, default='enrolment') # 'enrolment' or 'live'
+    created_at = db.Column(db.String(100), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    # Relationships
+    student = db.relationship('Student', backref=db.backref('face_templates', lazy=True, order_by='Face_Template.id'))
+
+    def __repr__(self):
+        return f'<Face Template {self.student_number} ({self.source})>'
+
 class Class_Register(db.Model):
     """
     Represents a class register in the system.
@@ -141,6 +181,84 @@ class Venue(db.Model):
     venue_name = db.Column(db.String(50), unique=True, nullable=False)
     venue_block = db.Column(db.String(50), nullable=False)
     venue_campus = db.Column(db.String(120), nullable=False)
+    recognition_profile_id = db.Column(db.Integer, db.ForeignKey('recognition_profile.id'))
+
+    # Relationships
+    recognition_profile = db.relationship('Recognition_Profile', backref=db.backref('venues', lazy=True))
 
     def __repr__(self):
         return f'<Venue {self.venue_block}, {self.venue_campus}, {self.venue_name}>'
+
+class Recognition_Profile(db.Model):
+    """
+    Represents a named recognition setup (e.g. 'fast', 'balanced', 'accurate'):
+    which detector and model run, at what input resolution, and the
+    similarity a match needs.
+    """
+    __tablename__ = 'recognition_profile'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    backend = db.Column(db.String(20), nullable=False, default='deepface') # 'deepface' or 'opencv'
+    model_name = db.Column(db.String(50), nullable=False, default='SFace')
+    detector_backend = db.Column(db.String(50), nullable=False, default='ssd')
+    input_width = db.Column(db.Integer, nullable=False, default=0) # Frames wider than this are downscaled; 0 keeps them
+    threshold = db.Column(db.Float, nullable=False, default=0.70) # Minimum cosine similarity for a match
+
+    def __repr__(self):
+        return f'<Recognition Profile {self.name} ({self.model_name}/{self.detector_backend})>'
+
+class Capture_Station(db.Model):
+    """
+    Represents a capture device (browser or camera) that marks attendance.
+    A station's recognition profile overrides its venue's.
+    """
+    __tablename__ = 'capture_station'
+    id = db.Column(db.Integer, primary_key=True)
+    station_id = db.Column(db.String(64), unique=True, nullable=False)
+    name = db.Column(db.String(100))
+    recognition_profile_id = db.Column(db.Integer, db.ForeignKey('recognition_profile.id'))
+
+    # Relationships
+    recognition_profile = db.relationship('Recognition_Profile', backref=db.backref('capture_stations', lazy=True))
+
+    def __repr__(self):
+        return f'<Capture Station {self.station_id}>'
+
+class Job_Watermark(db.Model):
+    """
+    Records how far a background job has got (e.g. the end of the last class
+    period it processed), so it can catch up after downtime.
+    """
+    __tablename__ = 'job_watermark'
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(50), unique=True, nullable=False)
+    value = db.Column(db.String(100), nullable=False)
+
+    def __repr__(self):
+        return f'<Job Watermark {self.job_name} = {self.value}>'
+
+def add_missing_columns():
+    """
+    Adds columns and indexes defined on the models but missing from an
+    existing database; db.create_all() only creates missing tables. Call
+    inside an app context.
+    """
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(db.engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT '{column.server_default.arg}'"
+                conn.execute(db.text(ddl))
+                print(f"✅ Added '{column.name}' column to {table.name} table.")
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    print(f"✅ Added '{index.name}' index to {table.name} table.")
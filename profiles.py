@@ -0,0 +1,167 @@
+"""
+Recognition profiles: named combinations of detector, model, input
+resolution and match threshold, stored in the recognition_profile table.
+A capture station's profile overrides its venue's, and the venue's overrides
+the default one, so small rooms can run the fast path while exam halls run
+the accurate one.
+"""
+import sqlite3
+from database import connect
+from models import db, Recognition_Profile, Capture_Station
+
+# Created when missing; edit the rows (PUT /api/recognition_profiles/<name>) to tune them
+DEFAULT_PROFILES = {
+    'fast': {'backend': 'deepface', 'model_name': 'SFace', 'detector_backend': 'opencv',
+             'input_width': 640, 'threshold': 0.70},
+    'balanced': {'backend': 'deepface', 'model_name': 'SFace', 'detector_backend': 'ssd',
+                 'input_width': 0, 'threshold': 0.70},
+    'accurate': {'backend': 'deepface', 'model_name': 'Facenet512', 'detector_backend': 'retinaface',
+                 'input_width': 0, 'threshold': 0.70},
+}
+PROFILE_FIELDS = ['backend', 'model_name', 'detector_backend', 'input_width', 'threshold']
+
+_defaults_created = False
+
+def ensure_default_profiles(default_name='balanced', backend=None):
+    """
+    Adds any of DEFAULT_PROFILES missing from the database, once per process.
+    backend (RECOGNITION_BACKEND) replaces the default profile's backend
+    when that profile is created; afterwards the row is what counts. Call
+    inside an app context.
+    """
+    global _defaults_created
+    if _defaults_created:
+        return
+    existing = {profile.name: profile for profile in Recognition_Profile.query}
+    missing = []
+    for name, settings in DEFAULT_PROFILES.items():
+        if name in existing:
+            continue
+        if name == default_name and backend and backend != settings['backend']:
+            error = validate_profile_settings(dict(settings, backend=backend))
+            if error:
+                print(f"[ERROR] RECOGNITION_BACKEND '{backend}' not used for profile '{name}': {error}")
+            else:
+                settings = dict(settings, backend=backend)
+        missing.append(Recognition_Profile(name=name, **settings))
+    if missing:
+        db.session.add_all(missing)
+        db.session.commit()
+    default = existing.get(default_name)
+    if default is not None and backend and default.backend != backend:
+        print(f"[INFO] RECOGNITION_BACKEND '{backend}' ignored: profile '{default_name}' already uses "
+              f"'{default.backend}'. Edit it with PUT /api/recognition_profiles/{default_name}.")
+    _defaults_created = True
+
+def load_profile(db_path, name):
+    """
+    Reads a recognition profile's settings as a dict, for scripts that run
+    without the app. Falls back to the built-in defaults, including on a
+    database created before recognition profiles existed.
+    """
+    conn = connect(db_path, read_only=True)
+    try:
+        row = conn.execute(f"SELECT {', '.join(PROFILE_FIELDS)} FROM recognition_profile WHERE name = ?",
+                           (name,)).fetchone()
+    except sqlite3.OperationalError:
+        row = None # No recognition_profile table yet
+    finally:
+        conn.close()
+
+    if row:
+        return dict(zip(PROFILE_FIELDS, row))
+    if name not in DEFAULT_PROFILES:
+        raise ValueError(f"Unknown recognition profile '{name}'")
+    return dict(DEFAULT_PROFILES[name])
+
+def get_profile(name):
+    return Recognition_Profile.query.filter_by(name=name).first()
+
+def resolve_profile(venue=None, station_id=None, default_name='balanced'):
+    """
+    Returns the profile for a capture: the station's, else the venue's, else
+    the named default. None if even the default does not exist.
+    """
+    if station_id:
+        station = Capture_Station.query.filter_by(station_id=station_id).first()
+        if station and station.recognition_profile:
+            return station.recognition_profile
+    if venue is not None and venue.recognition_profile:
+        return venue.recognition_profile
+    return get_profile(default_name)
+
+def cheaper_profile(profile, cheap_name):
+    """
+    The profile to run under sustained load: the named cheap profile's
+    detector and input width with the original model and threshold, so
+    existing templates still match. Not saved to the database.
+    """
+    cheap = get_profile(cheap_name)
+    if profile is None or cheap is None or profile.name == cheap.name:
+        return profile
+    input_width = profile.input_width
+    if cheap.input_width and (not input_width or cheap.input_width < input_width):
+        input_width = cheap.input_width
+    return Recognition_Profile(name=f"{profile.name}/{cheap.name}", backend=profile.backend,
+                               model_name=profile.model_name, detector_backend=cheap.detector_backend,
+                               input_width=input_width, threshold=profile.threshold)
+
+def settings_options(settings):
+    """
+    The get_backend() options for a dict of profile settings. The 'opencv'
+    backend always runs YuNet + SFace, so it takes none.
+    """
+    if settings['backend'] == 'opencv':
+        return {}
+    return {key: settings[key] for key in ('model_name', 'detector_backend') if key in settings}
+
+def backend_options(profile):
+    """
+    The get_backend() options for a Recognition_Profile row.
+    """
+    return settings_options({field: getattr(profile, field) for field in PROFILE_FIELDS})
+
+def enrolment_profiles(default_name='balanced'):
+    """
+    One profile per recognition model in use: the default profile's and
+    those assigned to a venue or capture station. Enrolment stores a
+    template from each, so captures can move between them without students
+    re-enrolling. Run migration_embeddings.py --profile <name> to backfill a
+    model before first assigning a profile that uses it.
+    """
+    profiles = Recognition_Profile.query.filter(db.or_(
+        Recognition_Profile.name == default_name,
+        Recognition_Profile.venues.any(),
+        Recognition_Profile.capture_stations.any()
+    )).order_by(Recognition_Profile.id)
+    by_model = {}
+    for profile in profiles:
+        by_model.setdefault(profile.model_name, profile)
+    return list(by_model.values())
+
+def validate_profile_settings(settings):
+    """
+    Returns an error message for invalid profile settings, or None.
+    """
+    from recognition import BACKENDS
+
+    if settings.get('backend') not in BACKENDS:
+        return f"backend must be one of: {', '.join(BACKENDS)}"
+    if settings['backend'] == 'opencv' and settings.get('model_name') != 'SFace':
+        return "The 'opencv' backend only runs the SFace model"
+    if not isinstance(settings.get('input_width'), int) or settings['input_width'] < 0:
+        return 'input_width must be a whole number of pixels (0 keeps the full frame)'
+    if not isinstance(settings.get('threshold'), (int, float)) or not 0 < settings['threshold'] < 1:
+        return 'threshold must be between 0 and 1'
+    return None
+
+def profile_to_dict(profile):
+    return {
+        'id': profile.id,
+        'name': profile.name,
+        'backend': profile.backend,
+        'model_name': profile.model_name,
+        'detector_backend': profile.detector_backend,
+        'input_width': profile.input_width,
+        'threshold': profile.threshold
+    }
@@ -0,0 +1,108 @@
+import logging
+import os
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_request_log = logging.getLogger('slow_requests')
+
+class QueryStats:
+    """
+    SQL statements issued while handling one request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_seconds = 0.0
+        self.statements = [] # (seconds, statement)
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.db_seconds += seconds
+        self.statements.append((seconds, statement))
+
+    def slowest(self, limit=5):
+        return sorted(self.statements, key=lambda s: s[0], reverse=True)[:limit]
+
+    def most_repeated(self, limit=3):
+        """
+        The statements run most often; a high count points at an N+1 loop.
+        """
+        return Counter(statement for _, statement in self.statements).most_common(limit)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    if has_request_context() and 'query_stats' in g:
+        g.query_stats.record(statement, time.perf_counter() - started)
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    starts = exception_context.connection.info.get('query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def _configure_log(path):
+    if slow_request_log.handlers:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_request_log.addHandler(handler)
+    slow_request_log.setLevel(logging.INFO)
+    slow_request_log.propagate = False
+
+def _log_slow_request(stats, total_ms, response):
+    lines = [f"SLOW {request.method} {request.full_path.rstrip('?')} -> {response.status_code} "
+             f"in {total_ms:.1f} ms, {stats.count} queries, {stats.db_seconds * 1000:.1f} ms in the database"]
+    for seconds, statement in stats.slowest():
+        lines.append(f"    {seconds * 1000:8.2f} ms  {' '.join(statement.split())[:500]}")
+    for statement, count in stats.most_repeated():
+        if count > 1:
+            lines.append(f"    repeated {count}x  {' '.join(statement.split())[:500]}")
+    slow_request_log.warning('\n'.join(lines))
+
+def init_query_stats(app):
+    """
+    Records query count and database time for every request. In debug mode
+    (or with QUERY_STATS_HEADERS) they are returned as X-DB-* and
+    Server-Timing headers; requests over SLOW_REQUEST_MS or
+    SLOW_REQUEST_QUERIES are written to SLOW_REQUEST_LOG with their slowest
+    and most repeated statements.
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    if app.config.get('SLOW_REQUEST_LOG'):
+        _configure_log(app.config['SLOW_REQUEST_LOG'])
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        db_ms = stats.db_seconds * 1000
+
+        if app.debug or app.config.get('QUERY_STATS_HEADERS'):
+            response.headers['X-DB-Query-Count'] = str(stats.count)
+            response.headers['X-DB-Time-ms'] = f"{db_ms:.2f}"
+            response.headers['Server-Timing'] = f'db;dur={db_ms:.2f};desc="{stats.count} queries", total;dur={total_ms:.2f}'
+
+        if app.config.get('SLOW_REQUEST_LOG') and (
+                total_ms > app.config.get('SLOW_REQUEST_MS', 500) or
+                stats.count > app.config.get('SLOW_REQUEST_QUERIES', 100)):
+            _log_slow_request(stats, total_ms, response)
+        return response
@@ -0,0 +1,399 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import nullcontext
+import numpy as np
+from metrics import BATCH_QUEUE_DEPTH, MODEL_LOAD_SECONDS
+
+# OpenCV and DeepFace (TensorFlow) are imported inside the functions that need
+# them so that importing this module, and app.py, stays fast and lean for
+# processes that never run recognition.
+
+# Weights are shared with DeepFace, which downloads the SFace and YuNet ONNX
+# files into this folder the first time those models are used.
+DEFAULT_WEIGHTS_DIR = os.path.join(os.getenv('DEEPFACE_HOME', os.path.expanduser('~')), '.deepface', 'weights')
+SFACE_WEIGHTS = 'face_recognition_sface_2021dec.onnx'
+YUNET_WEIGHTS = 'face_detection_yunet_2023mar.onnx'
+
+class Face:
+    """
+    A detected face: the aligned BGR crop fed to the recognizer plus where it
+    was found in the frame.
+    """
+
+    def __init__(self, crop, box, confidence):
+        self.crop = crop
+        self.box = box # (x, y, w, h) in frame pixels
+        self.confidence = confidence
+
+# -----------------------------
+# Backends
+# -----------------------------
+
+class _NoTimer:
+    def stage(self, name):
+        return nullcontext()
+
+NO_TIMER = _NoTimer()
+
+def largest_face(faces):
+    """
+    Returns the most prominent face, the one attendance is marked for.
+    """
+    return max(faces, key=lambda f: f.box[2] * f.box[3])
+
+class RecognitionBackend:
+    """
+    Interface every inference backend implements. locate() finds faces in a
+    frame, align() crops and aligns them for the recognizer, embed() turns
+    aligned crops into embeddings, and represent() runs all three on a frame
+    and returns the embedding of its most prominent face. Pass a timer with a
+    stage(name) context manager to represent() to time each step.
+    """
+    name = None
+    model_name = None # Embeddings are only comparable between backends with the same model
+
+    def locate(self, img):
+        raise NotImplementedError
+
+    def align(self, img, detections):
+        raise NotImplementedError
+
+    def detect(self, img):
+        return self.align(img, self.locate(img))
+
+    def embed(self, faces):
+        raise NotImplementedError
+
+    def represent(self, img, timer=NO_TIMER):
+        with timer.stage('detection'):
+            detections = self.locate(img)
+        with timer.stage('alignment'):
+            faces = self.align(img, detections)
+        if not faces:
+            return None
+        with timer.stage('embedding'):
+            return self.embed([largest_face(faces)])[0]
+
+    def represent_faces(self, img, timer=NO_TIMER):
+        """
+        Embeds every face found in the frame. Returns a list of (box,
+        embedding) pairs; used to reject enrolment photos with several faces.
+        """
+        with timer.stage('detection'):
+            detections = self.locate(img)
+        with timer.stage('alignment'):
+            faces = self.align(img, detections)
+        if not faces:
+            return []
+        with timer.stage('embedding'):
+            return list(zip([face.box for face in faces], self.embed(faces)))
+
+    def represent_crop(self, crop, timer=NO_TIMER):
+        """
+        Embeds an image that is already a cropped face, skipping detection.
+        """
+        height, width = crop.shape[:2]
+        with timer.stage('embedding'):
+            return self.embed([Face(crop, (0, 0, width, height), 1.0)])[0]
+
+class DeepFaceBackend(RecognitionBackend):
+    """
+    Runs the models through DeepFace. This is the reference implementation
+    the stored embeddings were enrolled with. DeepFace aligns while it
+    detects, so locate() does both and align() only converts the crops.
+    """
+    name = 'deepface'
+
+    def __init__(self, model_name='SFace', detector_backend='ssd'):
+        from deepface import DeepFace
+        self.deepface = DeepFace
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        # Load the weights now rather than on the first represent() call
+        DeepFace.build_model(model_name)
+
+    def locate(self, img):
+        return self.deepface.extract_faces(
+            img_path=img,
+            detector_backend=self.detector_backend,
+            enforce_detection=False,
+            align=True
+        )
+
+    def align(self, img, detections):
+        faces = []
+        for obj in detections:
+            area = obj["facial_area"]
+            if not area["w"] > 0:
+                continue
+            # extract_faces returns RGB in [0, 1]; the recognizer expects BGR
+            crop = (obj["face"][:, :, ::-1] * 255).astype(np.uint8)
+            faces.append(Face(crop, (area["x"], area["y"], area["w"], area["h"]), obj.get("confidence", 0)))
+        return faces
+
+    def embed(self, faces):
+        embeddings = []
+        for face in faces:
+            embedding_objs = self.deepface.represent(
+                img_path=face.crop,
+                model_name=self.model_name,
+                detector_backend="skip",
+                enforce_detection=False
+            )
+            embeddings.append(np.array(embedding_objs[0]["embedding"], dtype=np.float32))
+        return embeddings
+
+    def represent(self, img, timer=NO_TIMER):
+        # A single represent() call avoids DeepFace validating the image twice,
+        # so detection, alignment and embedding are timed as one stage
+        with timer.stage('detect_and_embed'):
+            return self._represent(img)
+
+    def represent_faces(self, img, timer=NO_TIMER):
+        with timer.stage('detect_and_embed'):
+            embedding_objs = self.deepface.represent(
+                img_path=img,
+                model_name=self.model_name,
+                detector_backend=self.detector_backend,
+                enforce_detection=False
+            )
+        faces = []
+        for obj in embedding_objs or []:
+            # With no face found DeepFace returns the whole image as the
+            # facial area, with a confidence of 0
+            if obj.get("face_confidence", 0) > 0:
+                area = obj["facial_area"]
+                faces.append(((area["x"], area["y"], area["w"], area["h"]),
+                              np.array(obj["embedding"], dtype=np.float32)))
+        return faces
+
+    def _represent(self, img):
+        embedding_objs = self.deepface.represent(
+            img_path=img,
+            model_name=self.model_name,
+            detector_backend=self.detector_backend,
+            enforce_detection=False # Allow it to fail gracefully if no face
+        )
+        # No face found: DeepFace returns the whole image with a confidence of 0
+        if not embedding_objs or not embedding_objs[0].get("face_confidence", 0) > 0:
+            return None
+        return np.array(embedding_objs[0]["embedding"], dtype=np.float32)
+
+class OpenCVBackend(RecognitionBackend):
+    """
+    Runs OpenCV's YuNet DNN face detector and the SFace recognizer directly
+    on the CPU, skipping DeepFace's per-call validation and image copies.
+    SFace uses the same ONNX weights as DeepFace's SFace model, so its
+    embeddings are comparable with the ones already enrolled.
+    """
+    name = 'opencv'
+    model_name = 'SFace'
+
+    def __init__(self, weights_dir=DEFAULT_WEIGHTS_DIR, score_threshold=0.8):
+        import cv2
+        detector_path = os.path.join(weights_dir, YUNET_WEIGHTS)
+        recognizer_path = os.path.join(weights_dir, SFACE_WEIGHTS)
+        for path in (detector_path, recognizer_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Model weights not found: {path}")
+
+        self.detector = cv2.FaceDetectorYN.create(detector_path, "", (320, 320), score_threshold)
+        self.recognizer = cv2.FaceRecognizerSF.create(recognizer_path, "")
+        # The same SFace weights loaded as a plain DNN network, used to embed
+        # several faces in one forward pass
+        self.batch_net = cv2.dnn.readNet(recognizer_path)
+        # OpenCV DNN networks must not run two forward passes at once
+        self.detect_lock = threading.Lock()
+        self.embed_lock = threading.Lock()
+
+    def locate(self, img):
+        height, width = img.shape[:2]
+        with self.detect_lock:
+            self.detector.setInputSize((width, height))
+            _, detections = self.detector.detect(img)
+        return [] if detections is None else list(detections)
+
+    def align(self, img, detections):
+        faces = []
+        for row in detections:
+            # Warps the face onto SFace's canonical five-landmark template
+            crop = self.recognizer.alignCrop(img, row)
+            x, y, w, h = (int(v) for v in row[:4])
+            faces.append(Face(crop, (x, y, w, h), float(row[-1])))
+        return faces
+
+    def embed(self, faces):
+        import cv2
+
+        if len(faces) > 1 and self.batch_net is not None:
+            try:
+                # Same preprocessing as FaceRecognizerSF.feature(), for N crops at once
+                blob = cv2.dnn.blobFromImages([face.crop for face in faces], 1.0, (112, 112), (0, 0, 0), True, False)
+                with self.embed_lock:
+                    self.batch_net.setInput(blob)
+                    output = self.batch_net.forward()
+                return [row.astype(np.float32) for row in output.reshape(len(faces), -1)]
+            except cv2.error as e:
+                print(f"[WARN] Batched SFace inference unavailable, embedding faces one at a time: {e}")
+                self.batch_net = None
+
+        with self.embed_lock:
+            return [self.recognizer.feature(face.crop).flatten().astype(np.float32) for face in faces]
+
+class BatchingBackend(RecognitionBackend):
+    """
+    Wraps a backend so that faces submitted by concurrent callers (several
+    capture stations, or several faces in one frame) are embedded together.
+    A worker thread waits at most max_wait_ms after the first face arrives,
+    runs one embed() call for up to max_batch_size faces, and hands each
+    caller its own result.
+    """
+
+    def __init__(self, backend, max_batch_size=16, max_wait_ms=10):
+        self.backend = backend
+        self.name = backend.name
+        self.model_name = backend.model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        BATCH_QUEUE_DEPTH.labels().set_function(self.queue.qsize)
+        self.worker = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self.worker.start()
+
+    def locate(self, img):
+        return self.backend.locate(img)
+
+    def align(self, img, detections):
+        return self.backend.align(img, detections)
+
+    def embed(self, faces):
+        futures = []
+        for face in faces:
+            future = Future()
+            self.queue.put((face, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                embeddings = self.backend.embed([face for face, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+def face_crop_problem(crop, box=None, min_size=64, min_sharpness=30.0, brightness=(40, 220)):
+    """
+    Checks a face crop supplied by the capture page before it is embedded
+    without detection. Returns the reason it should not be trusted
+    ('undecodable', 'too_small', 'too_dark', 'too_bright', 'blurry'), or
+    None if it is good enough. box is the declared (x, y, w, h) of the crop
+    in the original frame; the crop itself may have been downscaled.
+    """
+    import cv2
+
+    if crop is None:
+        return 'undecodable'
+    height, width = crop.shape[:2]
+    face_width, face_height = (box[2], box[3]) if box else (width, height)
+    if min(height, width) < 32 or min(face_width, face_height) < min_size:
+        return 'too_small'
+
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    mean = float(gray.mean())
+    if mean < brightness[0]:
+        return 'too_dark'
+    if mean > brightness[1]:
+        return 'too_bright'
+    # Variance of the Laplacian: low when the crop has no sharp edges
+    if cv2.Laplacian(gray, cv2.CV_64F).var() < min_sharpness:
+        return 'blurry'
+    return None
+
+def limit_width(img, max_width):
+    """
+    Downscales a frame to at most max_width pixels wide, keeping its aspect
+    ratio. A max_width of 0 (or None) leaves the frame unchanged.
+    """
+    import cv2
+    height, width = img.shape[:2]
+    if not max_width or width <= max_width:
+        return img
+    return cv2.resize(img, (max_width, round(height * max_width / width)), interpolation=cv2.INTER_AREA)
+
+def decode_image(image_bytes):
+    """
+    Decodes encoded image bytes (JPEG, PNG, ...) into a BGR frame, or None.
+    """
+    import cv2
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+BACKENDS = {
+    DeepFaceBackend.name: DeepFaceBackend,
+    OpenCVBackend.name: OpenCVBackend,
+}
+
+def create_backend(name, **options):
+    """
+    Instantiates the named backend ('deepface' or 'opencv').
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown recognition backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[name](**options)
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name, **options):
+    """
+    Returns a shared instance of the named backend, loading it (and the ML
+    stack behind it) on first use.
+    """
+    key = (name, tuple(sorted(options.items())))
+    with _backends_lock:
+        if key not in _backends:
+            start = time.perf_counter()
+            _backends[key] = create_backend(name, **options)
+            MODEL_LOAD_SECONDS.labels(backend=name).set(time.perf_counter() - start)
+        return _backends[key]
+
+def get_batching_backend(name, max_batch_size=16, max_wait_ms=10, **options):
+    """
+    Returns a shared micro-batching wrapper around the named backend.
+    """
+    key = ('batching', name, max_batch_size, max_wait_ms, tuple(sorted(options.items())))
+    backend = get_backend(name, **options)
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = BatchingBackend(backend, max_batch_size, max_wait_ms)
+        return _backends[key]
+
+def preload_backend(name, **options):
+    """
+    Loads the named backend on a background thread so the first frame does
+    not pay the model load time.
+    """
+    thread = threading.Thread(target=get_backend, args=(name,), kwargs=options, daemon=True)
+    thread.start()
+    return thread
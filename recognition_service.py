@@ -0,0 +1,396 @@
+"""
+Standalone recognition daemon. Owns the recognition model and the module
+galleries so that the Flask workers and camera.py do not each load their own
+copy of the ML stack; they call it through RecognitionClient instead.
+
+    python recognition_service.py --port 5100 --backend deepface
+
+Endpoints (all local HTTP, images sent as raw bytes):
+    GET  /health                                  -> {"status": "ok", ...}
+    GET  /metrics                                 -> Prometheus text format
+    POST /embed                                   -> {"embedding": [...] | null}
+    POST /match?module_code=X&scoring=max         -> {"embedding", "student_number", "similarity"}
+         (add detect=0 to either when the image is already a cropped face, and
+          backend/model_name/detector_backend/input_width to use a recognition profile)
+    POST /invalidate?module_code=X|student_number=Y
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from metrics import (StageTimer, render as render_metrics, RECOGNITION_STAGE_SECONDS, MATCH_SIMILARITY,
+                     GALLERY_STUDENTS, GALLERY_TEMPLATES)
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'database.db')
+PROFILE_PARAMS = ['backend', 'model_name', 'detector_backend', 'input_width']
+
+def _embed_params(detect, profile):
+    params = {key: str(profile[key]) for key in PROFILE_PARAMS if key in profile} if profile else {}
+    if not detect:
+        params['detect'] = '0'
+    return params
+
+# -----------------------------
+# Client
+# -----------------------------
+
+class RecognitionServiceError(Exception):
+    """
+    Raised when the recognition service is unreachable or returns an error.
+    """
+
+class MatchResult:
+    """
+    Outcome of a /match call. embedding is None when no face was found;
+    student_number is None when the face matched nobody in the module.
+    """
+
+    def __init__(self, embedding, student_number, similarity):
+        self.embedding = embedding
+        self.student_number = student_number
+        self.similarity = similarity
+
+class RecognitionClient:
+    """
+    Calls the recognition service over local HTTP. Each thread keeps one
+    persistent keep-alive connection, so requests skip the TCP handshake.
+    """
+
+    def __init__(self, url, timeout=5.0):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _discard_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def _request(self, method, path, params=None, body=None):
+        if params:
+            path = f"{path}?{urllib.parse.urlencode(params)}"
+        headers = {'Content-Type': 'application/octet-stream'} if body is not None else {}
+
+        # A kept-alive connection may have been closed by the server since the
+        # last call; retry once on a fresh connection, but never on a timeout.
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                payload = response.read()
+            except socket.timeout as e:
+                self._discard_connection()
+                raise RecognitionServiceError(f"Recognition service timed out after {self.timeout}s") from e
+            except (http.client.HTTPException, ConnectionError) as e:
+                self._discard_connection()
+                if attempt == 1:
+                    raise RecognitionServiceError(f"Recognition service unavailable: {e}") from e
+                continue
+            except OSError as e:
+                self._discard_connection()
+                raise RecognitionServiceError(f"Recognition service unavailable: {e}") from e
+
+            if response.status >= 400:
+                raise RecognitionServiceError(f"Recognition service error {response.status}: {payload[:200]!r}")
+            return json.loads(payload)
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def embed(self, image_bytes, detect=True, profile=None):
+        """
+        Returns the embedding of the most prominent face, or None. With
+        detect=False the image is embedded as an already cropped face.
+        profile is a dict of recognition profile settings (PROFILE_PARAMS);
+        without one the service's own backend runs.
+        """
+        result = self._request('POST', '/embed', params=_embed_params(detect, profile), body=image_bytes)
+        if result['embedding'] is None:
+            return None
+        return np.array(result['embedding'], dtype=np.float32)
+
+    def match(self, image_bytes, module_code, scoring='max', detect=True, profile=None):
+        """
+        Embeds the frame and matches it against the module's gallery.
+        """
+        params = dict(_embed_params(detect, profile), module_code=module_code, scoring=scoring)
+        result = self._request('POST', '/match', params=params, body=image_bytes)
+        embedding = None if result['embedding'] is None else np.array(result['embedding'], dtype=np.float32)
+        return MatchResult(embedding, result['student_number'], result['similarity'])
+
+    def invalidate(self, module_code=None, student_number=None):
+        """
+        Drops cached galleries after enrolments or registrations change.
+        """
+        params = {}
+        if module_code:
+            params['module_code'] = module_code
+        if student_number:
+            params['student_number'] = student_number
+        return self._request('POST', '/invalidate', params=params)
+
+# -----------------------------
+# Gallery Store
+# -----------------------------
+
+class GalleryStore:
+    """
+    Module galleries loaded from the database, reloaded after ttl seconds or
+    when invalidated. Each entry keeps the raw vectors per student and model
+    plus the galleries built from them, one per model and embedding size.
+    """
+
+    def __init__(self, db_path, ttl=60):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.entries = {} # module_code -> (loaded_at, {student_number: {model_name: [vectors]}}, {(model_name, dim): Gallery})
+        self.lock = threading.Lock()
+
+    def load(self, module_code):
+        """
+        Reads every registered student of the module with their templates.
+        Each student's legacy Student.embedding is kept under None; students
+        without a face enrolled map to {}, so invalidating by their student
+        number reaches the module once they enrol.
+        """
+        from database import connect
+        from gallery import unpack_template
+
+        conn = connect(self.db_path, read_only=True)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT s.student_number, s.embedding, t.embedding, t.model_name
+                FROM students s
+                LEFT JOIN face_template t ON t.student_number = s.student_number
+                WHERE s.student_number IN (SELECT student_number FROM class_register WHERE subject_code = ?)
+                ORDER BY s.student_number, t.id
+            """, (module_code,))
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        vectors = {}
+        for student_number, legacy_blob, template_blob, model_name in rows:
+            models = vectors.get(student_number)
+            if models is None:
+                models = vectors[student_number] = {}
+                if legacy_blob:
+                    models[None] = [np.frombuffer(legacy_blob, dtype=np.float32)]
+            if template_blob is not None:
+                models.setdefault(model_name, []).append(unpack_template(template_blob))
+        return vectors
+
+    def get(self, module_code, dim, model_name=None):
+        """
+        Returns the module's gallery for embeddings of the given model and size.
+        """
+        from gallery import gallery_from_vectors, DEFAULT_MODEL
+
+        model_name = model_name or DEFAULT_MODEL
+
+        with self.lock:
+            entry = self.entries.get(module_code)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl:
+            entry = (time.monotonic(), self.load(module_code), {})
+            with self.lock:
+                self.entries[module_code] = entry
+
+        galleries = entry[2]
+        if (model_name, dim) not in galleries:
+            galleries[(model_name, dim)] = gallery_from_vectors(entry[1], dim, model_name)
+        return galleries[(model_name, dim)]
+
+    def invalidate(self, module_code=None, student_number=None):
+        with self.lock:
+            if module_code:
+                self.entries.pop(module_code, None)
+            elif student_number:
+                for code in [c for c, entry in self.entries.items() if student_number in entry[1]]:
+                    del self.entries[code]
+            else:
+                self.entries.clear()
+
+    def sizes(self):
+        with self.lock:
+            return {code: len(entry[1]) for code, entry in self.entries.items()}
+
+# -----------------------------
+# Server
+# -----------------------------
+
+class RecognitionHandler(BaseHTTPRequestHandler):
+    """
+    Serves embed/match requests. HTTP/1.1 keeps client connections open.
+    """
+    protocol_version = 'HTTP/1.1'
+    service = None # RecognitionService, set by serve()
+
+    def log_message(self, format, *args):
+        pass # Per-request logging is too noisy at capture frame rates
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path == '/health':
+            return self.send_json(self.service.health())
+        if urllib.parse.urlsplit(self.path).path == '/metrics':
+            body = render_metrics().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            return self.wfile.write(body)
+        self.send_json({'error': 'Not found'}, 404)
+
+    def do_POST(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        body = self.read_body()
+        try:
+            detect = params.get('detect') != '0'
+            profile = {key: params[key] for key in PROFILE_PARAMS if key in params} or None
+            if profile and 'input_width' in profile:
+                profile['input_width'] = int(profile['input_width'])
+            if parsed.path == '/embed':
+                embedding = self.service.embed(body, detect=detect, profile=profile)
+                return self.send_json({'embedding': None if embedding is None else embedding.tolist()})
+            if parsed.path == '/match':
+                if not params.get('module_code'):
+                    return self.send_json({'error': 'module_code is required'}, 400)
+                return self.send_json(self.service.match(body, params['module_code'], params.get('scoring', 'max'),
+                                                         detect=detect, profile=profile))
+            if parsed.path == '/invalidate':
+                self.service.galleries.invalidate(params.get('module_code'), params.get('student_number'))
+                return self.send_json({'status': 'ok'})
+        except Exception as e:
+            print(f"[ERROR] Recognition request {parsed.path} failed: {e}")
+            return self.send_json({'error': str(e)}, 500)
+        self.send_json({'error': 'Not found'}, 404)
+
+class RecognitionService:
+    """
+    The model and galleries shared by every connected client.
+    """
+
+    def __init__(self, backend_name, db_path=DB_PATH, gallery_ttl=60, backend_options=None,
+                 batch_size=0, batch_wait_ms=10):
+        start = time.monotonic()
+        self.backend_name = backend_name
+        self.batch_size = batch_size
+        self.batch_wait_ms = batch_wait_ms
+        self.backend = self.load_backend(backend_name, backend_options or {})
+        self.load_seconds = time.monotonic() - start
+        self.galleries = GalleryStore(db_path, ttl=gallery_ttl)
+        self.timer = StageTimer(RECOGNITION_STAGE_SECONDS)
+
+    def load_backend(self, name, options):
+        from recognition import get_backend, get_batching_backend
+
+        if self.batch_size > 1:
+            # Frames from every connected station share the same micro-batches
+            return get_batching_backend(name, self.batch_size, self.batch_wait_ms, **options)
+        return get_backend(name, **options)
+
+    def backend_for(self, profile):
+        """
+        The backend a recognition profile asks for; the service's own when
+        no profile is given. Each distinct backend is loaded once.
+        """
+        from profiles import settings_options
+
+        if not profile or 'backend' not in profile:
+            return self.backend
+        return self.load_backend(profile['backend'], settings_options(profile))
+
+    def embed(self, image_bytes, detect=True, profile=None):
+        from recognition import decode_image, limit_width
+
+        backend = self.backend_for(profile)
+        with self.timer.stage('imdecode'):
+            img = decode_image(image_bytes)
+        if img is None:
+            raise ValueError("Could not decode image bytes.")
+        if not detect:
+            return backend.represent_crop(img, timer=self.timer)
+        if profile and profile.get('input_width'):
+            img = limit_width(img, profile['input_width'])
+        return backend.represent(img, timer=self.timer)
+
+    def match(self, image_bytes, module_code, scoring='max', detect=True, profile=None):
+        embedding = self.embed(image_bytes, detect=detect, profile=profile)
+        if embedding is None:
+            return {'embedding': None, 'student_number': None, 'similarity': 0.0}
+        with self.timer.stage('gallery_load'):
+            gallery = self.galleries.get(module_code, embedding.shape[0], self.backend_for(profile).model_name)
+        with self.timer.stage('gallery_match'):
+            student_number, similarity = gallery.match(embedding, scoring=scoring)
+        MATCH_SIMILARITY.observe(similarity)
+        GALLERY_STUDENTS.labels(module_code=module_code).set(len(gallery.centroids))
+        GALLERY_TEMPLATES.labels(module_code=module_code).set(len(gallery.owners))
+        return {'embedding': embedding.tolist(), 'student_number': student_number, 'similarity': similarity}
+
+    def health(self):
+        return {
+            'status': 'ok',
+            'backend': self.backend_name,
+            'model_load_seconds': round(self.load_seconds, 3),
+            'galleries': self.galleries.sizes()
+        }
+
+def serve(host='127.0.0.1', port=5100, backend='deepface', db_path=DB_PATH, gallery_ttl=60,
+          batch_size=0, batch_wait_ms=10):
+    """
+    Loads the model and serves requests until interrupted.
+    """
+    print(f"[INFO] Loading '{backend}' recognition backend...")
+    RecognitionHandler.service = RecognitionService(backend, db_path=db_path, gallery_ttl=gallery_ttl,
+                                                    batch_size=batch_size, batch_wait_ms=batch_wait_ms)
+    server = ThreadingHTTPServer((host, port), RecognitionHandler)
+    server.daemon_threads = True
+    print(f"[INFO] Recognition service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("[INFO] Shutting down.")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Standalone face recognition service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--backend', default=os.environ.get('RECOGNITION_BACKEND', 'deepface'))
+    parser.add_argument('--db', default=DB_PATH, help='Path to database.db')
+    parser.add_argument('--gallery-ttl', type=int, default=60, help='Seconds before a module gallery is reloaded')
+    parser.add_argument('--batch-size', type=int, default=0, help='Micro-batch size for embeddings (0 disables)')
+    parser.add_argument('--batch-wait-ms', type=int, default=10, help='Longest a face waits for its batch to fill')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.backend, args.db, args.gallery_ttl, args.batch_size, args.batch_wait_ms)
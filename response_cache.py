@@ -0,0 +1,166 @@
+"""
+Server-side cache for read endpoints over reference data (students,
+modules, venues, periods), which changes a few times a semester but is
+fetched in full on every page load.
+
+Each cached response records the version of every table it was built
+from. Versions are bumped after any commit that wrote to the table, found
+from the ORM flush and from bulk INSERT/UPDATE/DELETE statements run
+through the session. With a version_dir, a table's version is the size of
+a file in it that every bump appends a byte to, so all server processes
+sharing the directory see each other's writes at once; without one,
+versions only cover this process. Writers that do not go through a
+ResponseCache (camera.py, the command line tools) are picked up once an
+entry is max_age seconds old. Responses carry an ETag and Cache-Control:
+no-cache, so browsers revalidate and get a 304 while the data is unchanged.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from itertools import chain
+from flask import request, make_response, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from metrics import Counter
+
+RESPONSE_CACHE_LOOKUPS = Counter(
+    'response_cache_lookups_total', 'Cached read endpoint requests by result.', ['result'])
+for result in ('hit', 'miss', 'not_modified'):
+    RESPONSE_CACHE_LOOKUPS.labels(result=result)
+
+_caches = []
+
+def _changed_tables(session):
+    return session.info.setdefault('response_cache_tables', set())
+
+def _after_flush(session, flush_context):
+    _changed_tables(session).update(obj.__table__.name for obj in chain(session.new, session.dirty, session.deleted))
+
+def _do_orm_execute(state):
+    # Bulk statements such as db.session.execute(db.insert(Student), rows) skip the flush
+    if state.is_insert or state.is_update or state.is_delete:
+        _changed_tables(state.session).add(state.statement.table.name)
+
+def _after_commit(session):
+    tables = session.info.pop('response_cache_tables', None)
+    if tables:
+        for cache in _caches:
+            cache.bump(*tables)
+
+def _after_rollback(session):
+    session.info.pop('response_cache_tables', None)
+
+class ResponseCache:
+    """
+    Caches successful GET responses per path and query string, keyed to
+    the versions of the tables they were built from. At most max_entries
+    responses are kept, least recently used first out.
+    """
+
+    def __init__(self, max_age=60.0, max_entries=256, enabled=True, version_dir=None):
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.version_dir = version_dir
+        self.tables = set() # Tables read by cached views; only their versions are kept
+        self.versions = {} # table name -> version, without a version_dir
+        self.entries = OrderedDict() # (path, query) -> (versions, stored_at, body, mimetype, etag)
+        self.lock = threading.Lock()
+        _caches.append(self)
+        if not event.contains(Session, 'after_flush', _after_flush):
+            event.listen(Session, 'after_flush', _after_flush)
+            event.listen(Session, 'do_orm_execute', _do_orm_execute)
+            event.listen(Session, 'after_commit', _after_commit)
+            event.listen(Session, 'after_rollback', _after_rollback)
+
+    def bump(self, *tables):
+        """
+        Marks the tables as changed, invalidating every response built from them.
+        """
+        tables = [table for table in tables if table in self.tables]
+        if self.version_dir:
+            os.makedirs(self.version_dir, exist_ok=True)
+            for table in tables:
+                # O_APPEND writes from several processes never overwrite each other
+                fd = os.open(os.path.join(self.version_dir, table), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+                try:
+                    os.write(fd, b'.')
+                finally:
+                    os.close(fd)
+            return
+        with self.lock:
+            for table in tables:
+                self.versions[table] = self.versions.get(table, 0) + 1
+
+    def table_versions(self, tables):
+        if not self.version_dir:
+            with self.lock:
+                return tuple(self.versions.get(table, 0) for table in tables)
+        versions = []
+        for table in tables:
+            try:
+                versions.append(os.stat(os.path.join(self.version_dir, table)).st_size)
+            except FileNotFoundError:
+                versions.append(0)
+        return tuple(versions)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _lookup(self, key, versions):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != versions or time.monotonic() - entry[1] > self.max_age:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def cached(self, *tables):
+        """
+        Decorator for a read endpoint built from the given tables.
+        """
+        self.tables.update(tables)
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                key = (request.path, tuple(sorted(request.args.items(multi=True))))
+                versions = self.table_versions(tables)
+                entry = self._lookup(key, versions)
+                if entry is not None:
+                    _, _, body, mimetype, etag = entry
+                    response = Response(body, mimetype=mimetype)
+                    response.set_etag(etag)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    response.add_etag()
+                    etag, _ = response.get_etag()
+                    self._store(key, (versions, time.monotonic(), response.get_data(), response.mimetype, etag))
+
+                response.headers['Cache-Control'] = 'no-cache' # Cache, but revalidate with If-None-Match
+                response.make_conditional(request)
+                if response.status_code == 304:
+                    RESPONSE_CACHE_LOOKUPS.labels(result='not_modified').inc()
+                else:
+                    RESPONSE_CACHE_LOOKUPS.labels(result='hit' if entry is not None else 'miss').inc()
+                return response
+            return wrapper
+        return decorator
@@ -0,0 +1,195 @@
+"""
+Reporting snapshot: a read-only copy of database.db for the statistics
+endpoints, so their long scans never share a file with live capture writes.
+
+A background thread copies the database every interval seconds with
+SQLite's online backup API (one read transaction, which in WAL mode does
+not block writers) into a temporary file that then replaces the snapshot.
+Queries already running finish on the copy they started on.
+
+Views wrapped in reads() use the snapshot while it is no older than
+max_age, and the live read-only connections otherwise (before the first
+copy, or if refreshing falls behind). Responses say which one they were
+served from and how old the data is (freshness() and the X-Data-* headers).
+"""
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from flask import make_response
+from database import SNAPSHOT_BIND, connect, read_only, reading_from
+from metrics import Counter, Gauge, Histogram
+
+REPORTING_SNAPSHOT_AGE = Gauge(
+    'reporting_snapshot_age_seconds', 'Age of the reporting snapshot; -1 before the first copy.')
+REPORTING_SNAPSHOT_REFRESH_SECONDS = Histogram(
+    'reporting_snapshot_refresh_seconds', 'Time taken to copy the database into the reporting snapshot.')
+REPORTING_READS = Counter(
+    'reporting_reads_total', 'Report requests by where their data was read from.', ['source'])
+for source in ('snapshot', 'live'):
+    REPORTING_READS.labels(source=source)
+
+_source = contextvars.ContextVar('reporting_source', default=None)
+
+def take_snapshot(source_path, target_path):
+    """
+    Copies source_path into target_path with the backup API, replacing it
+    in one step. The copy's modification time is set to when its data was
+    read, which is returned. Each process copies into its own temporary
+    file, so server processes refreshing at once do not collide.
+    """
+    temp_path = f"{target_path}.{os.getpid()}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    source = connect(source_path, read_only=True)
+    target = sqlite3.connect(temp_path)
+    try:
+        taken_at = time.time()
+        source.backup(target)
+        # The copy is only ever read: no -wal/-shm files next to it
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+        source.close()
+    os.utime(temp_path, (taken_at, taken_at))
+    os.replace(temp_path, target_path)
+    return taken_at
+
+class ReportingSnapshot:
+    """
+    Keeps the snapshot at path refreshed from source_path every interval
+    seconds in a daemon thread, and routes reads() views to it. A snapshot
+    left from an earlier run is not used until refreshed, as it may predate
+    schema changes.
+    """
+
+    def __init__(self, app, db, source_path, path, interval=300, max_age=900, enabled=True):
+        self.app = app
+        self.db = db
+        self.source_path = source_path
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self.enabled = enabled
+        self.taken_at = None # time.time() the current snapshot's data was read
+        self.last_duration = None
+        self.last_error = None
+        self.on_refresh = [] # Called with no arguments, in an app context, after each refresh
+        self.lock = threading.Lock() # One refresh at a time
+        self.stopped = threading.Event()
+        self.thread = None
+        REPORTING_SNAPSHOT_AGE.labels().set_function(lambda: -1 if self.taken_at is None else self.age())
+
+    def age(self):
+        return None if self.taken_at is None else time.time() - self.taken_at
+
+    def is_fresh(self):
+        return self.enabled and self.taken_at is not None and self.age() <= self.max_age
+
+    def refresh(self):
+        """
+        Copies the database into the snapshot and drops pooled connections
+        to the old copy. Must run inside an app context.
+        """
+        with self.lock:
+            started = time.perf_counter()
+            taken_at = take_snapshot(self.source_path, self.path)
+            self.last_duration = time.perf_counter() - started
+            REPORTING_SNAPSHOT_REFRESH_SECONDS.observe(self.last_duration)
+            engine = self.db.engines.get(SNAPSHOT_BIND)
+            if engine is not None:
+                engine.dispose()
+            self.taken_at = taken_at
+        return taken_at
+
+    @contextmanager
+    def reading(self):
+        """
+        Sends the session's reads to the snapshot if it is fresh enough,
+        otherwise to the live read-only connections.
+        """
+        fresh = self.is_fresh()
+        source = 'snapshot' if fresh else 'live'
+        REPORTING_READS.labels(source=source).inc()
+        token = _source.set((source, self.taken_at if fresh else time.time()))
+        try:
+            with reading_from(SNAPSHOT_BIND) if fresh else read_only():
+                yield
+        finally:
+            _source.reset(token)
+
+    def reads(self, view):
+        """
+        View decorator: runs the view inside reading() and adds the
+        X-Data-Source, X-Data-As-Of and X-Data-Age headers.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with self.reading():
+                response = make_response(view(*args, **kwargs))
+                freshness = self.freshness()
+            response.headers['X-Data-Source'] = freshness['source']
+            response.headers['X-Data-As-Of'] = freshness['as_of']
+            response.headers['X-Data-Age'] = str(freshness['age_seconds'])
+            return response
+        return wrapper
+
+    def freshness(self):
+        """
+        Where the current reads() view reads from and how old that data is.
+        """
+        source, as_of = _source.get() or ('live', time.time())
+        return {
+            'source': source,
+            'as_of': datetime.fromtimestamp(as_of).isoformat(timespec='seconds'),
+            'age_seconds': round(max(time.time() - as_of, 0.0), 1),
+        }
+
+    def version(self):
+        """
+        taken_at of the snapshot the current reads() view reads from, or
+        None if it reads live data.
+        """
+        source, as_of = _source.get() or ('live', None)
+        return as_of if source == 'snapshot' else None
+
+    def status(self):
+        age = self.age()
+        return {
+            'enabled': self.enabled,
+            'path': self.path,
+            'interval': self.interval,
+            'max_age': self.max_age,
+            'running': self.thread is not None and self.thread.is_alive(),
+            'fresh': self.is_fresh(),
+            'taken_at': datetime.fromtimestamp(self.taken_at).isoformat(timespec='seconds') if self.taken_at else None,
+            'age_seconds': round(age, 1) if age is not None else None,
+            'last_refresh_seconds': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'last_error': self.last_error,
+        }
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='reporting-snapshot', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                with self.app.app_context():
+                    self.refresh()
+                    for callback in self.on_refresh:
+                        callback()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[ERROR] Reporting snapshot refresh failed: {e}")
+            self.stopped.wait(self.interval)
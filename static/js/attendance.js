@@ -8,24 +8,28 @@ document.addEventListener('DOMContentLoaded', function() {
     const presentImg = 'static/images/Attended.png';
     const notPresentImg = 'static/images/NotAttend.png';
 
+    // Only the fields this page renders; the server sends them all in one response
+    const BOOTSTRAP_URL = '/api/attendance_view/bootstrap?' + new URLSearchParams({
+        students: 'student_number,name,surname,modules',
+        modules: 'code,name',
+        periods: 'id,period_start_time,period_end_time,day_of_week,module_codes',
+        attendance: 'user_id,class_period_id,date,status'
+    });
+
     // Fetch data from APIs
     async function fetchAllData() {
         try {
-            const [studentsResponse, modulesResponse, periodsResponse, attendanceResponse] = await Promise.all([
-                fetch('/api/students'),
-                fetch('/api/modules'),
-                fetch('/api/periods'),
-                fetch('/api/attendance')
-            ]);
-
-            if (!studentsResponse.ok || !modulesResponse.ok || !periodsResponse.ok || !attendanceResponse.ok) {
+            const response = await fetch(BOOTSTRAP_URL);
+
+            if (!response.ok) {
                 throw new Error('Failed to fetch data');
             }
 
-            allStudents = await studentsResponse.json();
-            allModules = await modulesResponse.json();
-            allPeriods = await periodsResponse.json();
-            allAttendance = await attendanceResponse.json();
+            const data = await response.json();
+            allStudents = data.students;
+            allModules = data.modules;
+            allPeriods = data.periods;
+            allAttendance = data.attendance;
 
             // Populate dropdowns
             populateModules();
@@ -133,8 +137,10 @@ document.addEventListener('DOMContentLoaded', function() {
             )
             .map(p => p.id);
 
+        // Ended periods also hold 'Absence' records; only presences count
         const periodAttendance = allAttendance.filter(record =>
-            record.date === selectedDate && relevantPeriodIds.includes(record.class_period_id)
+            record.date === selectedDate && relevantPeriodIds.includes(record.class_period_id) &&
+            record.status === 'Present'
         );
 
         const presentStudentsInPeriod = new Set(periodAttendance.map(r => r.user_id)).size;
@@ -179,7 +185,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const uniqueModuleSessions = new Set(moduleAttendanceRecords.map(r => `${r.class_period_id}-${r.date}`));
         const totalModuleSessionsCount = uniqueModuleSessions.size;
 
-        const totalActualAttendance = moduleAttendanceRecords.length;
+        const totalActualAttendance = moduleAttendanceRecords.filter(r => r.status === 'Present').length;
         const totalPossibleAttendance = totalStudentsCount * totalModuleSessionsCount;
 
         const moduleRate = totalPossibleAttendance > 0 ? ((totalActualAttendance / totalPossibleAttendance) * 100).toFixed(2) : 0;
@@ -208,7 +214,7 @@ document.addEventListener('DOMContentLoaded', function() {
             .map(p => p.id);
 
         const allModuleAttendance = allAttendance.filter(r => modulePeriodIds.includes(r.class_period_id));
-        const studentModuleAttendance = allModuleAttendance.filter(r => r.user_id === studentId);
+        const studentModuleAttendance = allModuleAttendance.filter(r => r.user_id === studentId && r.status === 'Present');
         
         const totalAttendedPeriods = studentModuleAttendance.length;
 
@@ -2,6 +2,21 @@
 let recognitionInterval = null; // To hold the setInterval ID
 let isProcessing = false; // Flag to prevent multiple simultaneous API calls
 const CAPTURE_INTERVAL_MS = 3000; // Capture and send a frame every 3 seconds
+let captureIntervalMs = CAPTURE_INTERVAL_MS; // Stretched by the server (X-Capture-Interval-Ms) under load
+// Identifies this page's frames so the server can reuse results for unchanged scenes
+const CAPTURE_SESSION_ID = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+// Kept across visits so a recognition profile can be assigned to this station
+// (PUT /api/capture_stations/<id>)
+const CAPTURE_STATION_ID = localStorage.getItem('capture_station_id') || CAPTURE_SESSION_ID;
+localStorage.setItem('capture_station_id', CAPTURE_STATION_ID);
+console.info('Capture station ID:', CAPTURE_STATION_ID);
+const FACE_CROP_SIZE = 112; // Side of the face crop sent instead of the full frame
+const FACE_CROP_MARGIN = 0.1; // Context kept around the detected face, as a fraction of its size
+
+// Browsers with the Shape Detection API (e.g. Chrome) find the face themselves
+// and send only the crop; the server skips detection for crops it accepts.
+const faceDetector = ('FaceDetector' in window) ? new FaceDetector({ fastMode: true, maxDetectedFaces: 1 }) : null;
+let sendFullFrame = false; // Set when the server could not use the last crop
 
 // --- DOM Elements ---
 const videoFeed = document.getElementById('video-feed');
@@ -18,6 +33,7 @@ const modalNoBtn = document.getElementById('modal-no-btn');
 
 // Create a canvas element in memory to capture frames
 const canvas = document.createElement('canvas');
+const cropCanvas = document.createElement('canvas');
 
 // --- Utility Functions ---
 
@@ -81,6 +97,50 @@ function logAttendance(entry, type) {
 
 // --- Core Attendance Logic ---
 
+/**
+ * Returns the face crop payload for the current frame, or null when the
+ * browser cannot detect faces or found none.
+ * @returns {Promise<{face_data: string, crop_box: number[]}|null>}
+ */
+async function cropFace() {
+    if (!faceDetector || sendFullFrame) return null;
+    let faces;
+    try {
+        faces = await faceDetector.detect(canvas);
+    } catch (error) {
+        console.warn('Browser face detection failed:', error);
+        return null;
+    }
+    if (!faces.length) return null;
+
+    // Square region around the face, kept inside the frame
+    const box = faces[0].boundingBox;
+    const side = Math.min(Math.max(box.width, box.height) * (1 + 2 * FACE_CROP_MARGIN), canvas.width, canvas.height);
+    const x = Math.round(Math.min(Math.max(box.x + box.width / 2 - side / 2, 0), canvas.width - side));
+    const y = Math.round(Math.min(Math.max(box.y + box.height / 2 - side / 2, 0), canvas.height - side));
+
+    cropCanvas.width = FACE_CROP_SIZE;
+    cropCanvas.height = FACE_CROP_SIZE;
+    cropCanvas.getContext('2d').drawImage(canvas, x, y, side, side, 0, 0, FACE_CROP_SIZE, FACE_CROP_SIZE);
+    return {
+        face_data: cropCanvas.toDataURL('image/jpeg', 0.9),
+        crop_box: [x, y, Math.round(side), Math.round(side)]
+    };
+}
+
+/**
+ * Restarts the recognition loop at the interval the server asked for.
+ * @param {number} intervalMs
+ */
+function setCaptureInterval(intervalMs) {
+    if (!intervalMs || intervalMs === captureIntervalMs) return;
+    captureIntervalMs = intervalMs;
+    if (recognitionInterval) {
+        clearInterval(recognitionInterval);
+        recognitionInterval = setInterval(processFrameForAttendance, captureIntervalMs);
+    }
+}
+
 /**
  * Captures a frame from the video, sends it to the backend, and handles the response.
  */
@@ -96,21 +156,28 @@ async function processFrameForAttendance() {
     const context = canvas.getContext('2d');
     context.drawImage(videoFeed, 0, 0, canvas.width, canvas.height);
 
-    // 2. Get image data as Base64 string
-    const imageDataUrl = canvas.toDataURL('image/jpeg');
-
     try {
+        // 2. Send just the face when the browser can find it, else the whole
+        // frame, as a Base64 string
+        const faceCrop = await cropFace();
+        const payload = faceCrop ? { ...faceCrop } : { image_data: canvas.toDataURL('image/jpeg') };
+        payload.capture_session = CAPTURE_SESSION_ID;
+        payload.station_id = CAPTURE_STATION_ID;
+
         // 3. Send image data to the backend API
         const response = await fetch('/api/mark_attendance', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ image_data: imageDataUrl }),
+            body: JSON.stringify(payload),
         })
 
         const result = await response.json();
+        setCaptureInterval(Number(response.headers.get('X-Capture-Interval-Ms')));
         console.log('Server response:', result); // Log the result here
+        // A crop the server could not use is followed by one full frame
+        sendFullFrame = Boolean(faceCrop) && result.status === 'unidentifiable';
         // 4. Process the response from the backend
         switch (result.status) {
             case 'present':
@@ -124,6 +191,10 @@ async function processFrameForAttendance() {
             case 'unidentifiable':
                 updateStatus(`${result.message}`, 'unidentifiable');
                 break;
+            case 'busy':
+                // The server turned the frame away; the slower interval above spaces out retries
+                updateStatus(result.message, 'initial');
+                break;
             case 'no_active_period':
                 updateStatus(result.message, 'error');
                 logAttendance(`❌ System paused: ${result.message}`, 'error');
@@ -184,7 +255,7 @@ async function initializeCamera() {
 
             // Start the recognition loop
             if (!recognitionInterval) {
-                recognitionInterval = setInterval(processFrameForAttendance, CAPTURE_INTERVAL_MS);
+                recognitionInterval = setInterval(processFrameForAttendance, captureIntervalMs);
             }
         };
     } catch (err) {
@@ -0,0 +1,162 @@
+"""
+Bulk import of students and their module registrations, e.g. a
+registration week export of 10k+ rows.
+
+Rows carry the same fields as POST /api/students: student_number, name,
+surname and modules (a list, or codes separated by ';', ',' or spaces), plus an optional semester. The whole batch is validated with a
+handful of set-based queries, then every valid row is inserted with bulk
+INSERTs in one transaction. Invalid rows are skipped and reported.
+"""
+import csv
+import io
+import re
+from datetime import datetime
+from models import db, Student, Module, Class_Register
+
+REQUIRED_FIELDS = [('student_number', 'Student number'), ('name', 'Student name'), ('surname', 'Student surname')]
+DEFAULT_SEMESTER = '2' # As for students added one at a time
+MODULE_SEPARATORS = re.compile(r'[;,\s|]+')
+QUERY_CHUNK = 500 # Values per IN (...) query, within SQLite's variable limit
+
+def read_csv(text):
+    """
+    Parses CSV text with a header row into (row, record) pairs, where row
+    is the line number as a spreadsheet would show it.
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    records = []
+    for record in reader:
+        record = {(key or '').strip(): (value or '').strip() for key, value in record.items()}
+        record['modules'] = [code for code in MODULE_SEPARATORS.split(record.get('modules', '')) if code]
+        records.append((reader.line_num, record))
+    return records
+
+def read_json(data):
+    """
+    Numbers a JSON list of student objects (or {'students': [...]}) from 1.
+    """
+    if isinstance(data, dict):
+        data = data.get('students')
+    if not isinstance(data, list):
+        raise ValueError('Expected a list of students')
+    return list(enumerate(data, start=1))
+
+def _existing_registrations(student_numbers):
+    """
+    (student_number, module_code) pairs already registered, for the given students.
+    """
+    student_numbers = list(student_numbers)
+    pairs = set()
+    for start in range(0, len(student_numbers), QUERY_CHUNK):
+        pairs.update(tuple(pair) for pair in db.session.query(Class_Register.student_number, Class_Register.subject_code).filter(
+            Class_Register.student_number.in_(student_numbers[start:start + QUERY_CHUNK])
+        ))
+    return pairs
+
+def validate_records(records, enroll_existing=False):
+    """
+    Validates a batch of (row, record) pairs against each other and the
+    database. Returns (students, registrations, errors): the rows to insert
+    into students and class_register, and an error entry for every
+    rejected row. With enroll_existing, a row for an existing student adds
+    its missing module registrations instead of being rejected.
+    """
+    year = datetime.now().strftime('%Y')
+    registered_at = datetime.now().strftime("%d/%m/%Y, %H:%M:%S")
+
+    # 1. Per-row checks that need no database
+    errors = []
+    candidates = []
+    seen = {}
+    for row, record in records:
+        if not isinstance(record, dict):
+            errors.append({'row': row, 'student_number': None, 'errors': ['Expected an object']})
+            continue
+        student_number = str(record.get('student_number') or '').strip()
+        problems = [f"{label} is required" for field, label in REQUIRED_FIELDS
+                    if not str(record.get(field) or '').strip()]
+        modules = record.get('modules') or []
+        if isinstance(modules, str):
+            modules = [code for code in MODULE_SEPARATORS.split(modules) if code]
+        elif not isinstance(modules, list):
+            problems.append('modules must be a list of module codes')
+            modules = []
+        if student_number in seen:
+            problems.append(f"Duplicate of row {seen[student_number]}")
+        elif student_number:
+            seen[student_number] = row
+        if problems:
+            errors.append({'row': row, 'student_number': student_number or None, 'errors': problems})
+        else:
+            candidates.append((row, student_number, record, [str(code).strip() for code in modules]))
+
+    # 2. Set-based checks: one pass over the whole batch per table
+    emails = {student_number: f"{student_number}@dut4life.ac.za" for _, student_number, _, _ in candidates}
+    taken_numbers, taken_emails = Student.find_existing(emails, emails.values())
+    module_codes = list({code for _, _, _, codes in candidates for code in codes})
+    known_modules = set()
+    for start in range(0, len(module_codes), QUERY_CHUNK):
+        known_modules.update(code for (code,) in db.session.query(Module.module_code).filter(
+            Module.module_code.in_(module_codes[start:start + QUERY_CHUNK])))
+    registered = _existing_registrations(taken_numbers) if enroll_existing else set()
+
+    # 3. Rows that pass become bulk insert parameters
+    students = []
+    registrations = []
+    for row, student_number, record, codes in candidates:
+        problems = [f"Module {code} does not exist" for code in codes if code not in known_modules]
+        existing = student_number in taken_numbers
+        if existing and not enroll_existing:
+            problems.append('Student number already exists')
+        elif not existing and emails[student_number] in taken_emails:
+            problems.append('Email already exists')
+        if problems:
+            errors.append({'row': row, 'student_number': student_number, 'errors': problems})
+            continue
+
+        if not existing:
+            students.append({
+                'student_number': student_number,
+                'student_name': str(record['name']).strip(),
+                'student_surname': str(record['surname']).strip(),
+                'student_email': emails[student_number],
+                'registered_at': registered_at
+            })
+        semester = str(record.get('semester') or DEFAULT_SEMESTER).strip()
+        for code in dict.fromkeys(codes):
+            if (student_number, code) in registered:
+                continue
+            registrations.append({
+                'student_number': student_number,
+                'register_id': f"{code}-{semester}-{year}",
+                'subject_code': code,
+                'semester': semester,
+                'year': year
+            })
+    errors.sort(key=lambda error: error['row'])
+    return students, registrations, errors
+
+def import_records(records, enroll_existing=False, dry_run=False):
+    """
+    Validates and inserts a batch in one transaction. Returns (errors,
+    summary); nothing is written with dry_run.
+    """
+    students, registrations, errors = validate_records(records, enroll_existing=enroll_existing)
+    if not dry_run:
+        try:
+            if students:
+                db.session.execute(db.insert(Student), students)
+            if registrations:
+                db.session.execute(db.insert(Class_Register), registrations)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    summary = {
+        'rows': len(records),
+        'students_added': len(students),
+        'registrations_added': len(registrations),
+        'rejected': len(errors),
+        'dry_run': dry_run
+    }
+    return errors, summary
@@ -0,0 +1,241 @@
+"""
+Warms recognition up ahead of each class period. A few minutes before a
+period starts, its module's roster and face templates are read into memory
+with the gallery for the venue's recognition model, along with who is
+already marked present, so the first frames of the class are matched at
+the same speed as the rest. Periods that have ended are evicted.
+
+Only the in-process recognition path uses these galleries; the
+recognition service keeps its own (see recognition_service.py).
+"""
+import threading
+from datetime import datetime, timedelta
+from gallery import gallery_from_vectors, load_module_vectors, DEFAULT_MODEL
+from metrics import Counter, Gauge
+from models import db, Attendance, Class_Period
+
+WARM_PERIODS = Gauge(
+    'recognition_warm_periods', 'Class periods whose roster and galleries are held in memory.')
+WARM_LOOKUPS = Counter(
+    'recognition_warm_lookups_total', 'Gallery lookups for the active period, warm or built per frame.', ['result'])
+for result in ('warm', 'cold'):
+    WARM_LOOKUPS.labels(result=result)
+
+def period_times(period, day):
+    """
+    The period's (start, end) datetimes on the given date.
+    """
+    start = datetime.combine(day, datetime.strptime(period.period_start_time, '%H:%M').time())
+    end = datetime.combine(day, datetime.strptime(period.period_end_time, '%H:%M').time())
+    return start, end
+
+def load_present(period_id, date):
+    """
+    Student numbers already marked present for the period on date.
+    """
+    rows = db.session.query(Attendance.user_id).filter_by(class_period_id=period_id, date=date, status='Present')
+    return {str(user_id) for (user_id,) in rows}
+
+class WarmPeriod:
+    """
+    One class period's occurrence held in memory: its roster's vectors,
+    the galleries built from them and who is already present.
+    """
+
+    def __init__(self, period, module_code, date, start, end, vectors, present):
+        self.period_id = period.id
+        self.period_code = period.period_id
+        self.module_code = module_code
+        self.date = date
+        self.start = start
+        self.end = end
+        self.vectors = vectors
+        self.present = present
+        self.galleries = {} # (model_name, dim) -> Gallery
+        self.warmed_at = datetime.now()
+
+    def gallery(self, model_name, dim):
+        gallery = self.galleries.get((model_name, dim))
+        if gallery is None:
+            gallery = self.galleries[(model_name, dim)] = gallery_from_vectors(self.vectors, dim, model_name)
+        return gallery
+
+    def to_dict(self):
+        return {
+            'class_period_id': self.period_id,
+            'period_id': self.period_code,
+            'module_code': self.module_code,
+            'date': self.date,
+            'start': self.start.strftime('%H:%M'),
+            'end': self.end.strftime('%H:%M'),
+            'students': len(self.vectors),
+            'present': len(self.present),
+            'galleries': [{'model_name': model_name, 'dim': dim, 'templates': len(gallery.owners)}
+                          for (model_name, dim), gallery in self.galleries.items()],
+            'warmed_at': self.warmed_at.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+class PeriodWarmer:
+    """
+    Keeps the galleries of current and upcoming class periods warm. A
+    daemon thread runs refresh() every interval seconds: periods starting
+    within lead_minutes (or in progress) are loaded, ended ones evicted.
+    model_for(period) names the recognition model whose gallery is built
+    up front; galleries for other models are built on first use.
+    """
+
+    def __init__(self, app, lead_minutes=10, interval=30, model_for=None):
+        self.app = app
+        self.lead_minutes = lead_minutes
+        self.interval = interval
+        self.model_for = model_for
+        self.entries = {} # class period id -> WarmPeriod
+        self.generation = 0 # Bumped by every invalidation, so a load racing one is not stored
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.wake = threading.Event()
+        self.thread = None
+        WARM_PERIODS.labels().set_function(lambda: len(self.entries))
+
+    def due_periods(self, now):
+        """
+        (period, start, end) for today's periods starting within lead_minutes or in progress.
+        """
+        lead = timedelta(minutes=self.lead_minutes)
+        due = []
+        for period in Class_Period.query.filter_by(day_of_week=now.strftime('%A')):
+            try:
+                start, end = period_times(period, now.date())
+            except ValueError:
+                continue
+            if start - lead <= now < end:
+                due.append((period, start, end))
+        return due
+
+    def warm(self, period, start, end):
+        """
+        Loads one period's roster, gallery and present students. The entry
+        is not kept if an invalidation arrived while it was loading; the
+        next refresh loads it again.
+        """
+        with self.lock:
+            generation = self.generation
+        register = period.register
+        module_code = register.subject_code if register else None
+        date = start.strftime('%Y-%m-%d')
+        entry = WarmPeriod(period, module_code, date, start, end,
+                           load_module_vectors(module_code) if module_code else {}, load_present(period.id, date))
+        model_name = self.model_for(period) if self.model_for else None
+        if model_name:
+            # Build the gallery for the dimension the model's templates have
+            keys = (model_name, None) if model_name == DEFAULT_MODEL else (model_name,)
+            dims = [vectors[0].shape[0] for models in entry.vectors.values()
+                    for key, vectors in models.items() if vectors and key in keys]
+            if dims:
+                entry.gallery(model_name, max(set(dims), key=dims.count))
+        with self.lock:
+            if generation == self.generation:
+                self.entries[period.id] = entry
+        return entry
+
+    def refresh(self, now=None):
+        """
+        Warms due periods that are not yet warm and evicts the rest.
+        Returns (warmed, evicted) lists of period codes. Must run inside an
+        app context.
+        """
+        now = now or datetime.now()
+        try:
+            due = self.due_periods(now)
+            due_ids = {period.id for period, _, _ in due}
+            with self.lock:
+                evicted = [entry.period_code for period_id, entry in self.entries.items() if period_id not in due_ids]
+                self.entries = {period_id: entry for period_id, entry in self.entries.items() if period_id in due_ids}
+                warm = {period_id: entry.date for period_id, entry in self.entries.items()}
+            warmed = []
+            for period, start, end in due:
+                if warm.get(period.id) != start.strftime('%Y-%m-%d'):
+                    self.warm(period, start, end)
+                    warmed.append(period.period_id)
+        finally:
+            db.session.rollback() # Read only; end the transaction
+        return warmed, evicted
+
+    def get(self, period_id, date):
+        with self.lock:
+            entry = self.entries.get(period_id)
+        return entry if entry is not None and entry.date == date else None
+
+    def gallery(self, period_id, date, model_name, dim):
+        """
+        The warm gallery for the period, or None if it is not warm.
+        """
+        entry = self.get(period_id, date)
+        WARM_LOOKUPS.labels(result='cold' if entry is None else 'warm').inc()
+        if entry is None:
+            return None
+        with self.lock:
+            return entry.gallery(model_name, dim)
+
+    def is_present(self, period_id, date, student_number):
+        """
+        True if the student is known to be marked present already. False
+        means "not known": attendance written elsewhere (e.g. camera.py)
+        is only picked up when the period is warmed.
+        """
+        entry = self.get(period_id, date)
+        return entry is not None and str(student_number) in entry.present
+
+    def mark_present(self, period_id, date, student_number):
+        entry = self.get(period_id, date)
+        if entry is not None:
+            with self.lock:
+                entry.present.add(str(student_number))
+
+    def invalidate(self, module_code=None, student_number=None, period_id=None):
+        """
+        Drops warm periods after enrolments, registrations or attendance
+        change and wakes the thread to load them again. With no arguments,
+        drops them all.
+        """
+        everything = module_code is None and student_number is None and period_id is None
+        with self.lock:
+            self.generation += 1
+            for key, entry in list(self.entries.items()):
+                if (everything or (module_code is not None and entry.module_code == module_code)
+                        or (period_id is not None and entry.period_id == period_id)
+                        or (student_number is not None and student_number in entry.vectors)):
+                    del self.entries[key]
+        self.wake.set()
+
+    def status(self):
+        with self.lock:
+            entries = sorted(self.entries.values(), key=lambda entry: (entry.start, entry.period_code))
+        return {
+            'lead_minutes': self.lead_minutes,
+            'interval': self.interval,
+            'running': self.thread is not None and self.thread.is_alive(),
+            'periods': [entry.to_dict() for entry in entries],
+        }
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='gallery-warmer', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                with self.app.app_context():
+                    warmed, evicted = self.refresh()
+                if warmed or evicted:
+                    print(f"[INFO] Gallery warm-up: warmed {warmed or 'none'}, evicted {evicted or 'none'}")
+            except Exception as e:
+                print(f"[ERROR] Gallery warm-up failed: {e}")
+            self.wake.wait(self.interval)
+            self.wake.clear()